@@ -1,114 +1,293 @@
+import argparse
+import hashlib
+import json
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from catalogo import carregar_catalogo
+from instrumentacao import contar, cronometrado, registrar_duracao
+
+@cronometrado("aed.carregar_e_limpar")
 def carregar_e_limpar_dados(caminho_arquivo):
 
-    df = pd.read_json(caminho_arquivo)
+    # O catálogo já chega tipado (Valor em float e flag ZeroKm) a partir do cache colunar.
+    df = carregar_catalogo(caminho_arquivo).para_dataframe()
     print("Dataset carregado com sucesso!")
     print(f"Formato inicial do dataset: {df.shape}")
 
-    # Remove 'R$ ', troca '.' por '' e ',' por '.'
-    df['Valor'] = (
-        df['Valor']
-        .str.replace('R$ ', '', regex=False)
-        .str.replace('.', '', regex=False)
-        .str.replace(',', '.', regex=False)
-        .astype(float)
-    )
-
-    # 2. Tratar o valor '32000' na coluna 'AnoModelo'
-    ano_maximo_valido = df[df['AnoModelo'] != 32000]['AnoModelo'].max()
-    df['AnoModelo'] = df['AnoModelo'].replace(32000, ano_maximo_valido)
+    # 2. Tratar o valor '32000' (zero km) na coluna 'AnoModelo'
+    ano_maximo_valido = df.loc[~df['ZeroKm'], 'AnoModelo'].max()
+    df.loc[df['ZeroKm'], 'AnoModelo'] = ano_maximo_valido
+    df = df.drop(columns=['ZeroKm'])
     print(f"Valor '32000' em 'AnoModelo' substituído por '{ano_maximo_valido}'.")
 
     # 3. Preencher valores ausentes em 'AutonomiaEletricaKM'
-    df['AutonomiaEletricaKM'].fillna(0, inplace=True)
+    df['AutonomiaEletricaKM'] = df['AutonomiaEletricaKM'].fillna(0)
 
     df.info()
     return df
 
+COLUNAS_DESCRITIVAS = ['Valor', 'AnoModelo', 'CapacidadeBateriaKWH', 'AutonomiaTotalKM', 'CustoMedioPorKM_R$']
+COLUNAS_CATEGORICAS_RELATORIO = ['ModeloBase', 'TipoVeiculo']
+
+# Acima deste número de linhas os gráficos ponto a ponto viram gráficos agregados
+# (hexbin, histograma pré-calculado, boxplot a partir de estatísticas por grupo).
+LIMITE_LINHAS_DETALHADO = 50_000
+ARQUIVO_MANIFESTO = '.manifesto.json'
+ARQUIVO_ESTATISTICAS = 'estatisticas.json'
+VERSAO_RELATORIO = '1'  # altere ao mudar o desenho de algum gráfico para forçar nova renderização
+
 def analisar_estatisticas_descritivas(df):
     print("\n--- Estatísticas Descritivas ---")
 
-    colunas_descritivas = ['Valor', 'AnoModelo', 'CapacidadeBateriaKWH', 'AutonomiaTotalKM', 'CustoMedioPorKM_R$']
-    print(df[colunas_descritivas].describe().to_string())
+    print(df[COLUNAS_DESCRITIVAS].describe().to_string())
 
-def criar_visualizacoes(df, pasta_saida='graficos_AED'):
+def calcular_estatisticas(df):
+    """describe() das colunas numéricas e value_counts() das categóricas, em tipos nativos (para JSON)."""
+    descricao = df[COLUNAS_DESCRITIVAS].describe()
+    return {
+        'linhas': int(len(df)),
+        'descricao': {
+            coluna: {estat: (None if pd.isna(v) else float(v)) for estat, v in descricao[coluna].items()}
+            for coluna in descricao.columns
+        },
+        'contagens': {
+            coluna: {str(k): int(v) for k, v in df[coluna].value_counts().items()}
+            for coluna in COLUNAS_CATEGORICAS_RELATORIO
+        },
+    }
 
-    if not os.path.exists(pasta_saida):
-        os.makedirs(pasta_saida)
-        print(f"\nPasta '{pasta_saida}' criada para salvar os gráficos.")
+def salvar_estatisticas(df, pasta_saida='graficos_AED'):
+    os.makedirs(pasta_saida, exist_ok=True)
+    caminho = os.path.join(pasta_saida, ARQUIVO_ESTATISTICAS)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(calcular_estatisticas(df), f, ensure_ascii=False, indent=2)
+    return caminho
 
-    sns.set_theme(style="whitegrid")
+# --- GRÁFICOS ---
+# Cada gráfico recebe só as colunas de que precisa e o modo ('detalhado' ou 'agregado').
+# São funções de módulo para poderem rodar em processos separados.
 
-    # 1. Distribuição dos Tipos de Veículo
+def _grafico_contagem_tipo(df, caminho, modo):
     plt.figure(figsize=(8, 6))
-    sns.countplot(x='TipoVeiculo', data=df, palette='viridis', hue='TipoVeiculo', legend=False)
+    if modo == 'detalhado':
+        sns.countplot(x='TipoVeiculo', data=df, palette='viridis', hue='TipoVeiculo', legend=False)
+    else:
+        contagens = df['TipoVeiculo'].value_counts(sort=False)
+        contagens = contagens[contagens > 0]
+        plt.bar(contagens.index.astype(str), contagens.values,
+                color=sns.color_palette('viridis', len(contagens)))
     plt.title('Contagem por Tipo de Veículo')
     plt.xlabel('Tipo de Veículo')
     plt.ylabel('Contagem')
-    plt.savefig(os.path.join(pasta_saida, '01_contagem_tipo_veiculo.png'))
+    plt.savefig(caminho)
     plt.close()
 
-    # 2. Distribuição de Preços (Valor)
+def _grafico_distribuicao_precos(df, caminho, modo):
     plt.figure(figsize=(10, 6))
-    sns.histplot(df['Valor'], kde=True, bins=20)
+    if modo == 'detalhado':
+        sns.histplot(df['Valor'], kde=True, bins=20)
+    else:
+        # Histograma pré-calculado: sem KDE, que é O(n) por ponto avaliado.
+        valores = df['Valor'].dropna().to_numpy()
+        frequencias, bordas = np.histogram(valores, bins=20)
+        plt.stairs(frequencias, bordas, fill=True, alpha=0.7)
     plt.title('Distribuição de Preços dos Veículos')
     plt.xlabel('Valor (R$)')
     plt.ylabel('Frequência')
-    plt.savefig(os.path.join(pasta_saida, '02_distribuicao_precos.png'))
+    plt.savefig(caminho)
     plt.close()
 
-    # 3. Relação entre Ano do Modelo e Valor
+def _grafico_valor_vs_ano(df, caminho, modo):
     plt.figure(figsize=(12, 7))
-    sns.scatterplot(x='AnoModelo', y='Valor', hue='TipoVeiculo', data=df, s=100, alpha=0.8)
+    if modo == 'detalhado':
+        sns.scatterplot(x='AnoModelo', y='Valor', hue='TipoVeiculo', data=df, s=100, alpha=0.8)
+        plt.legend(title='Tipo de Veículo')
+    else:
+        dados = df[['AnoModelo', 'Valor']].dropna()
+        plt.hexbin(dados['AnoModelo'], dados['Valor'], gridsize=40, bins='log', mincnt=1, cmap='viridis')
+        plt.colorbar(label='Veículos (escala log)')
     plt.title('Valor do Veículo vs. Ano do Modelo')
     plt.xlabel('Ano do Modelo')
     plt.ylabel('Valor (R$)')
-    plt.legend(title='Tipo de Veículo')
-    plt.savefig(os.path.join(pasta_saida, '03_valor_vs_ano.png'))
+    plt.savefig(caminho)
     plt.close()
 
-    # 4. Custo Médio por KM por Modelo Base
+def estatisticas_boxplot(df, coluna_valor, coluna_grupo):
+    """
+    Estatísticas de boxplot por grupo (quartis e bigodes a 1,5 IQR), calculadas com groupby
+    em vez de passar todos os pontos ao seaborn. Retorna a lista no formato de `Axes.bxp`,
+    ordenada pela média do grupo.
+    """
+    dados = df[[coluna_grupo, coluna_valor]].dropna()
+    grupos = dados.groupby(coluna_grupo, observed=True)[coluna_valor]
+    quartis = grupos.quantile([0.25, 0.5, 0.75]).unstack()
+    resumo = pd.DataFrame({'q1': quartis[0.25], 'mediana': quartis[0.5], 'q3': quartis[0.75], 'media': grupos.mean()})
+    iqr = resumo['q3'] - resumo['q1']
+    limites = pd.DataFrame({'baixo': resumo['q1'] - 1.5 * iqr, 'alto': resumo['q3'] + 1.5 * iqr})
+
+    # Bigodes: valor mais extremo dentro dos limites de cada grupo.
+    com_limites = dados.join(limites, on=coluna_grupo)
+    dentro = com_limites[coluna_valor].between(com_limites['baixo'], com_limites['alto'])
+    bigodes = com_limites[dentro].groupby(coluna_grupo, observed=True)[coluna_valor].agg(['min', 'max'])
+    resumo = resumo.join(bigodes).sort_values('media')
+
+    return [
+        {'label': str(grupo), 'q1': linha.q1, 'med': linha.mediana, 'q3': linha.q3,
+         'whislo': linha['min'], 'whishi': linha['max'], 'mean': linha.media}
+        for grupo, linha in resumo.iterrows()
+    ]
+
+def _grafico_custo_por_modelo(df, caminho, modo):
     plt.figure(figsize=(14, 8))
-    ordem_modelos = df.groupby('ModeloBase')['CustoMedioPorKM_R$'].mean().sort_values().index
-    sns.boxplot(x='CustoMedioPorKM_R$', y='ModeloBase', data=df, orient='h', order=ordem_modelos, palette='coolwarm', hue='ModeloBase', legend=False)
+    if modo == 'detalhado':
+        ordem_modelos = df.groupby('ModeloBase', observed=True)['CustoMedioPorKM_R$'].mean().sort_values().index
+        sns.boxplot(x='CustoMedioPorKM_R$', y='ModeloBase', data=df, orient='h', order=ordem_modelos, palette='coolwarm', hue='ModeloBase', legend=False)
+    else:
+        estatisticas = estatisticas_boxplot(df, 'CustoMedioPorKM_R$', 'ModeloBase')
+        ax = plt.gca()
+        caixas = ax.bxp(estatisticas, orientation='horizontal', showfliers=False, patch_artist=True)
+        for caixa, cor in zip(caixas['boxes'], sns.color_palette('coolwarm', len(estatisticas))):
+            caixa.set_facecolor(cor)
+        ax.invert_yaxis()  # mesma ordem do seaborn: menor média no topo
     plt.title('Distribuição do Custo Médio por KM por Modelo Base')
     plt.xlabel('Custo Médio por KM (R$)')
     plt.ylabel('Modelo Base')
     plt.tight_layout()
-    plt.savefig(os.path.join(pasta_saida, '04_custo_km_por_modelo.png'))
+    plt.savefig(caminho)
     plt.close()
 
-    # 5. Autonomia Total vs. Custo por KM
+def _grafico_autonomia_vs_custo(df, caminho, modo):
     plt.figure(figsize=(12, 7))
-    sns.scatterplot(x='AutonomiaTotalKM', y='CustoMedioPorKM_R$', hue='TipoVeiculo', size='CapacidadeBateriaKWH', data=df, sizes=(50, 300), alpha=0.8)
+    if modo == 'detalhado':
+        sns.scatterplot(x='AutonomiaTotalKM', y='CustoMedioPorKM_R$', hue='TipoVeiculo', size='CapacidadeBateriaKWH', data=df, sizes=(50, 300), alpha=0.8)
+        plt.legend(title='Legenda', bbox_to_anchor=(1.05, 1), loc='upper left')
+    else:
+        dados = df[['AutonomiaTotalKM', 'CustoMedioPorKM_R$']].dropna()
+        plt.hexbin(dados['AutonomiaTotalKM'], dados['CustoMedioPorKM_R$'], gridsize=40, bins='log', mincnt=1, cmap='viridis')
+        plt.colorbar(label='Veículos (escala log)')
     plt.title('Autonomia Total vs. Custo por KM')
     plt.xlabel('Autonomia Total (KM)')
     plt.ylabel('Custo Médio por KM (R$)')
-    plt.legend(title='Legenda', bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
-    plt.savefig(os.path.join(pasta_saida, '05_autonomia_vs_custo_km.png'))
+    plt.savefig(caminho)
     plt.close()
 
-    # 6. Matriz de Correlação
-    colunas_numericas = df.select_dtypes(include=np.number)
-    matriz_corr = colunas_numericas.corr()
+def _grafico_matriz_correlacao(df, caminho, modo):
+    # A correlação já é um agregado: o mesmo gráfico serve para qualquer tamanho de dataset.
+    matriz_corr = df.corr()
     plt.figure(figsize=(10, 8))
     sns.heatmap(matriz_corr, annot=True, cmap='viridis', fmt='.2f', linewidths=.5)
     plt.title('Matriz de Correlação das Variáveis Numéricas')
     plt.tight_layout()
-    plt.savefig(os.path.join(pasta_saida, '06_matriz_correlacao.png'))
+    plt.savefig(caminho)
     plt.close()
 
-    print(f"Gráficos salvos na pasta '{pasta_saida}'.")
+def _colunas_numericas(df):
+    return list(df.select_dtypes(include=np.number).columns)
 
-if __name__ == "__main__":
-    nome_arquivo_json = 'dataset_byd_completo_custos.json'
+# (arquivo, colunas usadas — lista ou função do df —, função de desenho)
+GRAFICOS = [
+    ('01_contagem_tipo_veiculo.png', ['TipoVeiculo'], _grafico_contagem_tipo),
+    ('02_distribuicao_precos.png', ['Valor'], _grafico_distribuicao_precos),
+    ('03_valor_vs_ano.png', ['AnoModelo', 'Valor', 'TipoVeiculo'], _grafico_valor_vs_ano),
+    ('04_custo_km_por_modelo.png', ['CustoMedioPorKM_R$', 'ModeloBase'], _grafico_custo_por_modelo),
+    ('05_autonomia_vs_custo_km.png', ['AutonomiaTotalKM', 'CustoMedioPorKM_R$', 'TipoVeiculo', 'CapacidadeBateriaKWH'],
+     _grafico_autonomia_vs_custo),
+    ('06_matriz_correlacao.png', _colunas_numericas, _grafico_matriz_correlacao),
+]
+
+def _hash_colunas(dados, arquivo, modo):
+    """Hash do conteúdo das colunas de entrada de um gráfico (mais o modo e a versão do desenho)."""
+    h = hashlib.sha256(f"{VERSAO_RELATORIO}\x1f{arquivo}\x1f{modo}\x1f{list(dados.columns)}".encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(dados, index=False).to_numpy().tobytes())
+    return h.hexdigest()
 
+def _iniciar_processo():
+    plt.switch_backend('Agg')
+    sns.set_theme(style="whitegrid")
+
+def _desenhar(funcao, dados, caminho, modo):
+    """Desenha um gráfico e devolve o tempo gasto (medido no processo que desenhou)."""
+    inicio = time.perf_counter()
+    funcao(dados, caminho, modo)
+    return time.perf_counter() - inicio
+
+def _carregar_manifesto(pasta_saida):
+    try:
+        with open(os.path.join(pasta_saida, ARQUIVO_MANIFESTO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _salvar_manifesto(pasta_saida, manifesto):
+    caminho = os.path.join(pasta_saida, ARQUIVO_MANIFESTO)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=1, sort_keys=True)
+    os.replace(temporario, caminho)
+
+@cronometrado("aed.visualizacoes")
+def criar_visualizacoes(df, pasta_saida='graficos_AED', processos=None, forcar=False, modo=None):
+    """
+    Gera os gráficos da AED em paralelo. Um gráfico só é refeito se o hash das suas
+    colunas de entrada mudou desde a última execução (ou com `forcar`). `modo` é
+    'detalhado' ou 'agregado'; por padrão depende do número de linhas.
+    Retorna (gerados, pulados).
+    """
+    if not os.path.exists(pasta_saida):
+        os.makedirs(pasta_saida)
+        print(f"\nPasta '{pasta_saida}' criada para salvar os gráficos.")
+
+    if modo is None:
+        modo = 'detalhado' if len(df) <= LIMITE_LINHAS_DETALHADO else 'agregado'
+
+    manifesto = _carregar_manifesto(pasta_saida)
+    pendentes = []
+    pulados = []
+    for arquivo, colunas, funcao in GRAFICOS:
+        dados = df[colunas(df) if callable(colunas) else colunas]
+        hash_entrada = _hash_colunas(dados, arquivo, modo)
+        caminho = os.path.join(pasta_saida, arquivo)
+        if not forcar and manifesto.get(arquivo) == hash_entrada and os.path.exists(caminho):
+            pulados.append(arquivo)
+        else:
+            pendentes.append((arquivo, hash_entrada, funcao, dados, caminho))
+
+    gerados = []
+    processos = min(processos or os.cpu_count() or 1, len(pendentes))
+    if processos <= 1:
+        _iniciar_processo()
+        for arquivo, hash_entrada, funcao, dados, caminho in pendentes:
+            registrar_duracao("aed.grafico", _desenhar(funcao, dados, caminho, modo), grafico=arquivo, modo=modo)
+            manifesto[arquivo] = hash_entrada
+            gerados.append(arquivo)
+    else:
+        # Cada processo recebe só as colunas do seu gráfico.
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as pool:
+            futuros = {
+                pool.submit(_desenhar, funcao, dados, caminho, modo): (arquivo, hash_entrada)
+                for arquivo, hash_entrada, funcao, dados, caminho in pendentes
+            }
+            for futuro in as_completed(futuros):
+                arquivo, hash_entrada = futuros[futuro]
+                registrar_duracao("aed.grafico", futuro.result(), grafico=arquivo, modo=modo)
+                manifesto[arquivo] = hash_entrada
+                gerados.append(arquivo)
+
+    contar("aed.grafico_sem_alteracao", len(pulados))
+    _salvar_manifesto(pasta_saida, manifesto)
+    print(f"Gráficos salvos na pasta '{pasta_saida}' (modo {modo}): "
+          f"{len(gerados)} gerados, {len(pulados)} sem alteração.")
+    return gerados, pulados
+
+def main(nome_arquivo_json='dataset_byd_completo_custos.json', pasta_saida='graficos_AED', processos=None,
+         forcar=False, modo=None):
     if not os.path.exists(nome_arquivo_json):
         print(f"Erro: O arquivo '{nome_arquivo_json}' não foi encontrado no diretório.")
     else:
@@ -119,6 +298,19 @@ if __name__ == "__main__":
         print("\nContagem por Modelo Base:")
         print(df_byd['ModeloBase'].value_counts().to_string())
 
-        criar_visualizacoes(df_byd)
+        criar_visualizacoes(df_byd, pasta_saida, processos, forcar, modo)
+        caminho_estatisticas = salvar_estatisticas(df_byd, pasta_saida)
+        print(f"Estatísticas salvas em '{caminho_estatisticas}'.")
 
-        print("\nAnálise Exploratória de Dados concluída.")
\ No newline at end of file
+        print("\nAnálise Exploratória de Dados concluída.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Análise exploratória do catálogo BYD/FIPE.")
+    parser.add_argument("arquivo", nargs="?", default='dataset_byd_completo_custos.json')
+    parser.add_argument("--pasta", default='graficos_AED', help="pasta de saída dos gráficos e estatísticas")
+    parser.add_argument("--processos", type=int, default=None, help="número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--forcar", action="store_true", help="refaz todos os gráficos mesmo sem mudança nos dados")
+    parser.add_argument("--modo", choices=['detalhado', 'agregado'], default=None,
+                        help=f"padrão: agregado acima de {LIMITE_LINHAS_DETALHADO} linhas")
+    args = parser.parse_args()
+    main(args.arquivo, args.pasta, args.processos, args.forcar, args.modo)
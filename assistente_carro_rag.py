@@ -1,8 +1,21 @@
-import google.generativeai as genai
+import argparse
 import time
-import json
 import os
 
+from catalogo import ARQUIVO_PADRAO, carregar_catalogo
+from recuperacao import (
+    ORCAMENTO_TOKENS_PADRAO,
+    TOP_K_PADRAO,
+    IndiceEstoque,
+    estimar_tokens,
+    formatar_carro,
+)
+from cache_respostas import CacheRespostas, cacheavel
+from chamadas_modelo import CLIENTE_PADRAO, ErroChamadaModelo
+from historico_conversa import GerenciadorHistorico
+from ferramentas_vendedor import FERRAMENTAS, configurar_ferramentas, executar_ferramenta
+from instrumentacao import contar, cronometrado, medir, observar, registrar_duracao
+
 # --- 1. IMPORTAÇÃO DA CHAVE DE SEGURANÇA ---
 try:
     from api_key import GOOGLE_API_KEY
@@ -11,61 +24,89 @@ except ImportError:
     print("    Crie um arquivo chamado api_key.py e coloque: GOOGLE_API_KEY = 'sua_chave'")
     GOOGLE_API_KEY = None
 
-def carregar_estoque_formatado():
-    nome_arquivo = 'dataset_byd_completo_custos.json'
-    
+def carregar_estoque_formatado(nome_arquivo=ARQUIVO_PADRAO):
     if not os.path.exists(nome_arquivo):
         return "ERRO: O catálogo de carros (arquivo JSON) não foi encontrado."
 
     try:
-        with open(nome_arquivo, 'r', encoding='utf-8') as f:
-            dados = json.load(f)
+        catalogo = carregar_catalogo(nome_arquivo)
         
         texto_catalogo = "--- ESTOQUE COMPLETO (NOVOS E SEMINOVOS) ---\n"
-        
-        for carro in dados:
-            # LÓGICA DE TRADUÇÃO DO ANO
-            ano_bruto = carro.get('AnoModelo')
-            if ano_bruto == 32000:
-                condicao = "🌟 ZERO KM (Novo)"
-            else:
-                condicao = f"🔄 SEMINOVO (Ano {ano_bruto})"
-
-            # Montagem do texto para a IA ler
-            texto_catalogo += (
-                f"MODELO: {carro['Modelo']}\n"
-                f"   - Condição: {condicao}\n" # <--- AQUI ESTÁ A CHAVE
-                f"   - Preço: {carro['Valor']}\n"
-                f"   - Tipo: {carro['TipoVeiculo'].upper()}\n"
-                f"   - Custo Km: R$ {carro['CustoMedioPorKM_R$']}\n"
-                f"   - Autonomia: {carro['AutonomiaTotalKM']} km\n"
-                "--------------------------------------------------\n"
-            )
+        texto_catalogo += "".join(formatar_carro(carro) for carro in catalogo.registros())
         
         return texto_catalogo
 
     except Exception as e:
         return f"Erro ao ler dataset: {str(e)}"
 
-def configurar_ia():
-    if not GOOGLE_API_KEY:
-        return None
+# --- 2. RECUPERAÇÃO (RAG) ---
+# Em vez de mandar o estoque inteiro no prompt de sistema, cada mensagem do
+# cliente recebe só os carros mais relevantes, dentro de um orçamento de tokens.
+TOP_K_ESTOQUE = TOP_K_PADRAO
+ORCAMENTO_TOKENS_ESTOQUE = ORCAMENTO_TOKENS_PADRAO
 
-    genai.configure(api_key=GOOGLE_API_KEY)
-    estoque_atual = carregar_estoque_formatado()
+_indice_estoque = None
+
+def carregar_indice_estoque():
+    """Índice de recuperação do estoque (montado uma vez por processo). None se não houver catálogo."""
+    global _indice_estoque
+    if _indice_estoque is None and os.path.exists(ARQUIVO_PADRAO):
+        _indice_estoque = IndiceEstoque(carregar_catalogo(ARQUIVO_PADRAO))
+    return _indice_estoque
+
+@cronometrado("assistente.recuperacao")
+def recuperar_estoque(user_input, mensagem_anterior=""):
+    """Linhas do catálogo relevantes para a mensagem do cliente."""
+    indice = carregar_indice_estoque()
+    if indice is None:
+        return []
+
+    # A mensagem anterior ajuda em perguntas de continuação ("e a autonomia dele?").
+    consulta = f"{mensagem_anterior} {user_input}".strip()
+    return indice.buscar(consulta, TOP_K_ESTOQUE)
+
+def montar_mensagem_com_estoque(user_input, mensagem_anterior="", indices=None):
+    """Anexa à mensagem do cliente os carros do estoque relevantes para ela."""
+    indice = carregar_indice_estoque()
+    if indice is None:
+        return user_input
+
+    if indices is None:
+        indices = recuperar_estoque(user_input, mensagem_anterior)
+    contexto = indice.montar_contexto(indices, ORCAMENTO_TOKENS_ESTOQUE)
+    return (
+        "ESTOQUE RELEVANTE PARA ESTA MENSAGEM:\n"
+        f"{contexto}\n"
+        "MENSAGEM DO CLIENTE:\n"
+        f"{user_input}"
+    )
+
+def montar_instrucoes_sistema():
+    indice = carregar_indice_estoque()
+    if indice is None:
+        estoque_atual = "ERRO: O catálogo de carros (arquivo JSON) não foi encontrado."
+    else:
+        estoque_atual = indice.resumo()
 
     instrucoes_sistema = f"""Você é uma VendedorAI, um sistema inteligente e um consultor de vendas experiente e carismático da concessionária BYD.
     
     SEU OBJETIVO:Conversar naturalmente com o cliente para entender o perfil dele e vender um carro do seu estoque.
     
-    SEU ESTOQUE:
+    RESUMO DO SEU ESTOQUE (modelos e faixas de preço):
     {estoque_atual}
+
+    A cada mensagem do cliente você recebe um bloco "ESTOQUE RELEVANTE PARA ESTA MENSAGEM"
+    com os carros do estoque que mais combinam com o que ele disse. Use apenas esses dados
+    (preço, condição, custo por km e autonomia) ao citar carros específicos.
     
     REGRAS DE COMPORTAMENTO:
     1. NÃO faça um interrogatório. Faça no máximo UMA pergunta por vez.
     2. Seja breve, informal e simpático.
     3. Descubra discretamente: Nome, Uso diário (KM) e Orçamento.
-    4. CÁLCULO MENTAL: Sempre calcule a economia de combustível (Gasolina vs Elétrico) e use isso como argumento forte.
+    4. CÁLCULOS: NUNCA calcule de cabeça. Para economia de combustível/IPVA use a ferramenta calcular_economia_anual,
+       para o balanço em 3 anos (economia menos desvalorização) use calcular_balanco_3_anos e para procurar
+       carros com filtros use buscar_estoque. Apresente o resultado das ferramentas de forma curta, como argumento forte.
+       Se vier faixa_balanco_90, fale do balanço como faixa ("entre R$ X e R$ Y"), não como valor exato.
     5. Se o cliente perguntar de um carro fora da lista, ofereça uma alternativa similar da BYD.
     6. Objetivo final: Convencer o cliente a agendar um "Test Drive".
 
@@ -73,7 +114,30 @@ def configurar_ia():
     Se apresente e pergunte como pode ajudar.
     """
 
-    print(instrucoes_sistema)
+    return instrucoes_sistema
+
+MODELO_NOME = "models/gemini-2.5-flash"
+
+def criar_modelo(usar_modelo_local=False, instrucoes_sistema=None, verbose=True):
+    """
+    Cria o modelo generativo com as instruções de sistema (montadas aqui se não
+    forem informadas). Com usar_modelo_local=True usa o ModeloLocal (falso,
+    offline, sem API key) no lugar do Gemini. Retorna None se faltar a API key.
+    """
+    if usar_modelo_local:
+        from modelo_local import ModeloLocal
+        return ModeloLocal(system_instruction=instrucoes_sistema or montar_instrucoes_sistema())
+
+    if not GOOGLE_API_KEY:
+        return None
+
+    import google.generativeai as genai
+
+    genai.configure(api_key=GOOGLE_API_KEY)
+    instrucoes_sistema = instrucoes_sistema or montar_instrucoes_sistema()
+
+    if verbose:
+        print(instrucoes_sistema)
     # Configuração do Modelo
     generation_config = {
         "temperature": 0.7,
@@ -81,33 +145,220 @@ def configurar_ia():
         "max_output_tokens": 500,
     }
 
-    modelo_nome = "models/gemini-2.5-flash"
+    # Ferramentas locais (economia, balanço e busca no estoque) para function calling
+    configurar_ferramentas(carregar_indice_estoque())
 
-    model = genai.GenerativeModel(
-        model_name=modelo_nome,
-        system_instruction=instrucoes_sistema
+    return genai.GenerativeModel(
+        model_name=MODELO_NOME,
+        system_instruction=instrucoes_sistema,
+        tools=FERRAMENTAS,
     )
+
+def configurar_ia(usar_modelo_local=False):
+    """Cria a sessão de chat (veja criar_modelo). Retorna None se faltar a API key."""
+    model = criar_modelo(usar_modelo_local)
+    if model is None:
+        return None
     
     return model.start_chat(history=[])
 
-def main():
-    chat = configurar_ia()
+# --- 3. ENVIO DAS MENSAGENS (STREAMING) ---
+
+PREFIXO_RESPOSTA = "🤖 VendedorAI (BYD): "
+
+# Latências de cada turno da sessão atual (dicts retornados por enviar_mensagem).
+METRICAS_TURNOS = []
+
+# Limite de idas e voltas de ferramentas em um mesmo turno
+MAX_RODADAS_FERRAMENTAS = 4
+
+def _chamadas_de_ferramenta(partes):
+    chamadas = []
+    for parte in partes:
+        chamada = getattr(parte, "function_call", None)
+        if chamada and chamada.name:
+            chamadas.append(chamada)
+    return chamadas
+
+def _respostas_de_ferramenta(chamadas):
+    """Executa localmente as ferramentas pedidas pelo modelo e monta as partes de resposta."""
+    respostas = []
+    for chamada in chamadas:
+        with medir("assistente.ferramenta", ferramenta=chamada.name):
+            resultado = executar_ferramenta(chamada.name, chamada.args)
+        respostas.append({"function_response": {"name": chamada.name, "response": resultado}})
+    return respostas
+
+def _registrar_prompt(conteudo):
+    """Tamanho do que vai para o modelo: a mensagem do cliente (com estoque) ou as respostas de ferramentas."""
+    tipo = "mensagem" if isinstance(conteudo, str) else "ferramentas"
+    texto = conteudo if isinstance(conteudo, str) else str(conteudo)
+    observar("llm.prompt_caracteres", len(texto), tipo=tipo)
+    observar("llm.prompt_tokens_estimados", estimar_tokens(texto), tipo=tipo)
+
+def _registrar_uso(resposta):
+    """Tokens contados pela API (usage_metadata), quando a resposta traz essa informação."""
+    uso = getattr(resposta, "usage_metadata", None)
+    for campo, nome in (("prompt_token_count", "llm.tokens_prompt"), ("candidates_token_count", "llm.tokens_resposta")):
+        valor = getattr(uso, campo, None)
+        if isinstance(valor, int):
+            observar(nome, valor)
+
+def responder_sem_streaming(chat, mensagem, cliente=None):
+    """Versão silenciosa (sem print, sem streaming) usada pelo servidor: resolve as ferramentas e devolve o texto."""
+    cliente = cliente or CLIENTE_PADRAO
+    conteudo = mensagem
+    for _ in range(MAX_RODADAS_FERRAMENTAS + 1):
+        _registrar_prompt(conteudo)
+        with medir("llm.send_message", streaming=False):
+            response = cliente.chamar(chat.send_message, conteudo)
+        _registrar_uso(response)
+        chamadas = _chamadas_de_ferramenta(getattr(response, "parts", ()))
+        if not chamadas:
+            return response.text
+        conteudo = _respostas_de_ferramenta(chamadas)
+    return ""
+
+def enviar_mensagem(chat, mensagem, streaming=True, cliente=None):
+    """
+    Envia a mensagem e imprime a resposta. Com streaming, cada chunk é impresso
+    assim que chega. Se o modelo pedir ferramentas (function calling), elas rodam
+    localmente e o resultado volta para o modelo redigir a resposta.
+    Retorna um dict com o texto, o tempo até o primeiro token (ttft_s), a latência
+    total (total_s), o número de chunks e de chamadas de ferramentas; também o guarda em METRICAS_TURNOS.
+    As chamadas passam pelo `cliente` (limite de taxa e retentativas, chamadas_modelo.py);
+    quando ele desiste, levanta ErroChamadaModelo.
+    """
+    cliente = cliente or CLIENTE_PADRAO
+    inicio = time.perf_counter()
+    print("(digitando...)", end="\r", flush=True)
+
+    partes = []
+    ttft = None
+    n_ferramentas = 0
+    conteudo = mensagem
+    for _ in range(MAX_RODADAS_FERRAMENTAS + 1):
+        _registrar_prompt(conteudo)
+        inicio_rodada = time.perf_counter()
+        # Com streaming, só o envio é repetido: um erro no meio dos chunks sobe direto.
+        response = cliente.chamar(chat.send_message, conteudo, stream=streaming)
+        chunks = response if streaming else [response]
+        chamadas = []
+        chunk = None
+        for chunk in chunks:
+            chamadas.extend(_chamadas_de_ferramenta(getattr(chunk, "parts", ())))
+            try:
+                parte = chunk.text
+            except ValueError:
+                # Chunks sem texto (chamada de ferramenta ou só metadados de segurança)
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - inicio
+                registrar_duracao("llm.primeiro_token", ttft, streaming=streaming)
+                print(" " * 20, end="\r") # Limpa o "(digitando...)"
+                print(PREFIXO_RESPOSTA, end="", flush=True)
+            print(parte, end="", flush=True)
+            partes.append(parte)
+        # Com streaming, a chamada só termina quando o último chunk chega.
+        registrar_duracao("llm.send_message", time.perf_counter() - inicio_rodada, streaming=streaming)
+        _registrar_uso(chunk)
+
+        if not chamadas:
+            break
+        n_ferramentas += len(chamadas)
+        conteudo = _respostas_de_ferramenta(chamadas)
+    print()
+
+    total = time.perf_counter() - inicio
+    metricas = {
+        "texto": "".join(partes),
+        "ttft_s": total if ttft is None else ttft,
+        "total_s": total,
+        "chunks": len(partes),
+        "ferramentas": n_ferramentas,
+    }
+    METRICAS_TURNOS.append(metricas)
+    return metricas
+
+# --- 4. HISTÓRICO E CACHE DE RESPOSTAS ---
+
+def criar_gerenciador_historico():
+    """Histórico da conversa com orçamento de tokens (turnos antigos viram um resumo do cliente)."""
+    indice = carregar_indice_estoque()
+    modelos = [] if indice is None else [m for m in indice.catalogo.categorias("ModeloBase") if m != "N/A"]
+    return GerenciadorHistorico(modelos_conhecidos=modelos)
+
+def criar_cache_respostas(caminho_disco=None):
+    """Cache de respostas atrelado à versão do catálogo e ao modelo em uso."""
+    indice = carregar_indice_estoque()
+    versao = f"{indice.catalogo.versao if indice else ''}:{MODELO_NOME}"
+    return CacheRespostas(caminho_disco=caminho_disco, versao=versao)
+
+def responder(chat, user_input, mensagem_anterior="", streaming=True, cache=None, com_estoque=True, cliente=None,
+              historico=None):
+    """
+    Responde a mensagem do cliente: recupera o estoque relevante, consulta o cache
+    (chave = mensagem normalizada + carros recuperados + perfil do cliente no `historico` +
+    versão do catálogo) e só chama o modelo em caso de falha no cache. Retorna as
+    métricas do turno.
+    """
+    inicio = time.perf_counter()
+    with medir("assistente.preparo_mensagem"):
+        indices = recuperar_estoque(user_input, mensagem_anterior) if com_estoque else []
+        mensagem = montar_mensagem_com_estoque(user_input, mensagem_anterior, indices) if com_estoque else user_input
+
+    chave = None
+    if cache is not None and cacheavel(user_input):
+        estado = {"estoque": [int(i) for i in indices], "perfil": historico.perfil.estado() if historico else None}
+        chave = cache.chave(user_input, estado)
+        resposta = cache.obter(chave)
+        contar("assistente.cache_respostas", resultado="falha" if resposta is None else "acerto")
+        if resposta is not None:
+            print(f"{PREFIXO_RESPOSTA}{resposta}")
+            total = time.perf_counter() - inicio
+            registrar_duracao("assistente.turno", total, origem="cache")
+            metricas = {"texto": resposta, "ttft_s": total, "total_s": total, "chunks": 1, "cache": True}
+            METRICAS_TURNOS.append(metricas)
+            return metricas
+
+    metricas = enviar_mensagem(chat, mensagem, streaming, cliente)
+    registrar_duracao("assistente.turno", time.perf_counter() - inicio, origem="modelo")
+    if chave is not None:
+        cache.guardar(chave, metricas["texto"])
+    return metricas
+
+def imprimir_latencia(metricas):
+    origem = " (cache)" if metricas.get("cache") else ""
+    print(f"   [latência{origem}] primeiro token: {metricas['ttft_s']:.2f} s | total: {metricas['total_s']:.2f} s | chunks: {metricas['chunks']}")
+
+def main(streaming=True, usar_modelo_local=False, mostrar_latencia=False, usar_cache=True, cache_disco=None):
+    model = criar_modelo(usar_modelo_local)
     
-    if not chat:
+    if not model:
         print("Erro na Configuração da API Key.")
         return
 
+    cache = criar_cache_respostas(cache_disco) if usar_cache else None
+    # Cada turno abre o chat com o histórico compactado, em vez de acumular tudo.
+    historico = criar_gerenciador_historico()
+
     print("\n" + "="*50)
     print("CHAT COM VendedorAI BYD")
     print("(Digite 'sair' para encerrar)")
     print("="*50 + "\n")
 
     try:
-        response = chat.send_message("O cliente entrou na loja. Cumprimente-o.")
-        print(f"🤖 VendedorAI (BYD): {response.text}")
+        saudacao = "O cliente entrou na loja. Cumprimente-o."
+        chat = model.start_chat(history=historico.historico())
+        metricas = responder(chat, saudacao, streaming=streaming, cache=cache, com_estoque=False, historico=historico)
+        historico.registrar_turno(saudacao, metricas["texto"])
+        if mostrar_latencia:
+            imprimir_latencia(metricas)
     except Exception as e:
         print(f"Erro ao conectar com a IA: {e}")
 
+    mensagem_anterior = ""
+    pendente = ""  # mensagem que não chegou ao modelo; Enter vazio reenvia
     while True:
         try:
             user_input = input("\n👤 Você: ")
@@ -116,19 +367,57 @@ def main():
                 print("\n🤖 VendedorAI (BYD): Até logo! Estamos te esperando para o café. ☕")
                 break
             
-            if not user_input.strip(): continue
+            if not user_input.strip():
+                if not pendente: continue
+                user_input = pendente
+                print(f"(reenviando: {pendente})")
 
-            print("(digitando...)", end="\r")
-            
-            # Envia mensagem para a IA
-            response = chat.send_message(user_input)
-            
-            print(" " * 20, end="\r") # Limpa o "(digitando...)"
-            print(f"🤖 VendedorAI (BYD): {response.text}")
+            # Envia mensagem para a IA, junto com os carros relevantes do estoque
+            chat = model.start_chat(history=historico.historico())
+            metricas = responder(chat, user_input, mensagem_anterior, streaming, cache, historico=historico)
+            historico.registrar_turno(user_input, metricas["texto"])
+            mensagem_anterior = user_input
+            pendente = ""
+            if mostrar_latencia:
+                imprimir_latencia(metricas)
 
+        except EOFError:
+            break
+        except ErroChamadaModelo as e:
+            # As retentativas já aconteceram em chamadas_modelo; aqui só se decide o que fazer com a mensagem.
+            if e.repetivel:
+                pendente = user_input
+                print(f"\n A IA está indisponível no momento ({e}). Sua mensagem foi guardada: aperte Enter para reenviar.")
+            else:
+                pendente = ""
+                print(f"\n Não consegui processar essa mensagem ({e}). Tente escrever de outro jeito.")
         except Exception as e:
-            print(f"\n Erro: {e}")
-            time.sleep(2)
+            pendente = user_input
+            print(f"\n Erro: {e} (aperte Enter para reenviar a mensagem)")
+
+    if mostrar_latencia and METRICAS_TURNOS:
+        ttft_medio = sum(m["ttft_s"] for m in METRICAS_TURNOS) / len(METRICAS_TURNOS)
+        total_medio = sum(m["total_s"] for m in METRICAS_TURNOS) / len(METRICAS_TURNOS)
+        print(f"\nMédia em {len(METRICAS_TURNOS)} turnos: primeiro token {ttft_medio:.2f} s | total {total_medio:.2f} s")
+        if cache is not None:
+            estatisticas = cache.estatisticas()
+            print(f"Cache: {estatisticas['acertos']} acertos, {estatisticas['falhas']} falhas ({estatisticas['taxa_acerto']:.0%})")
+
+    if cache is not None:
+        cache.fechar()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chat com a VendedorAI BYD.")
+    parser.add_argument("--sem-streaming", action="store_true", help="espera a resposta completa antes de imprimir")
+    parser.add_argument("--modelo-local", action="store_true", help="usa o modelo falso offline (sem API key)")
+    parser.add_argument("--latencia", action="store_true", help="mostra tempo até o primeiro token e latência total por turno")
+    parser.add_argument("--sem-cache", action="store_true", help="sempre consulta o modelo, sem cache de respostas")
+    parser.add_argument("--cache-disco", metavar="ARQUIVO", help="persiste o cache de respostas em um arquivo SQLite")
+    args = parser.parse_args()
+    main(
+        streaming=not args.sem_streaming,
+        usar_modelo_local=args.modelo_local,
+        mostrar_latencia=args.latencia,
+        usar_cache=not args.sem_cache,
+        cache_disco=args.cache_disco,
+    )
@@ -0,0 +1,166 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np  # noqa: E402
+
+import catalogo  # noqa: E402
+import desvalorizacao  # noqa: E402
+from gerar_dataset import TAMANHOS_PADRAO, obter_dataset  # noqa: E402
+
+# --- BENCHMARKS DOS CAMINHOS QUENTES ---
+# Roda cada etapa (carga do catálogo, limpeza da AED, pontuação, desvalorização,
+# prompt do estoque, recuperação e gráficos) sobre datasets sintéticos de tamanhos
+# crescentes e grava os tempos em JSON, para comparar execuções ao longo do tempo.
+
+PASTA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+REPETICOES_PADRAO = 3
+GRAFICOS_LOTE = 20
+CONSULTA_PADRAO = "quero um elétrico até 200 mil com boa autonomia"
+
+def _silencioso():
+    return contextlib.redirect_stdout(io.StringIO())
+
+def cronometrar(funcao, repeticoes=REPETICOES_PADRAO, preparar=None):
+    """Executa `funcao` `repeticoes` vezes (chamando `preparar` antes de cada uma, fora do tempo)."""
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        with _silencioso():
+            resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    medicao = {"min_s": min(tempos), "mediana_s": statistics.median(tempos), "repeticoes": repeticoes}
+    return medicao, resultado
+
+def _esquecer_catalogo():
+    catalogo._CATALOGOS_ABERTOS.clear()
+
+def _apagar_cache_catalogo(caminho):
+    _esquecer_catalogo()
+    shutil.rmtree(catalogo._pasta_cache(caminho), ignore_errors=True)
+
+def _esquecer_tabelas():
+    desvalorizacao._TABELAS.clear()
+
+def medir_tamanho(caminho, repeticoes=REPETICOES_PADRAO, com_graficos=True):
+    """Todos os benchmarks para um arquivo de dataset. Retorna {nome: medição}."""
+    # Imports aqui para que pandas/seaborn/matplotlib não entrem no tempo do primeiro benchmark.
+    from analise_explatoria import carregar_e_limpar_dados
+    from assistente_carro_rag import carregar_estoque_formatado
+    from indice_catalogo import IndiceCatalogo
+    from recomendar_carro import PERFIL_USUARIO, calcular_pontuacao_e_economia, carregar_dados, recomendar_com_indice
+    from recuperacao import IndiceEstoque
+
+    medicoes = {}
+    def medir(nome, funcao, repeticoes=repeticoes, preparar=None):
+        medicoes[nome], resultado = cronometrar(funcao, repeticoes, preparar)
+        print(f"  {nome:<32} {medicoes[nome]['min_s'] * 1000:10.1f} ms")
+        return resultado
+
+    # Catálogo: conversão do JSON (cache frio) e reabertura do cache colunar.
+    medir("catalogo_conversao_json", lambda: catalogo.carregar_catalogo(caminho), 1,
+          lambda: _apagar_cache_catalogo(caminho))
+    cat = medir("catalogo_cache_colunar", lambda: catalogo.carregar_catalogo(caminho), preparar=_esquecer_catalogo)
+
+    medir("aed_carregar_e_limpar", lambda: carregar_e_limpar_dados(caminho))
+    df = medir("recomendar_carregar_dados", lambda: carregar_dados(caminho))
+    medir("recomendar_pontuacao", lambda: calcular_pontuacao_e_economia(df, PERFIL_USUARIO))
+    indice_faixas = medir("recomendar_indice_faixas", lambda: IndiceCatalogo(cat))
+    medir("recomendar_top5_com_indice", lambda: recomendar_com_indice(indice_faixas, PERFIL_USUARIO, 5))
+
+    # Desvalorização: ajuste da tabela inteira (primeira chamada) e previsões com a tabela pronta.
+    tabela = desvalorizacao.carregar_tabela_desvalorizacao(caminho)
+    codigos_validos = [tabela.codigos[i] for i in np.flatnonzero(tabela.validos)]
+    codigo = codigos_validos[0]
+    medir("desvalorizacao_ajuste_tabela",
+          lambda: desvalorizacao.prever_valor_futuro_ml(codigo, 3, arquivo_json=caminho), preparar=_esquecer_tabelas)
+    dados_previsao = medir("desvalorizacao_previsao",
+                           lambda: desvalorizacao.prever_valor_futuro_ml(codigo, 3, arquivo_json=caminho))
+    medir("desvalorizacao_previsao_todos", lambda: tabela.prever(codigos_validos, 3))
+
+    medir("prompt_estoque_completo", lambda: carregar_estoque_formatado(caminho))
+    indice = medir("recuperacao_indice", lambda: IndiceEstoque(cat))
+    medir("recuperacao_busca_contexto",
+          lambda: indice.montar_contexto(indice.buscar(CONSULTA_PADRAO, 6)))
+
+    if com_graficos:
+        from graficos_desvalorizacao import renderizar_lote
+
+        with tempfile.TemporaryDirectory() as pasta:
+            medir("grafico_unico",
+                  lambda: desvalorizacao.gerar_imagem_desvalorizacao(dados_previsao, os.path.join(pasta, "g.png")))
+            medir(f"graficos_lote_{GRAFICOS_LOTE}",
+                  lambda: renderizar_lote(codigos_validos[:GRAFICOS_LOTE], pasta=pasta, forcar=True, arquivo_json=caminho),
+                  1)
+    return medicoes
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def comparar(atual, anterior):
+    """Imprime a razão atual/anterior (min_s) de cada benchmark presente nas duas execuções."""
+    print(f"\nComparação com {anterior.get('data')} (commit {anterior.get('commit')}):")
+    for tamanho, medicoes in atual["resultados"].items():
+        for nome, medicao in medicoes.items():
+            antes = anterior["resultados"].get(tamanho, {}).get(nome)
+            if antes:
+                razao = medicao["min_s"] / antes["min_s"] if antes["min_s"] else float("inf")
+                alerta = "  <-- mais lento" if razao > 1.2 else ""
+                print(f"  {tamanho:>9} {nome:<32} x{razao:5.2f}{alerta}")
+
+def main(tamanhos=TAMANHOS_PADRAO, repeticoes=REPETICOES_PADRAO, com_graficos=True, saida=None, arquivo_comparacao=None):
+    os.chdir(RAIZ)
+    execucao = {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "resultados": {},
+    }
+    for n in tamanhos:
+        inicio = time.perf_counter()
+        caminho = obter_dataset(n)
+        print(f"\n{n} linhas ({caminho}, pronto em {time.perf_counter() - inicio:.1f} s)")
+        execucao["resultados"][str(n)] = medir_tamanho(caminho, repeticoes, com_graficos)
+
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    saida = saida or os.path.join(PASTA_RESULTADOS, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(execucao, f, indent=2)
+    print(f"\nResultados salvos em '{saida}'.")
+
+    if arquivo_comparacao:
+        with open(arquivo_comparacao, "r", encoding="utf-8") as f:
+            comparar(execucao, json.load(f))
+    return execucao
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes em datasets sintéticos.")
+    parser.add_argument("--tamanhos", nargs="+", type=int, default=list(TAMANHOS_PADRAO), help="linhas por dataset")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    parser.add_argument("--sem-graficos", action="store_true", help="pula os benchmarks de renderização")
+    parser.add_argument("--saida", metavar="ARQUIVO", help="arquivo JSON de saída (padrão: resultados/bench_<data>.json)")
+    parser.add_argument("--comparar", metavar="ARQUIVO", help="JSON de uma execução anterior para comparação")
+    args = parser.parse_args()
+    main(args.tamanhos, args.repeticoes, not args.sem_graficos, args.saida, args.comparar)
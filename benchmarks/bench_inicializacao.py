@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# --- BENCHMARK DE INICIALIZAÇÃO (COLD START) ---
+# Mede, em um processo Python novo a cada repetição, o tempo de importar o módulo de
+# cada subcomando do cli.py e confere que as bibliotecas pesadas não foram carregadas.
+# Sai com código 1 se algum import passar do limite ou puxar uma biblioteca proibida.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPETICOES_PADRAO = 5
+LIMITE_PADRAO_S = 0.5
+
+# módulo -> bibliotecas que não podem ser importadas só por carregá-lo
+CASOS = {
+    "cli": ["numpy", "pandas", "matplotlib", "seaborn", "sklearn", "google.generativeai"],
+    "recomendar_carro": ["pandas", "matplotlib", "seaborn", "sklearn", "google.generativeai"],
+    "desvalorizacao": ["pandas", "matplotlib", "seaborn", "sklearn", "google.generativeai"],
+    "assistente_carro_rag": ["pandas", "matplotlib", "seaborn", "sklearn", "google.generativeai"],
+}
+
+_SONDA = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+tempo = time.perf_counter() - inicio
+print(json.dumps({{"tempo_s": tempo, "carregados": [m for m in {proibidos!r} if m in sys.modules]}}))
+"""
+
+def medir(modulo, proibidos, repeticoes=REPETICOES_PADRAO):
+    """Menor tempo de import em `repeticoes` processos novos e as bibliotecas proibidas carregadas."""
+    tempos, carregados = [], set()
+    for _ in range(repeticoes):
+        saida = subprocess.run(
+            [sys.executable, "-c", _SONDA.format(modulo=modulo, proibidos=proibidos)],
+            cwd=RAIZ, capture_output=True, text=True, check=True,
+        )
+        # A última linha é a medição; antes dela pode haver avisos do próprio módulo.
+        resultado = json.loads(saida.stdout.strip().splitlines()[-1])
+        tempos.append(resultado["tempo_s"])
+        carregados.update(resultado["carregados"])
+    return min(tempos), sorted(carregados)
+
+def main(limite_s=LIMITE_PADRAO_S, repeticoes=REPETICOES_PADRAO, saida_json=None):
+    resultados = {}
+    falhou = False
+    for modulo, proibidos in CASOS.items():
+        tempo, carregados = medir(modulo, proibidos, repeticoes)
+        ok = tempo <= limite_s and not carregados
+        falhou |= not ok
+        resultados[modulo] = {"tempo_s": round(tempo, 4), "carregados": carregados, "ok": ok}
+        extra = f" | carregou: {', '.join(carregados)}" if carregados else ""
+        print(f"{'OK  ' if ok else 'FALHA'} {modulo:<24} {tempo * 1000:7.1f} ms{extra}")
+
+    if saida_json:
+        with open(saida_json, "w", encoding="utf-8") as f:
+            json.dump({"limite_s": limite_s, "resultados": resultados}, f, indent=2)
+    if falhou:
+        print(f"\nInicialização acima do limite de {limite_s * 1000:.0f} ms ou com import pesado indevido.")
+    return 1 if falhou else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do tempo de import (cold start) dos pontos de entrada.")
+    parser.add_argument("--limite", type=float, default=LIMITE_PADRAO_S, help="tempo máximo de import por módulo (s)")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES_PADRAO)
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava os resultados em JSON")
+    args = parser.parse_args()
+    sys.exit(main(args.limite, args.repeticoes, args.json))
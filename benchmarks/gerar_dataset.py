@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+# --- GERADOR DE DATASET SINTÉTICO NO FORMATO FIPE ---
+# Produz um JSON com o mesmo esquema de dataset_byd_completo_custos.json (Valor em
+# texto "R$ 179.357,00", AnoModelo 32000 para zero km, elétricos e híbridos, custo
+# "N/A" ocasional), com muitos CodigoFipe e históricos de ano-modelo por código.
+# Os valores seguem uma curva de desvalorização com ruído, como na tabela real.
+
+PASTA_DADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dados")
+TAMANHOS_PADRAO = (1_000, 100_000, 1_000_000)
+ANO_MAIS_RECENTE = 2026
+MAXIMO_ANOS_HISTORICO = 16
+MES_REFERENCIA = "outubro de 2025"
+TAMANHO_LOTE_ESCRITA = 50_000
+
+MARCAS = ["BYD", "GWM", "CAOA CHERY", "JAC", "VOLVO", "BMW", "RENAULT", "GM - CHEVROLET"]
+MODELOS_BASE_BYD = ["D1", "DOLPHIN", "DOLPHIN MINI", "ET3", "HAN", "KING", "SEAL", "SHARK",
+                    "SONG PLUS", "SONG PRO", "TAN", "YUAN PLUS", "YUAN PRO"]
+VERSOES = ["GL", "GS", "Plus", "Premium", "Performance", "AWD"]
+
+def _formatar_preco(valor):
+    texto = f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+    return f"R$ {texto}"
+
+def _modelos_base(rng, n_codigos):
+    """ModeloBase e Marca de cada código: os modelos BYD reais mais modelos fictícios das outras marcas."""
+    n_bases = max(len(MODELOS_BASE_BYD), n_codigos // 12)
+    marcas_base = ["BYD"] * len(MODELOS_BASE_BYD) + list(rng.choice(MARCAS, n_bases - len(MODELOS_BASE_BYD)))
+    nomes_base = MODELOS_BASE_BYD + [f"M{i:05d}" for i in range(len(MODELOS_BASE_BYD), n_bases)]
+    base_do_codigo = rng.integers(0, n_bases, n_codigos)
+    return [nomes_base[b] for b in base_do_codigo], [marcas_base[b] for b in base_do_codigo]
+
+def gerar_colunas(n_linhas, semente=0):
+    """Gera as colunas do dataset (arrays/listas por linha), com exatamente `n_linhas` linhas."""
+    rng = np.random.default_rng(semente)
+
+    # Cada código tem de 1 a 16 anos-modelo de histórico e, na maioria, uma linha zero km.
+    n_anos = rng.integers(1, MAXIMO_ANOS_HISTORICO + 1, max(1, n_linhas // 7))
+    tem_zero_km = rng.random(len(n_anos)) < 0.9
+    linhas_por_codigo = n_anos + tem_zero_km
+    n_codigos = int(np.searchsorted(np.cumsum(linhas_por_codigo), n_linhas)) + 1
+    while linhas_por_codigo[:n_codigos].sum() < n_linhas:
+        # Pouco provável, mas garante linhas suficientes quando n_linhas // 7 códigos não bastam.
+        n_anos = np.concatenate([n_anos, rng.integers(1, MAXIMO_ANOS_HISTORICO + 1, n_codigos)])
+        tem_zero_km = np.concatenate([tem_zero_km, rng.random(n_codigos) < 0.9])
+        linhas_por_codigo = n_anos + tem_zero_km
+        n_codigos = int(np.searchsorted(np.cumsum(linhas_por_codigo), n_linhas)) + 1
+    n_anos, tem_zero_km, linhas_por_codigo = n_anos[:n_codigos], tem_zero_km[:n_codigos], linhas_por_codigo[:n_codigos]
+
+    # Atributos por código.
+    eletrico = rng.random(n_codigos) < 0.6
+    valor_zero = np.exp(rng.normal(np.log(200_000), 0.45, n_codigos))
+    taxa = rng.uniform(0.05, 0.14, n_codigos)       # perda anual (linear)
+    curvatura = rng.uniform(-0.002, 0.004, n_codigos)  # termo quadrático
+    bateria = np.where(eletrico, rng.uniform(30, 100, n_codigos), rng.uniform(8, 25, n_codigos)).round(1)
+    autonomia_eletrica = np.where(eletrico, bateria * rng.uniform(5, 7, n_codigos), rng.uniform(50, 120, n_codigos)).round()
+    autonomia_total = np.where(eletrico, autonomia_eletrica, rng.uniform(800, 1300, n_codigos)).round(1)
+    custo_km = np.where(eletrico, rng.uniform(0.12, 0.30, n_codigos), rng.uniform(0.20, 0.40, n_codigos)).round(4)
+    sem_custo = rng.random(n_codigos) < 0.01
+    modelos_base, marcas = _modelos_base(rng, n_codigos)
+
+    # Expande para linhas: primeiro a linha zero km (se houver), depois os anos mais recentes.
+    codigo_linha = np.repeat(np.arange(n_codigos), linhas_por_codigo)
+    inicio = np.concatenate(([0], np.cumsum(linhas_por_codigo)[:-1]))
+    posicao = np.arange(len(codigo_linha)) - inicio[codigo_linha]
+    zero_km = tem_zero_km[codigo_linha] & (posicao == 0)
+    idade = posicao - tem_zero_km[codigo_linha]
+    ano = np.where(zero_km, 32000, ANO_MAIS_RECENTE - idade)
+
+    fator = 1 - taxa[codigo_linha] * idade - curvatura[codigo_linha] * idade ** 2
+    fator = np.clip(fator, 0.15, None) * rng.normal(1, 0.02, len(codigo_linha))
+    valor = np.where(zero_km, valor_zero[codigo_linha], valor_zero[codigo_linha] * fator).round()
+
+    codigo_linha, zero_km, ano, valor = codigo_linha[:n_linhas], zero_km[:n_linhas], ano[:n_linhas], valor[:n_linhas]
+    return {
+        "codigo": codigo_linha, "ano": ano, "valor": valor, "eletrico": eletrico, "bateria": bateria,
+        "autonomia_eletrica": autonomia_eletrica, "autonomia_total": autonomia_total, "custo_km": custo_km,
+        "sem_custo": sem_custo, "modelos_base": modelos_base, "marcas": marcas,
+        "versao": rng.integers(0, len(VERSOES), n_codigos),
+    }
+
+def _registros(colunas, inicio, fim):
+    codigos = colunas["codigo"][inicio:fim]
+    for c, ano, valor in zip(codigos.tolist(), colunas["ano"][inicio:fim].tolist(), colunas["valor"][inicio:fim].tolist()):
+        eletrico = bool(colunas["eletrico"][c])
+        base = colunas["modelos_base"][c]
+        sufixo = "(Elétrico)" if eletrico else "(Híbrido)"
+        registro = {
+            "TipoVeiculo": "eletrico" if eletrico else "hibrido",
+            "Valor": _formatar_preco(valor),
+            "Marca": colunas["marcas"][c],
+            "Modelo": f"{base.title()} {VERSOES[colunas['versao'][c]]} {sufixo}",
+            "AnoModelo": ano,
+            "Combustivel": "Elétrico" if eletrico else "Híbrido",
+            "CodigoFipe": f"{(c // 10) % 1_000_000:06d}-{c % 10}",
+            "MesReferencia": MES_REFERENCIA,
+            "SiglaCombustivel": "E" if eletrico else "H",
+            "ModeloBase": base,
+            "CapacidadeBateriaKWH": float(colunas["bateria"][c]),
+        }
+        if not eletrico:
+            registro["AutonomiaEletricaKM"] = float(colunas["autonomia_eletrica"][c])
+        registro["AutonomiaTotalKM"] = float(colunas["autonomia_total"][c])
+        registro["CustoMedioPorKM_R$"] = "N/A" if colunas["sem_custo"][c] else float(colunas["custo_km"][c])
+        yield registro
+
+def gerar_dataset(n_linhas, caminho=None, semente=0):
+    """Grava um dataset sintético de `n_linhas` linhas (em lotes, sem montar a lista inteira). Retorna o caminho."""
+    caminho = caminho or os.path.join(PASTA_DADOS, f"fipe_sintetico_{n_linhas}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    colunas = gerar_colunas(n_linhas, semente)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write("[")
+        for inicio in range(0, n_linhas, TAMANHO_LOTE_ESCRITA):
+            if inicio:
+                f.write(",")
+            fim = min(inicio + TAMANHO_LOTE_ESCRITA, n_linhas)
+            f.write(",\n".join(json.dumps(r, ensure_ascii=False) for r in _registros(colunas, inicio, fim)))
+        f.write("]")
+    os.replace(temporario, caminho)
+    return caminho
+
+def obter_dataset(n_linhas, semente=0):
+    """Caminho do dataset sintético de `n_linhas`, gerando-o só se ainda não existir."""
+    caminho = os.path.join(PASTA_DADOS, f"fipe_sintetico_{n_linhas}.json")
+    if not os.path.exists(caminho):
+        gerar_dataset(n_linhas, caminho, semente)
+    return caminho
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera datasets sintéticos no formato do dataset FIPE enriquecido.")
+    parser.add_argument("tamanhos", nargs="*", type=int, default=list(TAMANHOS_PADRAO), help="número de linhas")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    for n in args.tamanhos:
+        inicio = time.perf_counter()
+        caminho = gerar_dataset(n, semente=args.semente)
+        print(f"{n:>9} linhas -> {caminho} ({os.path.getsize(caminho) / 1e6:.1f} MB, {time.perf_counter() - inicio:.1f} s)")
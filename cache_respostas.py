@@ -0,0 +1,126 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from recuperacao import normalizar_texto
+
+# --- CACHE DE RESPOSTAS DO ASSISTENTE ---
+# Perguntas repetidas ("qual a autonomia do Dolphin?") são respondidas localmente,
+# sem ida ao modelo. A chave combina a mensagem normalizada, o estado relevante da
+# conversa e a versão do catálogo, então qualquer mudança no estoque invalida tudo.
+# Mensagens muito curtas ("sim", "quanto fica?") só fazem sentido com a resposta
+# anterior e não passam pelo cache.
+
+CAPACIDADE_PADRAO = 1000
+TTL_PADRAO = 6 * 60 * 60  # segundos
+MIN_PALAVRAS_CACHE = 3
+
+def cacheavel(mensagem):
+    """A mensagem se sustenta sozinha (pode ser respondida pelo cache)?"""
+    return len(normalizar_texto(mensagem).split()) >= MIN_PALAVRAS_CACHE
+
+class CacheRespostas:
+    """
+    Cache LRU com TTL, em memória e opcionalmente persistido em SQLite (`caminho_disco`)
+    para sobreviver a reinícios. Mantém contadores de acertos, falhas e expirações.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO, ttl_s=TTL_PADRAO, caminho_disco=None, versao=""):
+        self.capacidade = capacidade
+        self.ttl_s = ttl_s
+        self.versao = versao
+        self.acertos = 0
+        self.falhas = 0
+        self.expirados = 0
+        self._memoria = OrderedDict()  # chave -> (criado_em, resposta)
+        self._lock = threading.Lock()
+        self._disco = None
+        if caminho_disco:
+            self._disco = sqlite3.connect(caminho_disco, check_same_thread=False)
+            self._disco.execute(
+                "CREATE TABLE IF NOT EXISTS respostas (chave TEXT PRIMARY KEY, resposta TEXT, criado_em REAL)"
+            )
+            self._disco.execute("DELETE FROM respostas WHERE criado_em < ?", (time.time() - ttl_s,))
+            self._disco.commit()
+
+    def chave(self, mensagem, estado=None):
+        """Chave da mensagem normalizada + estado da conversa (qualquer JSON) + versão do catálogo."""
+        partes = [
+            normalizar_texto(mensagem),
+            json.dumps(estado or {}, sort_keys=True, ensure_ascii=False, default=str),
+            self.versao,
+        ]
+        return hashlib.sha256("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+    def obter(self, chave):
+        """Retorna a resposta em cache ou None (falha ou expirada)."""
+        agora = time.time()
+        with self._lock:
+            item = self._memoria.get(chave)
+            if item is None and self._disco is not None:
+                linha = self._disco.execute(
+                    "SELECT criado_em, resposta FROM respostas WHERE chave = ?", (chave,)
+                ).fetchone()
+                if linha:
+                    item = (linha[0], linha[1])
+                    self._inserir_memoria(chave, item)
+
+            if item is None:
+                self.falhas += 1
+                return None
+            if agora - item[0] > self.ttl_s:
+                self.expirados += 1
+                self.falhas += 1
+                self._remover(chave)
+                return None
+
+            self._memoria.move_to_end(chave)
+            self.acertos += 1
+            return item[1]
+
+    def guardar(self, chave, resposta):
+        if not resposta:
+            return
+        item = (time.time(), resposta)
+        with self._lock:
+            self._inserir_memoria(chave, item)
+            if self._disco is not None:
+                self._disco.execute("INSERT OR REPLACE INTO respostas VALUES (?, ?, ?)", (chave, resposta, item[0]))
+                self._disco.commit()
+
+    def _inserir_memoria(self, chave, item):
+        self._memoria[chave] = item
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.capacidade:
+            self._memoria.popitem(last=False)
+
+    def _remover(self, chave):
+        self._memoria.pop(chave, None)
+        if self._disco is not None:
+            self._disco.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+            self._disco.commit()
+
+    def limpar(self):
+        with self._lock:
+            self._memoria.clear()
+            if self._disco is not None:
+                self._disco.execute("DELETE FROM respostas")
+                self._disco.commit()
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "expirados": self.expirados,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            "itens_memoria": len(self._memoria),
+        }
+
+    def fechar(self):
+        if self._disco is not None:
+            self._disco.close()
+            self._disco = None
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+from instrumentacao import contar, medir
+
+# --- 1. ESQUEMA DO CATÁLOGO ---
+
+ARQUIVO_PADRAO = "dataset_byd_completo_custos.json"
+
+# A FIPE usa o ano-modelo 32000 para indicar veículo zero km.
+ANO_ZERO_KM = 32000
+
+COLUNAS_NUMERICAS = {
+    "Valor": np.float64,
+    "AnoModelo": np.int32,
+    "CapacidadeBateriaKWH": np.float64,
+    "AutonomiaTotalKM": np.float64,
+    "AutonomiaEletricaKM": np.float64,
+    "CustoMedioPorKM_R$": np.float64,
+}
+
+COLUNAS_CATEGORICAS = [
+    "CodigoFipe",
+    "Modelo",
+    "ModeloBase",
+    "TipoVeiculo",
+    "Marca",
+    "Combustivel",
+    "SiglaCombustivel",
+    "MesReferencia",
+]
+
+# Ordem das colunas ao montar um DataFrame (mesma ordem do JSON enriquecido).
+ORDEM_COLUNAS = [
+    "TipoVeiculo", "Valor", "Marca", "Modelo", "AnoModelo", "ZeroKm", "Combustivel",
+    "CodigoFipe", "MesReferencia", "SiglaCombustivel", "ModeloBase",
+    "CapacidadeBateriaKWH", "AutonomiaEletricaKM", "AutonomiaTotalKM", "CustoMedioPorKM_R$",
+]
+
+VERSAO_FORMATO = 1
+PASTA_CACHE = ".cache_catalogo"
+
+# --- 2. CONVERSÕES ---
+
+def converter_preco(valor):
+    """Converte o texto da FIPE ("R$ 179.357,00") em float. Retorna NaN se inválido."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if not isinstance(valor, str):
+        return np.nan
+    texto = valor.replace("R$", "").strip().replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return np.nan
+
+MESES = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "março": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+
+def converter_mes_referencia(texto):
+    """Converte o MesReferencia da FIPE ("outubro de 2025") em AAAAMM (202510). Retorna None se inválido."""
+    if not isinstance(texto, str):
+        return None
+    partes = texto.strip().lower().split()
+    if len(partes) != 3 or partes[1] != "de" or partes[0] not in MESES or not partes[2].isdigit():
+        return None
+    return int(partes[2]) * 100 + MESES[partes[0]]
+
+def formatar_preco(valor):
+    """Formata um float no padrão da FIPE: 179357.0 -> "R$ 179.357,00"."""
+    texto = f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+    return f"R$ {texto}"
+
+def _converter_numero(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+def colunas_de_registros(registros):
+    """
+    Converte uma lista de registros (dicts no formato do JSON da FIPE) em colunas tipadas.
+    Retorna (colunas, categorias): arrays NumPy por coluna e a lista de categorias
+    de cada coluna categórica (os arrays categóricos guardam códigos int32, -1 = ausente).
+    """
+    n = len(registros)
+    colunas = {}
+
+    colunas["Valor"] = np.fromiter((converter_preco(r.get("Valor")) for r in registros), np.float64, n)
+
+    anos = np.fromiter((_converter_numero(r.get("AnoModelo")) for r in registros), np.float64, n)
+    colunas["AnoModelo"] = np.nan_to_num(anos, nan=0).astype(np.int32)
+    colunas["ZeroKm"] = colunas["AnoModelo"] == ANO_ZERO_KM
+
+    for nome in ("CapacidadeBateriaKWH", "AutonomiaTotalKM", "AutonomiaEletricaKM", "CustoMedioPorKM_R$"):
+        colunas[nome] = np.fromiter((_converter_numero(r.get(nome)) for r in registros), np.float64, n)
+
+    categorias = {}
+    for nome in COLUNAS_CATEGORICAS:
+        indice = {}
+        codigos = np.empty(n, dtype=np.int32)
+        for i, r in enumerate(registros):
+            valor = r.get(nome)
+            if valor is None:
+                codigos[i] = -1
+                continue
+            valor = str(valor)
+            codigo = indice.get(valor)
+            if codigo is None:
+                codigo = indice[valor] = len(indice)
+            codigos[i] = codigo
+        colunas[nome] = codigos
+        categorias[nome] = list(indice)
+
+    return colunas, categorias
+
+# --- 3. TABELA COLUNAR ---
+
+class Catalogo:
+    """
+    Tabela colunar do catálogo. Colunas numéricas são arrays NumPy (em geral
+    memory-mapped a partir do cache); colunas categóricas guardam códigos int32
+    e a lista de categorias correspondente.
+    """
+
+    def __init__(self, colunas, categorias, versao, origem=None):
+        self.colunas = colunas
+        self._categorias = categorias
+        self.versao = versao
+        self.origem = origem
+
+    def __len__(self):
+        return len(self.colunas["Valor"])
+
+    def __contains__(self, nome):
+        return nome in self.colunas
+
+    def __getitem__(self, nome):
+        """Retorna a coluna; colunas categóricas são decodificadas para texto."""
+        if nome in self._categorias:
+            return self.texto(nome)
+        return self.colunas[nome]
+
+    def codigos(self, nome):
+        return self.colunas[nome]
+
+    def categorias(self, nome):
+        return self._categorias[nome]
+
+    def texto(self, nome):
+        """Decodifica uma coluna categórica em um array de objetos (None = ausente)."""
+        tabela = np.array(list(self._categorias[nome]) + [None], dtype=object)
+        return tabela[self.colunas[nome]]
+
+    def codigo_de(self, nome, valor):
+        """Código da categoria `valor` na coluna `nome`, ou -1 se não existir."""
+        try:
+            return self._categorias[nome].index(valor)
+        except ValueError:
+            return -1
+
+    def registro(self, i):
+        """Retorna a linha `i` como um dicionário de valores Python."""
+        saida = {}
+        for nome, coluna in self.colunas.items():
+            if nome in self._categorias:
+                codigo = coluna[i]
+                saida[nome] = self._categorias[nome][codigo] if codigo >= 0 else None
+            else:
+                saida[nome] = coluna[i].item()
+        return saida
+
+    def registros(self):
+        for i in range(len(self)):
+            yield self.registro(i)
+
+    def para_dataframe(self, colunas=None):
+        """Monta um DataFrame do pandas (categóricas viram `pd.Categorical`)."""
+        import pandas as pd
+
+        nomes = colunas or [c for c in ORDEM_COLUNAS if c in self.colunas]
+        dados = {}
+        for nome in nomes:
+            if nome in self._categorias:
+                dados[nome] = pd.Categorical.from_codes(self.colunas[nome], self._categorias[nome])
+            else:
+                dados[nome] = np.asarray(self.colunas[nome])
+        return pd.DataFrame(dados)
+
+# --- 4. CACHE BINÁRIO EM DISCO ---
+
+def _hash_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def _pasta_cache(caminho):
+    pasta, nome = os.path.split(os.path.abspath(caminho))
+    return os.path.join(pasta, PASTA_CACHE, nome)
+
+def _escrever_json_atomico(caminho, dados):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+def gravar_catalogo_colunar(destino, colunas, categorias, origem=None, versao=None):
+    """
+    Grava colunas tipadas em `destino` (um .npy por coluna + meta.json).
+    A gravação é feita em uma subpasta versionada e publicada atomicamente
+    trocando o `meta.json`, então leitores com memmap aberto não são afetados.
+    """
+    versao = versao or hashlib.sha256(repr(sorted(origem.items()) if origem else os.urandom(16)).encode()).hexdigest()
+    subpasta = versao[:16]
+    pasta_versao = os.path.join(destino, subpasta)
+    os.makedirs(pasta_versao, exist_ok=True)
+
+    descricao = {}
+    for i, (nome, coluna) in enumerate(colunas.items()):
+        arquivo = f"col_{i:02d}.npy"
+        np.save(os.path.join(pasta_versao, arquivo), np.ascontiguousarray(coluna))
+        descricao[nome] = {"arquivo": arquivo}
+        if nome in categorias:
+            descricao[nome]["categorias"] = list(categorias[nome])
+
+    meta = {
+        "versao_formato": VERSAO_FORMATO,
+        "versao": versao,
+        "subpasta": subpasta,
+        "linhas": int(len(next(iter(colunas.values())))) if colunas else 0,
+        "origem": origem or {},
+        "colunas": descricao,
+    }
+    _escrever_json_atomico(os.path.join(destino, "meta.json"), meta)
+
+    # Remove versões antigas (arquivos já abertos continuam válidos no Linux).
+    for nome in os.listdir(destino):
+        caminho_antigo = os.path.join(destino, nome)
+        if nome != subpasta and os.path.isdir(caminho_antigo):
+            shutil.rmtree(caminho_antigo, ignore_errors=True)
+    return meta
+
+def _ler_meta(destino):
+    try:
+        with open(os.path.join(destino, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if meta.get("versao_formato") != VERSAO_FORMATO:
+        return None
+    return meta
+
+def abrir_catalogo_colunar(destino, meta=None):
+    """Abre um catálogo colunar gravado por `gravar_catalogo_colunar` (memory-mapped)."""
+    meta = meta or _ler_meta(destino)
+    if meta is None:
+        raise FileNotFoundError(f"Catálogo colunar inválido ou ausente em '{destino}'.")
+
+    pasta_versao = os.path.join(destino, meta["subpasta"])
+    colunas, categorias = {}, {}
+    for nome, descricao in meta["colunas"].items():
+        colunas[nome] = np.load(os.path.join(pasta_versao, descricao["arquivo"]), mmap_mode="r")
+        if "categorias" in descricao:
+            categorias[nome] = descricao["categorias"]
+    return Catalogo(colunas, categorias, meta["versao"], origem=meta.get("origem"))
+
+def _cache_valido(meta, estado, caminho):
+    """Confere o cache pela assinatura (mtime/tamanho) e, se ela mudou, pelo hash do conteúdo."""
+    if meta is None:
+        return False, None
+    origem = meta.get("origem", {})
+    if origem.get("mtime_ns") == estado.st_mtime_ns and origem.get("tamanho") == estado.st_size:
+        return True, None
+    sha = _hash_arquivo(caminho)
+    return origem.get("sha256") == sha, sha
+
+# Catálogos já abertos neste processo: caminho -> (mtime_ns, tamanho, Catalogo)
+_CATALOGOS_ABERTOS = {}
+
+def carregar_catalogo(caminho=ARQUIVO_PADRAO, usar_cache=True):
+    """
+    Carrega o catálogo já limpo e tipado.
+    Na primeira chamada o JSON é convertido e gravado em um cache colunar binário
+    (`.cache_catalogo/` ao lado do arquivo); as chamadas seguintes só abrem os
+    arrays memory-mapped. O cache é invalidado pelo mtime/tamanho e pelo hash do JSON.
+    `caminho` também pode ser uma pasta colunar gerada pela ingestão.
+    Levanta FileNotFoundError se o arquivo não existir.
+    """
+    if os.path.isdir(caminho):
+        contar("catalogo.carregar", origem="colunar")
+        return abrir_catalogo_colunar(caminho)
+
+    chave = os.path.abspath(caminho)
+    estado = os.stat(caminho)
+    aberto = _CATALOGOS_ABERTOS.get(chave)
+    if aberto and aberto[0] == estado.st_mtime_ns and aberto[1] == estado.st_size:
+        contar("catalogo.carregar", origem="memoria")
+        return aberto[2]
+
+    destino = _pasta_cache(caminho)
+    meta = _ler_meta(destino) if usar_cache else None
+    valido, sha = _cache_valido(meta, estado, caminho)
+
+    if valido:
+        if sha is not None:
+            # Conteúdo igual com mtime diferente: só atualiza a assinatura.
+            meta["origem"].update(mtime_ns=estado.st_mtime_ns, tamanho=estado.st_size)
+            _escrever_json_atomico(os.path.join(destino, "meta.json"), meta)
+        catalogo = abrir_catalogo_colunar(destino, meta)
+        contar("catalogo.carregar", origem="cache")
+    else:
+        contar("catalogo.carregar", origem="json")
+        with medir("catalogo.conversao_json"):
+            with open(caminho, "r", encoding="utf-8") as f:
+                registros = json.load(f)
+            colunas, categorias = colunas_de_registros(registros)
+        sha = sha or _hash_arquivo(caminho)
+        origem = {"caminho": chave, "mtime_ns": estado.st_mtime_ns, "tamanho": estado.st_size, "sha256": sha}
+        if usar_cache:
+            try:
+                meta = gravar_catalogo_colunar(destino, colunas, categorias, origem, versao=sha)
+                catalogo = abrir_catalogo_colunar(destino, meta)
+            except OSError:
+                catalogo = Catalogo(colunas, categorias, sha, origem)
+        else:
+            catalogo = Catalogo(colunas, categorias, sha, origem)
+
+    _CATALOGOS_ABERTOS[chave] = (estado.st_mtime_ns, estado.st_size, catalogo)
+    return catalogo
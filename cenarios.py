@@ -0,0 +1,180 @@
+import argparse
+import csv
+import time
+
+import numpy as np
+
+from catalogo import ARQUIVO_PADRAO, carregar_catalogo
+from desvalorizacao import carregar_tabela_desvalorizacao
+from ingestao import PRECO_COMBUSTIVEL_HIBRIDO, PRECO_KWH_ELETRICO, TabelaTecnica
+from recomendar_carro import ALIQUOTA_IPVA, CARRO_ATUAL_PERFIL
+
+# --- SIMULAÇÃO DE CENÁRIOS (E SE O PREÇO DA GASOLINA / DO kWh MUDAR?) ---
+# Recalcula custo por km, economia anual e balanço líquido de cada carro para uma grade
+# de cenários (preço da gasolina x preço do kWh x km por ano x horizonte em anos) em
+# operações com broadcasting, sem laço por cenário. O consumo de energia e de gasolina
+# por km de cada carro vem da tabela técnica (ingestao.py), então os preços usados no
+# enriquecimento deixam de estar "embutidos" no CustoMedioPorKM_R$.
+#
+# Cada resultado só tem as dimensões de que depende (forma compacta):
+#   custo_km           (carros, gasolina, kwh)
+#   economia_anual     (carros, gasolina, kwh, km)
+#   balanco_liquido    (carros, gasolina, kwh, km, horizonte)
+
+EIXOS = ("preco_gasolina", "preco_kwh", "km_anual", "horizonte_anos")
+HORIZONTES_PADRAO = (3,)
+
+def consumo_por_carro(catalogo, tabela_tecnica=None):
+    """
+    kWh e litros de gasolina por km de cada linha do catálogo, casando o ModeloBase com
+    a tabela técnica. Linhas sem especificação ficam com NaN.
+    """
+    tabela_tecnica = tabela_tecnica or TabelaTecnica()
+    categorias = catalogo.categorias("ModeloBase")
+    especificacao = np.array([tabela_tecnica.casador.casar(str(c)) for c in categorias] + [-1], dtype=np.int64)
+    especificacao = especificacao[np.asarray(catalogo.codigos("ModeloBase"))]
+    casou = especificacao >= 0
+    posicao = np.where(casou, especificacao, 0)
+    kwh = np.where(casou, tabela_tecnica.kwh_por_km[posicao], np.nan)
+    litros = np.where(casou, tabela_tecnica.litros_por_km[posicao], np.nan)
+    return kwh, litros
+
+def desvalorizacao_por_carro(tabela, codigos_fipe, horizontes):
+    """Desvalorização prevista (carros, horizontes) a partir do valor zero km do código; NaN sem dados."""
+    posicoes = np.array([tabela.posicao(c) for c in codigos_fipe], dtype=np.int64)
+    previstos = tabela.prever_posicoes(posicoes, int(max(horizontes)))
+    previstos = previstos[:, np.asarray(horizontes, dtype=np.int64) - 1]
+    valor_zero = np.where(posicoes >= 0, tabela.valor_zero[posicoes], np.nan)
+    return np.maximum(0.0, valor_zero[:, None] - previstos)
+
+def simular_cenarios(precos_gasolina, precos_kwh, km_anuais, horizontes=HORIZONTES_PADRAO,
+                     arquivo_json=ARQUIVO_PADRAO, linhas=None,
+                     consumo_km_por_litro=CARRO_ATUAL_PERFIL['consumo_km_por_litro'],
+                     aliquota_ipva=ALIQUOTA_IPVA, tabela_tecnica=None, dtype=np.float64):
+    """
+    Simula todos os carros (ou as `linhas` do catálogo) em todos os cenários da grade.
+    O preço da gasolina vale para o carro atual do cliente e para o motor dos híbridos.
+    Carros sem especificação técnica ficam de fora. Retorna um dict com os eixos, as
+    linhas do catálogo simuladas e os arrays compactos descritos no topo do módulo.
+    """
+    catalogo = carregar_catalogo(arquivo_json)
+    eixos = {
+        "preco_gasolina": np.atleast_1d(np.asarray(precos_gasolina, dtype=dtype)),
+        "preco_kwh": np.atleast_1d(np.asarray(precos_kwh, dtype=dtype)),
+        "km_anual": np.atleast_1d(np.asarray(km_anuais, dtype=dtype)),
+        "horizonte_anos": np.atleast_1d(np.asarray(horizontes, dtype=np.int64)),
+    }
+    if (eixos["horizonte_anos"] < 1).any():
+        raise ValueError("Os horizontes devem ser de pelo menos 1 ano.")
+
+    kwh, litros = consumo_por_carro(catalogo, tabela_tecnica)
+    linhas = np.arange(len(catalogo)) if linhas is None else np.asarray(linhas, dtype=np.int64)
+    linhas = linhas[np.isfinite(kwh[linhas]) & np.isfinite(np.asarray(catalogo["Valor"])[linhas])]
+    kwh, litros = kwh[linhas].astype(dtype), litros[linhas].astype(dtype)
+    valor = np.asarray(catalogo["Valor"], dtype=dtype)[linhas]
+
+    g = eixos["preco_gasolina"][None, :, None]
+    k = eixos["preco_kwh"][None, None, :]
+    custo_km = kwh[:, None, None] * k + litros[:, None, None] * g                 # (C, G, K)
+
+    # Economia de combustível em relação ao carro atual a gasolina.
+    km = eixos["km_anual"]
+    custo_gasolina_km = eixos["preco_gasolina"] / consumo_km_por_litro            # (G,)
+    economia_anual = km * (custo_gasolina_km[None, :, None, None] - custo_km[..., None])  # (C, G, K, M)
+    economia_ipva_anual = valor * aliquota_ipva                                    # (C,)
+
+    tabela = carregar_tabela_desvalorizacao(arquivo_json)
+    desvalorizacao = desvalorizacao_por_carro(tabela, catalogo["CodigoFipe"][linhas], eixos["horizonte_anos"])
+    h = eixos["horizonte_anos"].astype(dtype)
+    balanco_liquido = (
+        (economia_anual + economia_ipva_anual[:, None, None, None])[..., None] * h
+        - desvalorizacao[:, None, None, None, :].astype(dtype)
+    )                                                                              # (C, G, K, M, H)
+
+    return {
+        "arquivo_json": arquivo_json,
+        "eixos": eixos,
+        "linhas": linhas,
+        "custo_km": custo_km,
+        "economia_anual": economia_anual,
+        "economia_ipva_anual": economia_ipva_anual,
+        "desvalorizacao": desvalorizacao,
+        "balanco_liquido": balanco_liquido,
+    }
+
+def melhor_carro_por_cenario(resultado, metrica="balanco_liquido"):
+    """Linha do catálogo do melhor carro em cada cenário e o valor da métrica (carros sem dados são ignorados)."""
+    valores = resultado[metrica]
+    preenchido = np.where(np.isnan(valores), -np.inf, valores)
+    melhor = preenchido.argmax(axis=0)
+    return resultado["linhas"][melhor], np.take_along_axis(valores, melhor[None], axis=0)[0]
+
+def tabela_longa(resultado, metrica="balanco_liquido"):
+    """
+    Formato longo: um dict de colunas 1-D (linha do catálogo, um valor por eixo da métrica
+    e a própria métrica), na ordem C das dimensões.
+    """
+    valores = resultado[metrica]
+    nomes = ("linha",) + EIXOS[:valores.ndim - 1]
+    eixos = [resultado["linhas"]] + [resultado["eixos"][nome] for nome in nomes[1:]]
+    grades = np.meshgrid(*eixos, indexing="ij")
+    colunas = {nome: grade.ravel() for nome, grade in zip(nomes, grades)}
+    colunas[metrica] = valores.ravel()
+    return colunas
+
+def salvar_csv(caminho, resultado, metrica="balanco_liquido"):
+    """Grava a tabela longa de `metrica` em CSV (com CodigoFipe e Modelo de cada carro)."""
+    catalogo = carregar_catalogo(resultado["arquivo_json"])
+    colunas = tabela_longa(resultado, metrica)
+    codigos, modelos = catalogo["CodigoFipe"], catalogo["Modelo"]
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["CodigoFipe", "Modelo"] + list(colunas))
+        for i, linha in enumerate(colunas["linha"].tolist()):
+            escritor.writerow([codigos[linha], modelos[linha]] + [colunas[c][i] for c in colunas])
+
+def _grade(texto):
+    """'5' -> [5]; '5:8:7' -> 7 valores de 5 a 8 (inclusive)."""
+    partes = [float(p) for p in texto.split(":")]
+    if len(partes) == 1:
+        return partes
+    if len(partes) != 3:
+        raise argparse.ArgumentTypeError(f"Grade inválida: '{texto}' (use VALOR ou INICIO:FIM:PASSOS).")
+    return np.linspace(partes[0], partes[1], int(partes[2])).tolist()
+
+def _juntar(grades):
+    return [valor for grade in grades for valor in grade]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simula custo, economia e balanço para uma grade de cenários de preços.")
+    parser.add_argument("--gasolina", nargs="+", type=_grade, default=[[PRECO_COMBUSTIVEL_HIBRIDO]],
+                        help="preços do litro da gasolina (valores ou INICIO:FIM:PASSOS)")
+    parser.add_argument("--kwh", nargs="+", type=_grade, default=[[PRECO_KWH_ELETRICO]], help="preços do kWh")
+    parser.add_argument("--km", nargs="+", type=_grade, default=[[20000]], help="km rodados por ano")
+    parser.add_argument("--horizontes", nargs="+", type=int, default=list(HORIZONTES_PADRAO), help="horizontes em anos")
+    parser.add_argument("--arquivo", default=ARQUIVO_PADRAO)
+    parser.add_argument("--saida", help="grava os resultados: .npz (arrays compactos) ou .csv (tabela longa do balanço)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resultado = simular_cenarios(_juntar(args.gasolina), _juntar(args.kwh), _juntar(args.km), args.horizontes,
+                                 arquivo_json=args.arquivo)
+    n_cenarios = int(np.prod(resultado["balanco_liquido"].shape[1:]))
+    print(f"{len(resultado['linhas'])} carros x {n_cenarios} cenários em {time.perf_counter() - inicio:.2f} s.")
+
+    catalogo = carregar_catalogo(args.arquivo)
+    melhores, balancos = melhor_carro_por_cenario(resultado)
+    if n_cenarios <= 20:
+        for indice in np.ndindex(*balancos.shape):
+            g, k, m, h = (resultado["eixos"][nome][i] for nome, i in zip(EIXOS, indice))
+            print(f"  gasolina R$ {g:.2f} | kWh R$ {k:.2f} | {m:,.0f} km/ano | {h} anos -> "
+                  f"{catalogo['Modelo'][melhores[indice]]} (balanço R$ {balancos[indice]:,.2f})")
+
+    if args.saida and args.saida.endswith(".csv"):
+        salvar_csv(args.saida, resultado)
+        print(f"Tabela longa salva em '{args.saida}'.")
+    elif args.saida:
+        np.savez(args.saida, linhas=resultado["linhas"], **{f"eixo_{n}": v for n, v in resultado["eixos"].items()},
+                 **{n: resultado[n] for n in ("custo_km", "economia_anual", "economia_ipva_anual",
+                                              "desvalorizacao", "balanco_liquido")})
+        print(f"Arrays salvos em '{args.saida}'.")
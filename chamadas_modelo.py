@@ -0,0 +1,221 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from instrumentacao import contar, registrar_duracao
+
+# --- CHAMADAS AO MODELO: LIMITE DE TAXA, CONCORRÊNCIA E RETENTATIVAS ---
+# Toda chamada ao modelo passa por um ClienteModelo:
+#   1. balde de tokens: no máximo `chamadas_por_segundo` em média (com rajadas de `rajada`);
+#   2. semáforo: no máximo `max_simultaneas` chamadas em andamento;
+#   3. erros de cota (429) e transitórios (timeout, 5xx) são repetidos com espera
+#      exponencial com jitter; um 429 também pausa o balde, freando todos os quiosques
+#      do processo em vez de cada um insistir por conta própria;
+#   4. erros de entrada (400, prompt bloqueado) sobem na hora: repetir não adianta.
+# Chamadas idênticas simultâneas (mesma chave) são coalescidas: só uma vai ao modelo.
+#
+#   cliente = ClienteModelo(chamadas_por_segundo=2, max_simultaneas=8)
+#   resposta = cliente.chamar(chat.send_message, texto)
+#   texto = cliente.coalescer(chave, responder_sem_streaming, chat, texto)
+
+CHAMADAS_POR_SEGUNDO = 2.0
+RAJADA = 5
+MAX_SIMULTANEAS = 8
+MAX_TENTATIVAS = 4
+ESPERA_BASE = 0.5    # segundos (dobra a cada tentativa)
+ESPERA_MAXIMA = 20.0
+PAUSA_COTA = 2.0     # pausa mínima do balde depois de um 429
+TEMPO_MAXIMO = 60.0  # prazo total de uma chamada, contando filas e esperas
+
+TIPOS_REPETIVEIS = ("cota", "transitorio")
+_CODIGOS_TRANSITORIOS = (408, 500, 502, 503, 504)
+_NOMES_COTA = ("ResourceExhausted", "TooManyRequests")
+_NOMES_TRANSITORIOS = ("DeadlineExceeded", "ServiceUnavailable", "InternalServerError", "GatewayTimeout", "BadGateway")
+_NOMES_ENTRADA = ("InvalidArgument", "BlockedPromptException", "StopCandidateException", "FailedPrecondition")
+
+class ErroChamadaModelo(Exception):
+    """Falha definitiva de uma chamada ao modelo, já classificada (`tipo`) e após `tentativas`."""
+
+    def __init__(self, tipo, tentativas, causa=None, espera_sugerida=None):
+        self.tipo = tipo
+        self.tentativas = tentativas
+        self.causa = causa
+        self.espera_sugerida = espera_sugerida  # segundos até valer a pena tentar de novo (cota)
+        detalhe = f": {causa}" if causa is not None else ""
+        super().__init__(f"falha de {tipo} após {tentativas} tentativa(s){detalhe}")
+
+    @property
+    def repetivel(self):
+        return self.tipo in TIPOS_REPETIVEIS
+
+def classificar_erro(erro):
+    """
+    'cota' (429), 'transitorio' (timeout, conexão, 5xx), 'entrada' (4xx, prompt bloqueado)
+    ou 'desconhecido'. Usa o código HTTP das exceções do google.api_core quando existe e o
+    nome da classe, sem importar o SDK.
+    """
+    codigo = getattr(erro, "code", None)
+    try:
+        codigo = int(codigo)
+    except (TypeError, ValueError):
+        codigo = None  # ex.: erros gRPC, em que code é um método
+    nome = type(erro).__name__
+
+    if codigo == 429 or nome in _NOMES_COTA:
+        return "cota"
+    if isinstance(erro, (TimeoutError, ConnectionError)) or codigo in _CODIGOS_TRANSITORIOS or nome in _NOMES_TRANSITORIOS:
+        return "transitorio"
+    if (codigo is not None and 400 <= codigo < 500) or nome in _NOMES_ENTRADA:
+        return "entrada"
+    return "desconhecido"
+
+def calcular_espera(tentativa, base=ESPERA_BASE, maximo=ESPERA_MAXIMA, rng=random):
+    """Espera exponencial com jitter completo: sorteada em [0, min(maximo, base * 2^tentativa)]."""
+    return rng.uniform(0.0, min(maximo, base * 2 ** tentativa))
+
+class BaldeTokens:
+    """Limite de taxa: `taxa` fichas por segundo, acumulando até `capacidade` (a rajada permitida)."""
+
+    def __init__(self, taxa=CHAMADAS_POR_SEGUNDO, capacidade=RAJADA, relogio=time.monotonic):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._relogio = relogio
+        self._fichas = float(capacidade)
+        self._atualizado_em = relogio()
+        self._pausado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _reabastecer(self, agora):
+        self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado_em) * self.taxa)
+        self._atualizado_em = agora
+
+    def tentar_adquirir(self):
+        """Consome uma ficha se houver. Retorna 0 em caso de sucesso ou quantos segundos faltam para a próxima."""
+        with self._lock:
+            agora = self._relogio()
+            if agora < self._pausado_ate:
+                return self._pausado_ate - agora
+            self._reabastecer(agora)
+            if self._fichas >= 1.0:
+                self._fichas -= 1.0
+                return 0.0
+            return (1.0 - self._fichas) / self.taxa
+
+    def adquirir(self, tempo_maximo=None):
+        """Bloqueia até conseguir uma ficha. Retorna a espera (s), ou None se passaria de `tempo_maximo`."""
+        inicio = self._relogio()
+        while True:
+            falta = self.tentar_adquirir()
+            if falta == 0.0:
+                return self._relogio() - inicio
+            if tempo_maximo is not None and self._relogio() - inicio + falta > tempo_maximo:
+                return None
+            time.sleep(falta)
+
+    def pausar(self, segundos):
+        """Esvazia o balde e segura novas fichas por `segundos` (usado quando o servidor responde 429)."""
+        with self._lock:
+            agora = self._relogio()
+            self._pausado_ate = max(self._pausado_ate, agora + segundos)
+            self._fichas = 0.0
+            self._atualizado_em = self._pausado_ate
+
+class ChamadasUnicas:
+    """Coalescência (single-flight): chamadas simultâneas com a mesma chave esperam o resultado da primeira."""
+
+    def __init__(self):
+        self._em_andamento = {}  # chave -> Future
+        self._lock = threading.Lock()
+
+    def executar(self, chave, funcao, *args, **kwargs):
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = self._em_andamento[chave] = Future()
+        if not lider:
+            contar("llm.coalescidas")
+            return futuro.result()
+
+        try:
+            resultado = funcao(*args, **kwargs)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+
+class ClienteModelo:
+    """Envolve as chamadas ao modelo com limite de taxa, limite de concorrência, retentativas e coalescência."""
+
+    def __init__(self, chamadas_por_segundo=CHAMADAS_POR_SEGUNDO, rajada=RAJADA, max_simultaneas=MAX_SIMULTANEAS,
+                 max_tentativas=MAX_TENTATIVAS, espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA,
+                 tempo_maximo=TEMPO_MAXIMO, semente=None):
+        self.balde = BaldeTokens(chamadas_por_segundo, rajada)
+        self.max_simultaneas = max_simultaneas
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.tempo_maximo = tempo_maximo
+        self._semaforo = threading.BoundedSemaphore(max_simultaneas)
+        self._unicas = ChamadasUnicas()
+        self._rng = random.Random(semente)
+
+    def chamar(self, funcao, *args, **kwargs):
+        """
+        Chama funcao(*args, **kwargs) respeitando os limites e repetindo erros de cota e
+        transitórios. Levanta ErroChamadaModelo quando desiste (a causa fica em __cause__).
+        A função não pode ter efeito colateral quando falha (o ChatSession do SDK só grava
+        o histórico depois de uma resposta bem-sucedida).
+        """
+        prazo = time.monotonic() + self.tempo_maximo
+        for tentativa in range(self.max_tentativas):
+            espera = self.balde.adquirir(prazo - time.monotonic())
+            if espera is None:
+                contar("llm.chamadas", resultado="limite_local")
+                raise ErroChamadaModelo("cota", tentativa, "limite de chamadas do cliente", 1.0 / self.balde.taxa)
+            registrar_duracao("llm.espera_limite_taxa", espera)
+
+            inicio = time.monotonic()
+            if not self._semaforo.acquire(timeout=max(0.0, prazo - inicio)):
+                contar("llm.chamadas", resultado="limite_concorrencia")
+                raise ErroChamadaModelo("transitorio", tentativa, "muitas chamadas simultâneas")
+            registrar_duracao("llm.espera_concorrencia", time.monotonic() - inicio)
+            try:
+                resultado = funcao(*args, **kwargs)
+            except Exception as e:
+                tipo = classificar_erro(e)
+                erro = e
+            else:
+                contar("llm.chamadas", resultado="ok")
+                return resultado
+            finally:
+                self._semaforo.release()
+
+            contar("llm.chamadas", resultado=tipo)
+            espera = calcular_espera(tentativa, self.espera_base, self.espera_maxima, self._rng)
+            sugerida = None
+            if tipo == "cota":
+                # Quem manda a próxima chamada é o balde, não só esta thread.
+                espera = max(espera, float(getattr(erro, "retry_after", None) or 0.0))
+                sugerida = max(PAUSA_COTA, espera)
+                self.balde.pausar(sugerida)
+            ultima = tentativa + 1 == self.max_tentativas
+            if tipo not in TIPOS_REPETIVEIS or ultima or time.monotonic() + espera > prazo:
+                raise ErroChamadaModelo(tipo, tentativa + 1, erro, sugerida) from erro
+            contar("llm.retentativas", tipo=tipo)
+            time.sleep(espera)
+
+    def coalescer(self, chave, funcao, *args, **kwargs):
+        """Executa funcao(*args, **kwargs) uma vez por chave em andamento; sem chave, chama direto."""
+        if chave is None:
+            return funcao(*args, **kwargs)
+        return self._unicas.executar(chave, funcao, *args, **kwargs)
+
+# Cliente padrão do processo (a cota da API é por chave, então o limite é compartilhado)
+CLIENTE_PADRAO = ClienteModelo()
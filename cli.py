@@ -0,0 +1,123 @@
+import argparse
+import sys
+
+# --- PONTO DE ENTRADA ÚNICO ---
+# python cli.py recomendar | lote PERFIS SAIDA | desvalorizar CODIGO | chat | aed
+# Opções globais: --metricas BASE (exporta JSONL + Prometheus) e --perfil ARQUIVO (cProfile).
+# Este módulo só importa argparse: cada subcomando importa o próprio módulo (e, por
+# tabela, numpy/pandas/matplotlib/Gemini) dentro do handler, só quando é executado.
+
+def _recomendar(args):
+    from recomendar_carro import PERFIL_USUARIO, main
+
+    perfil = dict(PERFIL_USUARIO)
+    if args.preco_atual is not None:
+        perfil['preco_carro_atual'] = args.preco_atual
+    if args.km_anual is not None:
+        perfil['km_rodados_anual'] = args.km_anual
+    if args.viagens_longas is not None:
+        perfil['viagens_longas'] = args.viagens_longas
+    main(perfil, gerar_grafico=not args.sem_grafico)
+
+def _lote(args):
+    from lote_recomendacoes import recomendar_arquivo
+
+    resumo = recomendar_arquivo(args.entrada, args.saida, args.top_k, args.anos, args.processos,
+                                pasta_graficos=args.graficos, faixas=args.faixas, recomecar=args.recomecar)
+    print(f"{resumo['processados']} perfis processados ({resumo['erros']} com erro, "
+          f"{resumo['pulados']} já feitos) -> '{args.saida}'.")
+
+def _desvalorizar(args):
+    from desvalorizacao import gerar_imagem_desvalorizacao, prever_valor_futuro_ml
+
+    dados = prever_valor_futuro_ml(args.codigo_fipe, args.anos, verbose=True)
+    if dados is None:
+        return 1
+    if args.grafico:
+        gerar_imagem_desvalorizacao(dados, args.grafico)
+
+def _chat(args):
+    from assistente_carro_rag import main
+
+    main(
+        streaming=not args.sem_streaming,
+        usar_modelo_local=args.modelo_local,
+        mostrar_latencia=args.latencia,
+        usar_cache=not args.sem_cache,
+        cache_disco=args.cache_disco,
+    )
+
+def _aed(args):
+    from analise_explatoria import main
+
+    main(args.arquivo, args.pasta, args.processos, args.forcar, args.modo)
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="VendedorAI BYD: recomendação, desvalorização, chat e AED.")
+    parser.add_argument("--metricas", metavar="BASE", help="ao final, grava BASE.jsonl e BASE.prom com as métricas da execução")
+    parser.add_argument("--perfil", metavar="ARQUIVO", help="captura um cProfile da execução neste arquivo (.prof)")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    recomendar = subcomandos.add_parser("recomendar", aliases=["recommend"], help="recomenda um carro para o perfil")
+    recomendar.add_argument("--preco-atual", type=float, help="preço do carro atual do cliente (R$)")
+    recomendar.add_argument("--km-anual", type=float, help="km rodados por ano")
+    recomendar.add_argument("--viagens-longas", type=float, help="distância das viagens longas (km)")
+    recomendar.add_argument("--sem-grafico", action="store_true", help="não gera a imagem de desvalorização")
+    recomendar.set_defaults(funcao=_recomendar)
+
+    lote = subcomandos.add_parser("lote", aliases=["batch"], help="recomenda para um arquivo de perfis (JSONL/CSV)")
+    lote.add_argument("entrada", help="perfis de clientes: .jsonl ou .csv")
+    lote.add_argument("saida", help="JSONL de resultados (retomado se já existir)")
+    lote.add_argument("--top-k", type=int, default=3, help="carros recomendados por perfil")
+    lote.add_argument("--anos", type=int, default=3, help="horizonte do balanço líquido em anos")
+    lote.add_argument("--processos", type=int, default=None, help="número de processos (padrão: núcleos da CPU)")
+    lote.add_argument("--graficos", nargs="?", const="images", metavar="PASTA",
+                      help="gera os gráficos de desvalorização dos carros recomendados")
+    lote.add_argument("--faixas", action="store_true", help="inclui a faixa de 90%% do balanço (bootstrap)")
+    lote.add_argument("--recomecar", action="store_true", help="apaga a saída existente em vez de retomar")
+    lote.set_defaults(funcao=_lote)
+
+    desvalorizar = subcomandos.add_parser("desvalorizar", aliases=["depreciate"],
+                                          help="prevê a desvalorização de um código FIPE")
+    desvalorizar.add_argument("codigo_fipe")
+    desvalorizar.add_argument("--anos", type=int, default=3, help="horizonte da previsão em anos")
+    desvalorizar.add_argument("--grafico", metavar="ARQUIVO", help="salva o gráfico de desvalorização neste arquivo")
+    desvalorizar.set_defaults(funcao=_desvalorizar)
+
+    chat = subcomandos.add_parser("chat", help="conversa com a VendedorAI")
+    chat.add_argument("--sem-streaming", action="store_true", help="espera a resposta completa antes de imprimir")
+    chat.add_argument("--modelo-local", action="store_true", help="usa o modelo falso offline (sem API key)")
+    chat.add_argument("--latencia", action="store_true", help="mostra tempo até o primeiro token e latência total por turno")
+    chat.add_argument("--sem-cache", action="store_true", help="sempre consulta o modelo, sem cache de respostas")
+    chat.add_argument("--cache-disco", metavar="ARQUIVO", help="persiste o cache de respostas em um arquivo SQLite")
+    chat.set_defaults(funcao=_chat)
+
+    aed = subcomandos.add_parser("aed", aliases=["eda"], help="gera o relatório de análise exploratória")
+    aed.add_argument("arquivo", nargs="?", default="dataset_byd_completo_custos.json")
+    aed.add_argument("--pasta", default="graficos_AED", help="pasta de saída dos gráficos e estatísticas")
+    aed.add_argument("--processos", type=int, default=None, help="número de processos (padrão: núcleos da CPU)")
+    aed.add_argument("--forcar", action="store_true", help="refaz todos os gráficos mesmo sem mudança nos dados")
+    aed.add_argument("--modo", choices=["detalhado", "agregado"], default=None,
+                     help="padrão: agregado para datasets grandes")
+    aed.set_defaults(funcao=_aed)
+
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    try:
+        if args.perfil:
+            from instrumentacao import capturar_perfil
+
+            with capturar_perfil(args.perfil):
+                return args.funcao(args) or 0
+        return args.funcao(args) or 0
+    finally:
+        if args.metricas:
+            from instrumentacao import exportar_metricas
+
+            jsonl, prometheus = exportar_metricas(args.metricas)
+            print(f"Métricas salvas em '{jsonl}' e '{prometheus}'.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,281 @@
-import json
 import os
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.pipeline import make_pipeline
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-from matplotlib.ticker import FuncFormatter
 
+from catalogo import ANO_ZERO_KM, converter_mes_referencia, carregar_catalogo
+from instrumentacao import contar, cronometrado
+
+ANO_ATUAL = 2026  # usado só quando o catálogo não tem MesReferencia válido
+IDADE_MAXIMA = 30
+GRAU_POLINOMIO = 2
+
+# Família da curva de cada código (a seleção de modelos pode trocar o polinômio padrão)
+FAMILIA_POLINOMIO = 0
+FAMILIA_EXPONENCIAL = 1  # valor = exp(polinômio), ex.: decaimento exponencial
+GRAU_ENCOLHIDO = -1      # curva puxada para a do grupo: não sai de um ajuste só com os pontos do código
+
+class CurvaPolinomial:
+    """Curva de desvalorização valor(idade) = c0 + c1*idade + c2*idade² (interface `predict` do sklearn)."""
+
+    def __init__(self, coeficientes):
+        self.coeficientes = np.asarray(coeficientes, dtype=np.float64)
+
+    def predict(self, idades):
+        return np.polynomial.polynomial.polyval(np.ravel(np.asarray(idades, dtype=np.float64)), self.coeficientes)
+
+class CurvaExponencial(CurvaPolinomial):
+    """Curva valor(idade) = exp(c0 + c1*idade) (decaimento exponencial quando c1 < 0)."""
+
+    def predict(self, idades):
+        return np.exp(super().predict(idades))
+
+def criar_curva(coeficientes, familia=FAMILIA_POLINOMIO):
+    return CurvaExponencial(coeficientes) if familia == FAMILIA_EXPONENCIAL else CurvaPolinomial(coeficientes)
+
+def ajustar_polinomios_agrupados(grupos, x, y, n_grupos, grau=GRAU_POLINOMIO, pesos=None):
+    """
+    Ajusta um polinômio de grau `grau` por grupo em uma única passada vetorizada.
+    Os pontos são organizados em uma matriz (grupos x pontos) com padding; cada grupo
+    é centralizado (como o LinearRegression com intercepto) e resolvido por pseudo-inversa
+    em lote, o que dá a solução de norma mínima quando há menos pontos que coeficientes.
+    `pesos` opcionais (mesmo formato de x) permitem mínimos quadrados ponderados.
+    Retorna um array (n_grupos, grau + 1) com os coeficientes em ordem crescente de potência.
+    """
+    grupos = np.asarray(grupos, dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    pesos = np.ones_like(x) if pesos is None else np.asarray(pesos, dtype=np.float64)
+
+    ordem = np.argsort(grupos, kind="stable")
+    grupos, x, y, pesos = grupos[ordem], x[ordem], y[ordem], pesos[ordem]
+    contagem = np.bincount(grupos, minlength=n_grupos)
+    inicio = np.concatenate(([0], np.cumsum(contagem)[:-1]))
+    coluna = np.arange(len(grupos)) - inicio[grupos]
+    largura = max(int(contagem.max()) if len(contagem) else 0, 1)
+
+    W = np.zeros((n_grupos, largura))
+    X = np.zeros((n_grupos, largura, grau))
+    Y = np.zeros((n_grupos, largura))
+    W[grupos, coluna] = pesos
+    Y[grupos, coluna] = y
+    X[grupos, coluna] = x[:, None] ** np.arange(1, grau + 1)
+
+    soma_pesos = np.maximum(W.sum(axis=1), 1e-300)
+    media_x = np.einsum("gl,glp->gp", W, X) / soma_pesos[:, None]
+    media_y = (W * Y).sum(axis=1) / soma_pesos
+
+    raiz_w = np.sqrt(W)
+    Xc = (X - media_x[:, None, :]) * raiz_w[:, :, None]
+    Yc = (Y - media_y[:, None]) * raiz_w
+
+    inclinacoes = np.einsum("gpl,gl->gp", np.linalg.pinv(Xc, rcond=1e-10), Yc)
+    intercepto = media_y - np.einsum("gp,gp->g", media_x, inclinacoes)
+    return np.column_stack([intercepto, inclinacoes])
+
+class TabelaDesvalorizacao:
+    """
+    Coeficientes de desvalorização de todos os CodigoFipe do catálogo, ajustados uma única vez.
+    Guarda por código: coeficientes do polinômio, valor zero km, número de pontos e os pontos
+    históricos (idade, ano, valor médio) usados no ajuste, em arrays achatados com offsets.
+    `familias` e `graus` (opcionais, da seleção de modelos) dizem a família e o grau da curva
+    de cada código (GRAU_ENCOLHIDO para curvas encolhidas para o grupo); o padrão é o
+    polinômio do tamanho de `coeficientes`.
+    """
+
+    def __init__(self, codigos, modelos_base, coeficientes, valor_zero, n_linhas_historico,
+                 n_pontos, offsets, hist_ano, hist_idade, hist_valor, ano_atual=ANO_ATUAL, familias=None,
+                 graus=None):
+        self.codigos = list(codigos)
+        self.modelos_base = list(modelos_base)
+        self.coeficientes = coeficientes
+        self.valor_zero = valor_zero
+        self.n_linhas_historico = n_linhas_historico
+        self.n_pontos = n_pontos
+        self.offsets = offsets
+        self.hist_ano = hist_ano
+        self.hist_idade = hist_idade
+        self.hist_valor = hist_valor
+        self.ano_atual = ano_atual
+        self.familias = np.zeros(len(self.codigos), dtype=np.int8) if familias is None else np.asarray(familias, dtype=np.int8)
+        self.graus = (np.full(len(self.codigos), coeficientes.shape[1] - 1, dtype=np.int8) if graus is None
+                      else np.asarray(graus, dtype=np.int8))
+        self._posicoes = {codigo: i for i, codigo in enumerate(self.codigos)}
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def posicao(self, codigo_fipe):
+        """Linha do código na tabela, ou -1 se não existir."""
+        return self._posicoes.get(codigo_fipe, -1)
+
+    @property
+    def validos(self):
+        """Códigos com valor zero km e ao menos 2 pontos históricos."""
+        return (self.n_pontos >= 2) & np.isfinite(self.valor_zero)
+
+    def historico(self, posicao):
+        """Pontos históricos (anos, idades, valores) de uma linha da tabela."""
+        fatia = slice(self.offsets[posicao], self.offsets[posicao + 1])
+        return self.hist_ano[fatia], self.hist_idade[fatia], self.hist_valor[fatia]
+
+    def curva(self, posicao):
+        """Curva ajustada de uma linha da tabela (objeto com predict)."""
+        return criar_curva(self.coeficientes[posicao], self.familias[posicao])
+
+    def prever(self, codigos, anos_para_prever):
+        """
+        Valores previstos após 1..N anos para vários códigos em uma única chamada.
+        Retorna um array (len(codigos), anos_para_prever); linhas de códigos
+        desconhecidos ou sem dados suficientes ficam com NaN.
+        """
+        posicoes = np.array([self.posicao(c) for c in codigos], dtype=np.int64)
+        return self.prever_posicoes(posicoes, anos_para_prever)
+
+    def prever_posicoes(self, posicoes, anos_para_prever):
+        posicoes = np.asarray(posicoes, dtype=np.int64)
+        idades = np.arange(1, anos_para_prever + 1, dtype=np.float64)
+        potencias = idades[:, None] ** np.arange(self.coeficientes.shape[1])
+        valores = self.coeficientes[posicoes] @ potencias.T
+        exponenciais = self.familias[posicoes] == FAMILIA_EXPONENCIAL
+        if exponenciais.any():
+            with np.errstate(over="ignore"):
+                valores[exponenciais] = np.exp(valores[exponenciais])
+        invalidos = (posicoes < 0) | ~self.validos[posicoes]
+        valores[invalidos] = np.nan
+        return valores
+
+    def salvar(self, caminho):
+        np.savez(
+            caminho, codigos=np.array(self.codigos), modelos_base=np.array(self.modelos_base),
+            coeficientes=self.coeficientes, valor_zero=self.valor_zero,
+            n_linhas_historico=self.n_linhas_historico, n_pontos=self.n_pontos, offsets=self.offsets,
+            hist_ano=self.hist_ano, hist_idade=self.hist_idade, hist_valor=self.hist_valor,
+            ano_atual=self.ano_atual, familias=self.familias, graus=self.graus,
+        )
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho) as dados:
+            campos = {nome: dados[nome] for nome in dados.files}
+        campos["ano_atual"] = int(campos["ano_atual"])
+        return cls(**campos)
+
+def ano_atual_de_referencia(meses, anos_modelo=()):
+    """
+    Ano "atual" dos dados: o ano do mês de referência mais recente (AAAAMM) ou, se a
+    FIPE já lista o ano-modelo seguinte (o que acontece no segundo semestre), esse
+    ano-modelo. Sem mês válido, cai em ANO_ATUAL.
+    """
+    meses = [m for m in meses if m]
+    if not meses:
+        return ANO_ATUAL
+    anos_modelo = np.asarray(anos_modelo, dtype=np.int64)
+    anos_modelo = anos_modelo[anos_modelo != ANO_ZERO_KM]
+    return int(max(max(meses) // 100, anos_modelo.max(initial=0)))
+
+def ano_atual_do_catalogo(catalogo):
+    return ano_atual_de_referencia(
+        [converter_mes_referencia(m) for m in catalogo.categorias("MesReferencia")], catalogo["AnoModelo"]
+    )
+
+@cronometrado("desvalorizacao.ajuste_tabela")
+def ajustar_tabela_de_arrays(codigo, valor, ano, zero_km, codigos, modelos_base, ano_atual=ANO_ATUAL,
+                             grau=GRAU_POLINOMIO, idade=None):
+    """
+    Núcleo do ajuste da tabela sobre arrays por linha (código inteiro, valor, ano-modelo,
+    flag zero km). `idade` opcional dá a idade de cada linha na data da observação
+    (séries de vários meses); por padrão é ano_atual - ano-modelo.
+    """
+    codigo = np.asarray(codigo)
+    valor = np.asarray(valor, dtype=np.float64)
+    ano = np.asarray(ano, dtype=np.int64)
+    zero_km = np.asarray(zero_km, dtype=bool)
+    idade = ano_atual - ano if idade is None else np.asarray(idade, dtype=np.int64)
+    n_codigos = len(codigos)
+
+    validas = (codigo >= 0) & np.isfinite(valor)
+    codigo, valor, zero_km, idade = codigo[validas], valor[validas], zero_km[validas], idade[validas]
+
+    # Valor zero km (média) e número de linhas de histórico por código.
+    n_zero = np.bincount(codigo[zero_km], minlength=n_codigos)
+    soma_zero = np.bincount(codigo[zero_km], weights=valor[zero_km], minlength=n_codigos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valor_zero = np.where(n_zero > 0, soma_zero / n_zero, np.nan)
+    n_linhas_historico = np.bincount(codigo[~zero_km], minlength=n_codigos)
+
+    # Média por (código, idade) dentro da janela de idade.
+    usar = ~zero_km & (idade >= 0) & (idade < IDADE_MAXIMA)
+    chave = codigo[usar].astype(np.int64) * IDADE_MAXIMA + idade[usar]
+    chaves, inverso = np.unique(chave, return_inverse=True)
+    medias = np.bincount(inverso, weights=valor[usar]) / np.bincount(inverso)
+    grupo_ponto = chaves // IDADE_MAXIMA
+    idade_ponto = chaves % IDADE_MAXIMA
+
+    # Ordena os pontos de cada código por ano-modelo (igual ao groupby do pandas).
+    ordem = np.lexsort((-idade_ponto, grupo_ponto))
+    grupo_ponto, idade_ponto, medias = grupo_ponto[ordem], idade_ponto[ordem], medias[ordem]
+
+    n_pontos = np.bincount(grupo_ponto, minlength=n_codigos)
+    # Códigos sem zero km ou com poucas linhas não entram no modelo.
+    n_pontos[(n_linhas_historico < 2) | (n_zero == 0)] = 0
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(grupo_ponto, minlength=n_codigos))))
+
+    coeficientes = ajustar_polinomios_agrupados(grupo_ponto, idade_ponto, medias, n_codigos, grau)
+
+    return TabelaDesvalorizacao(
+        codigos, modelos_base, coeficientes, valor_zero,
+        n_linhas_historico, n_pontos, offsets, ano_atual - idade_ponto, idade_ponto,
+        medias, ano_atual=ano_atual,
+    )
+
+def ajustar_tabela_desvalorizacao(catalogo, ano_atual=None, grau=GRAU_POLINOMIO):
+    """
+    Ajusta a curva de desvalorização de todos os CodigoFipe do catálogo de uma vez.
+    Mesmas regras do modelo por código: média do valor por ano-modelo, idade em [0, 30),
+    valor zero km pela média das linhas com AnoModelo 32000. Sem `ano_atual`, ele vem
+    do MesReferencia do catálogo (veja ano_atual_do_catalogo).
+    """
+    if ano_atual is None:
+        ano_atual = ano_atual_do_catalogo(catalogo)
+    codigo = np.asarray(catalogo.codigos("CodigoFipe"))
+    n_codigos = len(catalogo.categorias("CodigoFipe"))
+
+    # ModeloBase da primeira linha de cada código.
+    presentes, primeira_linha = np.unique(codigo, return_index=True)
+    primeira = np.full(n_codigos, -1, dtype=np.int64)
+    primeira[presentes[presentes >= 0]] = primeira_linha[presentes >= 0]
+    textos_base = catalogo["ModeloBase"]
+    modelos_base = [textos_base[i] if i >= 0 else None for i in primeira]
+
+    return ajustar_tabela_de_arrays(
+        codigo, catalogo["Valor"], catalogo["AnoModelo"], catalogo["ZeroKm"],
+        catalogo.categorias("CodigoFipe"), modelos_base, ano_atual, grau,
+    )
+
+# Tabelas já ajustadas neste processo: (versão do catálogo, ano, grau, com seleção) -> tabela
+_TABELAS = {}
+
+def carregar_tabela_desvalorizacao(arquivo_json="dataset_byd_completo_custos.json", ano_atual=None, usar_selecao=True):
+    """
+    Retorna a tabela de desvalorização do catálogo, ajustando-a só na primeira chamada.
+    Se houver uma seleção de modelos salva para esta versão do catálogo
+    (selecao_desvalorizacao.py), cada código usa a curva escolhida nela.
+    """
+    catalogo = carregar_catalogo(arquivo_json)
+    if ano_atual is None:
+        ano_atual = ano_atual_do_catalogo(catalogo)
+    chave = (catalogo.versao, ano_atual, GRAU_POLINOMIO, usar_selecao)
+    tabela = _TABELAS.get(chave)
+    contar("desvalorizacao.tabela_cache", resultado="falha" if tabela is None else "acerto")
+    if tabela is None:
+        tabela = ajustar_tabela_desvalorizacao(catalogo, ano_atual)
+        if usar_selecao:
+            from selecao_desvalorizacao import aplicar_selecao_salva
+
+            tabela = aplicar_selecao_salva(tabela, arquivo_json, catalogo.versao)
+        _TABELAS[chave] = tabela
+    return tabela
+
+@cronometrado("desvalorizacao.previsao")
 def prever_valor_futuro_ml(
     codigo_fipe: str,
     anos_para_prever: int,
@@ -21,59 +288,34 @@ def prever_valor_futuro_ml(
     Retorna um dicionário com os dados da previsão ou None em caso de erro.
     """
     try:
-        with open(arquivo_json, "r", encoding="utf-8") as f:
-            dados = json.load(f)
+        tabela = carregar_tabela_desvalorizacao(arquivo_json)
     except FileNotFoundError:
         print(f"Erro: O arquivo '{arquivo_json}' não foi encontrado.")
         return None
-        
-    df = pd.DataFrame(dados)
-
-    df["Valor"] = (
-        df["Valor"]
-        .str.replace("R$", "", regex=False)
-        .str.replace(".", "", regex=False)
-        .str.replace(",", ".", regex=False)
-        .astype(float)
-    )
-    df["AnoModelo"] = pd.to_numeric(df["AnoModelo"], errors="coerce")
-    df.dropna(subset=["AnoModelo", "Valor"], inplace=True)
 
-    df_modelo = df[df["CodigoFipe"] == codigo_fipe].copy()
-    if df_modelo.empty:
+    posicao = tabela.posicao(codigo_fipe)
+    if posicao < 0:
         print(f"Nenhum veículo encontrado com CodigoFipe {codigo_fipe}")
         return None
 
-    df_real = df_modelo[df_modelo["AnoModelo"] < 32000]
-    df_zero = df_modelo[df_modelo["AnoModelo"] == 32000]
-
-    if len(df_real) < 2 or df_zero.empty:
+    if tabela.n_linhas_historico[posicao] < 2 or not np.isfinite(tabela.valor_zero[posicao]):
         print("Faltam dados de histórico (mínimo 2) ou valor zero km para esse modelo.")
         return None
 
-    df_real = df_real.groupby("AnoModelo")["Valor"].mean().reset_index()
-    modelo_base = df_modelo["ModeloBase"].iloc[0]
-
-    ano_atual = 2026
-    df_real["IdadeVeiculo"] = ano_atual - df_real["AnoModelo"]
-    
-    df_real = df_real[(df_real["IdadeVeiculo"] >= 0) & (df_real["IdadeVeiculo"] < 30)]
-
-    if len(df_real) < 2:
+    if tabela.n_pontos[posicao] < 2:
         print("Faltam dados de histórico suficientes (após filtro de idade) para esse modelo.")
         return None
 
-    X = df_real[["IdadeVeiculo"]]
-    y = df_real["Valor"]
+    import pandas as pd
 
-    grau_polinomio = 2
-    model = make_pipeline(PolynomialFeatures(degree=grau_polinomio), LinearRegression())
-    
-    model.fit(X, y)
+    anos, idades, valores = tabela.historico(posicao)
+    df_real = pd.DataFrame({"AnoModelo": anos, "Valor": valores, "IdadeVeiculo": idades})
+    modelo_base = tabela.modelos_base[posicao]
+    model = tabela.curva(posicao)
 
-    valor_zero = df_zero["Valor"].mean()
+    valor_zero = tabela.valor_zero[posicao]
     idades_futuras = np.array(range(1, anos_para_prever + 1)).reshape(-1, 1)
-    valores_previstos = model.predict(idades_futuras)
+    valores_previstos = tabela.prever_posicoes([posicao], anos_para_prever)[0]
 
     desvalorizacao_total = valor_zero - valores_previstos[-1]
     desvalorizacao_total = max(0, desvalorizacao_total)
@@ -100,12 +342,32 @@ def prever_valor_futuro_ml(
         "modelo_regressao": model,
     }
 
-def gerar_imagem_desvalorizacao(dados_previsao: dict, salvar_em: str):
-    """Gera e salva uma imagem com a foto do carro e o gráfico de desvalorização."""
+def ler_imagem_carro(modelo_base):
+    """Lê a foto do carro em images/<ModeloBase>.png, ou None se não existir."""
+    import matplotlib.image as mpimg
+
+    img_path = f"images/{modelo_base}.png"
+    try:
+        if not os.path.exists("images"): os.makedirs("images")
+        return mpimg.imread(img_path)
+    except FileNotFoundError:
+        return None
+
+@cronometrado("desvalorizacao.grafico")
+def gerar_imagem_desvalorizacao(dados_previsao: dict, salvar_em: str, imagem_carro=None, verbose=True):
+    """
+    Gera e salva uma imagem com a foto do carro e o gráfico de desvalorização.
+    `imagem_carro` permite passar a foto já decodificada (renderização em lote);
+    sem ela, a foto é lida de images/<ModeloBase>.png.
+    """
     if not dados_previsao:
         print("Dados de previsão inválidos.")
         return
 
+    # matplotlib só é importado quando um gráfico é de fato gerado (~0,3 s de import).
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import FuncFormatter
+
     # --- Configurações do Plot ---
     plt.style.use("seaborn-v0_8-darkgrid")
     fig = plt.figure(figsize=(16, 8))
@@ -122,12 +384,11 @@ def gerar_imagem_desvalorizacao(dados_previsao: dict, salvar_em: str):
     # --- Imagem do Carro ---
     ax_img = fig.add_subplot(gs[1, 0])
     img_path = f"images/{dados_previsao['modelo_base']}.png"
-    try:
-        if not os.path.exists("images"): os.makedirs("images")
-        img = mpimg.imread(img_path)
+    img = imagem_carro if imagem_carro is not None else ler_imagem_carro(dados_previsao['modelo_base'])
+    if img is not None:
         ax_img.imshow(img)
         ax_img.set_title("Modelo", fontsize=14, pad=10)
-    except FileNotFoundError:
+    else:
         ax_img.text(0.5, 0.5, f"Imagem não encontrada\n(coloque em {img_path})",
                     ha='center', va='center', fontsize=12, style='italic')
     ax_img.axis('off')
@@ -163,9 +424,14 @@ def gerar_imagem_desvalorizacao(dados_previsao: dict, salvar_em: str):
                   transform=ax_graph.transAxes, ha='right', va='bottom',
                   fontsize=12, bbox=dict(boxstyle='round,pad=0.5', fc='wheat', alpha=0.7))
 
-    plt.tight_layout(pad=3.0)
-    plt.savefig(salvar_em, dpi=150)
-    print(f"\nImagem da análise salva em '{salvar_em}'")
+    try:
+        fig.tight_layout(pad=3.0)
+        fig.savefig(salvar_em, dpi=150)
+    finally:
+        # Sem fechar, o pyplot mantém todas as figuras vivas e a memória cresce a cada gráfico.
+        plt.close(fig)
+    if verbose:
+        print(f"\nImagem da análise salva em '{salvar_em}'")
 
 # if __name__ == "__main__":
     # codigo_fipe_exemplo = "095008-4" # Exemplo: BYD SEAL
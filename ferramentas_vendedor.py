@@ -0,0 +1,214 @@
+import numpy as np
+
+from catalogo import ARQUIVO_PADRAO, carregar_catalogo
+from desvalorizacao import carregar_tabela_desvalorizacao
+from incerteza_desvalorizacao import bandas_balanco, prever_com_incerteza
+from recomendar_carro import ALIQUOTA_IPVA, CARRO_ATUAL_PERFIL, perfis_para_arrays, pontuar_perfis
+from recuperacao import IndiceEstoque, remover_acentos
+
+# --- FERRAMENTAS DETERMINÍSTICAS PARA O ASSISTENTE (FUNCTION CALLING) ---
+# O modelo não faz conta de cabeça: chama estas funções, que rodam localmente com a
+# mesma lógica de recomendar_carro.py e desvalorizacao.py, e só redige o resultado.
+# As assinaturas (tipos e docstrings) viram o esquema das ferramentas no Gemini.
+
+DIAS_POR_ANO = 365
+ANOS_BALANCO = 3
+
+_indice = None
+
+def configurar_ferramentas(indice):
+    """Define o índice do estoque usado pelas ferramentas (compartilhado com o assistente)."""
+    global _indice
+    _indice = indice
+
+def _obter_indice():
+    global _indice
+    if _indice is None:
+        _indice = IndiceEstoque(carregar_catalogo(ARQUIVO_PADRAO))
+    return _indice
+
+def _localizar_carro(modelo):
+    """Linha do catálogo que melhor corresponde ao nome do modelo (prefere zero km), ou None."""
+    indice = _obter_indice()
+    pontuacao = indice.pontuar_texto(modelo)
+    pontuacao[~np.isfinite(np.asarray(indice.catalogo["CustoMedioPorKM_R$"], dtype=np.float64))] = 0
+    if pontuacao.max(initial=0) <= 0:
+        return None
+    candidatos = np.flatnonzero(pontuacao == pontuacao.max())
+    zero_km = candidatos[indice.zero_km[candidatos]]
+    return int(zero_km[0] if len(zero_km) else candidatos[0])
+
+def _descrever(linha):
+    carro = _obter_indice().catalogo.registro(linha)
+    custo_km = carro["CustoMedioPorKM_R$"]
+    return {
+        "modelo": carro["Modelo"],
+        "codigo_fipe": carro["CodigoFipe"],
+        "condicao": "zero km" if carro["ZeroKm"] else f"seminovo {carro['AnoModelo']}",
+        "preco": round(carro["Valor"], 2),
+        "tipo": carro["TipoVeiculo"],
+        "custo_por_km": custo_km if np.isfinite(custo_km) else None,
+        "autonomia_km": carro["AutonomiaTotalKM"],
+    }
+
+def _economia_anual(linha, km_por_dia, consumo_km_por_litro, preco_gasolina_litro):
+    indice = _obter_indice()
+    custo_km = np.asarray(indice.catalogo["CustoMedioPorKM_R$"], dtype=np.float64)
+    km_anual = km_por_dia * DIAS_POR_ANO
+    perfil = perfis_para_arrays([{
+        "preco_carro_atual": indice.valor[linha],
+        "km_rodados_anual": km_anual,
+        "viagens_longas": 0,
+        "consumo_km_por_litro": consumo_km_por_litro,
+        "preco_gasolina_litro": preco_gasolina_litro,
+    }])
+    _, economia = pontuar_perfis(indice.valor[[linha]], indice.autonomia[[linha]], custo_km[[linha]], perfil)
+    custo_atual = km_anual / consumo_km_por_litro * preco_gasolina_litro
+    return km_anual, custo_atual, float(economia[0, 0])
+
+def _validar_uso(km_por_dia, consumo_km_por_litro, preco_gasolina_litro):
+    """Mensagem de erro para argumentos de uso fora da faixa (o modelo às vezes manda 0), ou None."""
+    if km_por_dia < 0:
+        return "km_por_dia não pode ser negativo."
+    if consumo_km_por_litro <= 0:
+        return "consumo_carro_atual_km_por_litro precisa ser maior que zero."
+    if preco_gasolina_litro <= 0:
+        return "preco_gasolina_litro precisa ser maior que zero."
+    return None
+
+def calcular_economia_anual(
+    km_por_dia: float,
+    modelo: str,
+    consumo_carro_atual_km_por_litro: float = CARRO_ATUAL_PERFIL["consumo_km_por_litro"],
+    preco_gasolina_litro: float = CARRO_ATUAL_PERFIL["preco_gasolina_litro"],
+) -> dict:
+    """Calcula a economia anual de combustível e de IPVA ao trocar um carro a gasolina pelo modelo BYD informado.
+
+    Args:
+        km_por_dia: Quilômetros rodados por dia pelo cliente.
+        modelo: Nome do modelo BYD (ex.: "Dolphin", "Song Plus").
+        consumo_carro_atual_km_por_litro: Consumo do carro atual do cliente, em km/l.
+        preco_gasolina_litro: Preço do litro da gasolina, em reais.
+    """
+    erro = _validar_uso(km_por_dia, consumo_carro_atual_km_por_litro, preco_gasolina_litro)
+    if erro:
+        return {"erro": erro}
+    linha = _localizar_carro(modelo)
+    if linha is None:
+        return {"erro": f"Modelo '{modelo}' não encontrado no estoque."}
+
+    km_anual, custo_atual, economia = _economia_anual(
+        linha, km_por_dia, consumo_carro_atual_km_por_litro, preco_gasolina_litro
+    )
+    carro = _descrever(linha)
+    return {
+        "carro": carro,
+        "km_por_ano": km_anual,
+        "custo_anual_gasolina": round(custo_atual, 2),
+        "custo_anual_byd": round(custo_atual - economia, 2),
+        "economia_combustivel_anual": round(economia, 2),
+        "economia_ipva_anual": round(carro["preco"] * ALIQUOTA_IPVA, 2),
+    }
+
+def calcular_balanco_3_anos(
+    km_por_dia: float,
+    modelo: str,
+    consumo_carro_atual_km_por_litro: float = CARRO_ATUAL_PERFIL["consumo_km_por_litro"],
+    preco_gasolina_litro: float = CARRO_ATUAL_PERFIL["preco_gasolina_litro"],
+) -> dict:
+    """Calcula o balanço financeiro líquido em 3 anos: economia de combustível e IPVA menos a desvalorização prevista do carro.
+
+    Args:
+        km_por_dia: Quilômetros rodados por dia pelo cliente.
+        modelo: Nome do modelo BYD (ex.: "Seal", "King").
+        consumo_carro_atual_km_por_litro: Consumo do carro atual do cliente, em km/l.
+        preco_gasolina_litro: Preço do litro da gasolina, em reais.
+    """
+    erro = _validar_uso(km_por_dia, consumo_carro_atual_km_por_litro, preco_gasolina_litro)
+    if erro:
+        return {"erro": erro}
+    linha = _localizar_carro(modelo)
+    if linha is None:
+        return {"erro": f"Modelo '{modelo}' não encontrado no estoque."}
+
+    _, _, economia = _economia_anual(linha, km_por_dia, consumo_carro_atual_km_por_litro, preco_gasolina_litro)
+    carro = _descrever(linha)
+    economia_bruta = (economia + carro["preco"] * ALIQUOTA_IPVA) * ANOS_BALANCO
+
+    tabela = carregar_tabela_desvalorizacao()
+    posicao = tabela.posicao(carro["codigo_fipe"])
+    valores = tabela.prever_posicoes([posicao], ANOS_BALANCO)[0] if posicao >= 0 else [np.nan]
+    if not np.isfinite(valores[-1]):
+        return {
+            "carro": carro,
+            "economia_bruta_3_anos": round(economia_bruta, 2),
+            "aviso": "Dados insuficientes para prever a desvalorização; balanço sem desvalorização.",
+        }
+
+    desvalorizacao = max(0.0, float(tabela.valor_zero[posicao] - valores[-1]))
+    resultado = {
+        "carro": carro,
+        "economia_bruta_3_anos": round(economia_bruta, 2),
+        "valor_previsto_em_3_anos": round(float(valores[-1]), 2),
+        "desvalorizacao_3_anos": round(desvalorizacao, 2),
+        "balanco_liquido_3_anos": round(economia_bruta - desvalorizacao, 2),
+    }
+    # Faixa de 90% (bootstrap): o modelo deve apresentar o balanço como faixa, não como valor exato.
+    bandas = prever_com_incerteza(carro["codigo_fipe"], ANOS_BALANCO)
+    if bandas is not None:
+        baixo, _, alto = bandas_balanco(economia_bruta, bandas["desvalorizacao"])
+        resultado["faixa_balanco_90"] = [round(float(baixo), 2), round(float(alto), 2)]
+    return resultado
+
+def buscar_estoque(
+    preco_max: float = 0,
+    preco_min: float = 0,
+    tipo: str = "",
+    autonomia_min: float = 0,
+    modelo: str = "",
+    apenas_zero_km: bool = False,
+    limite: int = 5,
+) -> dict:
+    """Busca carros no estoque com filtros. Parâmetros com valor 0 ou vazio são ignorados.
+
+    Args:
+        preco_max: Preço máximo em reais.
+        preco_min: Preço mínimo em reais.
+        tipo: "eletrico" ou "hibrido".
+        autonomia_min: Autonomia total mínima em km.
+        modelo: Nome (ou parte do nome) do modelo.
+        apenas_zero_km: Se verdadeiro, retorna só carros novos.
+        limite: Número máximo de carros retornados.
+    """
+    filtros = {}
+    if preco_max:
+        filtros["preco_max"] = preco_max
+    if preco_min:
+        filtros["preco_min"] = preco_min
+    if tipo:
+        filtros["tipo"] = remover_acentos(tipo).strip()
+    if autonomia_min:
+        filtros["autonomia_min"] = autonomia_min
+    if apenas_zero_km:
+        filtros["zero_km"] = True
+
+    indice = _obter_indice()
+    mascara = indice.mascara_filtros(filtros)
+    if modelo:
+        mascara &= indice.pontuar_texto(modelo) > 0
+    linhas = np.flatnonzero(mascara)
+    linhas = linhas[np.argsort(indice.valor[linhas], kind="stable")][:max(1, int(limite))]
+    return {"total_encontrado": int(mascara.sum()), "carros": [_descrever(int(i)) for i in linhas]}
+
+FERRAMENTAS = [calcular_economia_anual, calcular_balanco_3_anos, buscar_estoque]
+_POR_NOME = {f.__name__: f for f in FERRAMENTAS}
+
+def executar_ferramenta(nome, argumentos):
+    """Executa uma ferramenta pelo nome (como pedido pelo modelo) e devolve um dict serializável."""
+    funcao = _POR_NOME.get(nome)
+    if funcao is None:
+        return {"erro": f"Ferramenta desconhecida: {nome}"}
+    try:
+        return funcao(**dict(argumentos))
+    except (TypeError, ValueError, ArithmeticError) as e:
+        return {"erro": f"Argumentos inválidos para {nome}: {e}"}
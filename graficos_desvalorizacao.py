@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from desvalorizacao import (
+    carregar_tabela_desvalorizacao,
+    criar_curva,
+    gerar_imagem_desvalorizacao,
+    ler_imagem_carro,
+)
+
+# --- RENDERIZAÇÃO EM LOTE DOS GRÁFICOS DE DESVALORIZAÇÃO ---
+# Gera os gráficos de vários CodigoFipe em um pool de processos com backend não
+# interativo (Agg). Cada gráfico tem um hash do conteúdo de entrada (pontos
+# históricos, coeficientes, horizonte e foto do carro) guardado em um manifesto;
+# se o hash não mudou desde a última renderização, o arquivo não é refeito.
+
+PASTA_PADRAO = "images"
+ARQUIVO_MANIFESTO = ".manifesto_desvalorizacao.json"
+ANOS_PADRAO = 3
+VERSAO_LAYOUT = "1"  # altere ao mudar o desenho do gráfico para forçar nova renderização
+
+def nome_arquivo_grafico(modelo_base, codigo_fipe):
+    """Mesmo padrão de nome usado por recomendar_carro.py."""
+    return f"analise_{modelo_base.replace(' ', '_')}_{codigo_fipe}.png"
+
+def _assinatura_imagem(modelo_base):
+    """Identifica a versão da foto do carro sem lê-la (mtime + tamanho)."""
+    try:
+        info = os.stat(f"images/{modelo_base}.png")
+    except FileNotFoundError:
+        return "ausente"
+    return f"{info.st_mtime_ns}:{info.st_size}"
+
+def _hash_entrada(tarefa):
+    h = hashlib.sha256()
+    for parte in (VERSAO_LAYOUT, tarefa["codigo_fipe"], tarefa["modelo_base"], str(tarefa["anos_previsao"]),
+                  tarefa["assinatura_imagem"], repr(float(tarefa["valor_zero"])), str(tarefa["familia"])):
+        h.update(parte.encode("utf-8") + b"\x1f")
+    for array in (tarefa["idades"], tarefa["valores"], tarefa["coeficientes"]):
+        h.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def montar_tarefas(tabela, codigos=None, anos_para_prever=ANOS_PADRAO):
+    """
+    Uma tarefa (dict só com arrays e textos, barata de enviar a outro processo) por código
+    com dados suficientes. Sem `codigos`, usa todos os códigos válidos da tabela.
+    Retorna (tarefas, ignorados) onde ignorados são os códigos sem dados.
+    """
+    if codigos is None:
+        posicoes = np.flatnonzero(tabela.validos)
+        ignorados = []
+    else:
+        posicoes, ignorados = [], []
+        for codigo in codigos:
+            posicao = tabela.posicao(codigo)
+            if posicao >= 0 and tabela.validos[posicao]:
+                posicoes.append(posicao)
+            else:
+                ignorados.append(codigo)
+
+    assinaturas = {}
+    tarefas = []
+    valores_previstos = tabela.prever_posicoes(posicoes, anos_para_prever)
+    for posicao, previstos in zip(posicoes, valores_previstos):
+        modelo_base = tabela.modelos_base[posicao]
+        if modelo_base not in assinaturas:
+            assinaturas[modelo_base] = _assinatura_imagem(modelo_base)
+        _, idades, valores = tabela.historico(posicao)
+        valor_zero = float(tabela.valor_zero[posicao])
+        tarefa = {
+            "codigo_fipe": tabela.codigos[posicao],
+            "modelo_base": modelo_base,
+            "anos_previsao": anos_para_prever,
+            "idades": idades,
+            "valores": valores,
+            "coeficientes": tabela.coeficientes[posicao],
+            "familia": int(tabela.familias[posicao]),
+            "valor_zero": valor_zero,
+            "desvalorizacao_total": max(0, valor_zero - previstos[-1]),
+            "assinatura_imagem": assinaturas[modelo_base],
+        }
+        tarefa["hash"] = _hash_entrada(tarefa)
+        tarefas.append(tarefa)
+    return tarefas, ignorados
+
+def _iniciar_processo():
+    import matplotlib
+    matplotlib.use("Agg")
+
+# Fotos já decodificadas neste processo, por ModeloBase: (assinatura, imagem)
+_IMAGENS = {}
+
+def _imagem_do_modelo(modelo_base, assinatura):
+    item = _IMAGENS.get(modelo_base)
+    if item is None or item[0] != assinatura:
+        item = _IMAGENS[modelo_base] = (assinatura, ler_imagem_carro(modelo_base))
+    return item[1]
+
+def _renderizar_grupo(tarefas, pasta):
+    """Renderiza as tarefas de um mesmo ModeloBase (a foto é decodificada uma vez só)."""
+    resultados = []
+    for tarefa in tarefas:
+        caminho = os.path.join(pasta, nome_arquivo_grafico(tarefa["modelo_base"], tarefa["codigo_fipe"]))
+        dados = {
+            "codigo_fipe": tarefa["codigo_fipe"],
+            "modelo_base": tarefa["modelo_base"],
+            "dados_historicos": {"IdadeVeiculo": tarefa["idades"], "Valor": tarefa["valores"]},
+            "valor_zero": tarefa["valor_zero"],
+            "desvalorizacao_total": tarefa["desvalorizacao_total"],
+            "anos_previsao": tarefa["anos_previsao"],
+            "modelo_regressao": criar_curva(tarefa["coeficientes"], tarefa["familia"]),
+        }
+        try:
+            imagem = _imagem_do_modelo(tarefa["modelo_base"], tarefa["assinatura_imagem"])
+            gerar_imagem_desvalorizacao(dados, caminho, imagem_carro=imagem, verbose=False)
+            resultados.append((tarefa["codigo_fipe"], caminho, tarefa["hash"], None))
+        except Exception as e:
+            resultados.append((tarefa["codigo_fipe"], caminho, None, str(e)))
+    return resultados
+
+def carregar_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, ARQUIVO_MANIFESTO), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def salvar_manifesto(pasta, manifesto):
+    caminho = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temporario, caminho)
+
+def renderizar_lote(codigos=None, anos_para_prever=ANOS_PADRAO, pasta=PASTA_PADRAO, processos=None,
+                    forcar=False, arquivo_json="dataset_byd_completo_custos.json", ano_atual=None):
+    """
+    Gera os gráficos de desvalorização de `codigos` (ou de todos os códigos válidos).
+    Pula os gráficos cujo hash de entrada é igual ao do manifesto e cujo arquivo ainda
+    existe (a menos que `forcar`). Retorna um dict com renderizados, pulados, ignorados e erros.
+    """
+    tabela = carregar_tabela_desvalorizacao(arquivo_json, ano_atual)
+    tarefas, ignorados = montar_tarefas(tabela, codigos, anos_para_prever)
+    os.makedirs(pasta, exist_ok=True)
+    manifesto = carregar_manifesto(pasta)
+
+    pendentes = {}
+    pulados = 0
+    for tarefa in tarefas:
+        caminho = os.path.join(pasta, nome_arquivo_grafico(tarefa["modelo_base"], tarefa["codigo_fipe"]))
+        if not forcar and manifesto.get(tarefa["codigo_fipe"]) == tarefa["hash"] and os.path.exists(caminho):
+            pulados += 1
+            continue
+        # Agrupa por ModeloBase para que cada processo decodifique cada foto uma vez.
+        pendentes.setdefault(tarefa["modelo_base"], []).append(tarefa)
+
+    renderizados, erros = [], {}
+    def registrar(resultados):
+        for codigo, caminho, hash_entrada, erro in resultados:
+            if erro is None:
+                manifesto[codigo] = hash_entrada
+                renderizados.append(caminho)
+            else:
+                manifesto.pop(codigo, None)
+                erros[codigo] = erro
+
+    grupos = list(pendentes.values())
+    processos = processos or os.cpu_count() or 1
+    if processos == 1 or len(grupos) <= 1:
+        _iniciar_processo()
+        for grupo in grupos:
+            registrar(_renderizar_grupo(grupo, pasta))
+    elif grupos:
+        with ProcessPoolExecutor(max_workers=min(processos, len(grupos)), initializer=_iniciar_processo) as pool:
+            futuros = [pool.submit(_renderizar_grupo, grupo, pasta) for grupo in grupos]
+            for futuro in as_completed(futuros):
+                registrar(futuro.result())
+
+    salvar_manifesto(pasta, manifesto)
+    return {"renderizados": renderizados, "pulados": pulados, "ignorados": ignorados, "erros": erros}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera em lote os gráficos de desvalorização por CodigoFipe.")
+    parser.add_argument("codigos", nargs="*", help="códigos FIPE (padrão: todos com dados suficientes)")
+    parser.add_argument("--anos", type=int, default=ANOS_PADRAO, help="horizonte da previsão em anos")
+    parser.add_argument("--pasta", default=PASTA_PADRAO, help="pasta de saída das imagens")
+    parser.add_argument("--processos", type=int, default=None, help="número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--forcar", action="store_true", help="renderiza de novo mesmo sem mudança nos dados")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resultado = renderizar_lote(args.codigos or None, args.anos, args.pasta, args.processos, args.forcar)
+    print(f"{len(resultado['renderizados'])} gráficos gerados, {resultado['pulados']} sem alteração "
+          f"em {time.perf_counter() - inicio:.1f} s (pasta '{args.pasta}').")
+    for codigo in resultado["ignorados"]:
+        print(f"  {codigo}: dados insuficientes para o modelo.")
+    for codigo, erro in resultado["erros"].items():
+        print(f"  {codigo}: erro ao gerar o gráfico ({erro}).")
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import re
+
+from catalogo import formatar_preco
+from recuperacao import estimar_tokens, extrair_filtros, remover_acentos
+
+# --- HISTÓRICO DA CONVERSA COM ORÇAMENTO DE TOKENS ---
+# Em vez de reenviar a conversa inteira a cada turno, mantemos só os turnos mais
+# recentes e dobramos os antigos em um resumo estruturado do perfil do cliente.
+
+ORCAMENTO_TOKENS_HISTORICO = 1500
+TURNOS_RECENTES_MINIMOS = 2  # pares cliente/vendedor sempre mantidos por inteiro
+
+_RE_NOME = re.compile(r"(?:meu nome e|me chamo|pode me chamar de)\s+([a-z]+)")
+_RE_KM_DIA = re.compile(r"(\d+(?:[.,]\d+)?)\s*km\s*(?:por|/|ao|a|todo)?\s*dia")
+_RE_KM_MES = re.compile(r"(\d+(?:[.,]\d{3})*)\s*km\s*(?:por|/|ao|no)\s*mes")
+_RE_KM_ANO = re.compile(r"(\d+(?:[.,]\d{3})*)\s*km\s*(?:por|/|ao|no)\s*ano")
+
+def _numero(texto):
+    return float(texto.replace(".", "").replace(",", "."))
+
+class PerfilCliente:
+    """Resumo estruturado do que já se sabe do cliente."""
+
+    def __init__(self):
+        self.nome = None
+        self.km_por_dia = None
+        self.preco_min = None
+        self.preco_max = None
+        self.tipo = None
+        self.modelos = []
+
+    def atualizar_com_cliente(self, texto, modelos_conhecidos=()):
+        normalizado = remover_acentos(texto)
+        nome = _RE_NOME.search(normalizado)
+        if nome:
+            # Recupera a grafia original (com acentos) pela posição, se ela bater.
+            original = texto[nome.start(1):nome.end(1)]
+            self.nome = (original if remover_acentos(original) == nome.group(1) else nome.group(1)).capitalize()
+
+        for regex, divisor in ((_RE_KM_DIA, 1), (_RE_KM_MES, 30), (_RE_KM_ANO, 365)):
+            km = regex.search(normalizado)
+            if km:
+                self.km_por_dia = round(_numero(km.group(1)) / divisor, 1)
+                break
+
+        filtros = extrair_filtros(texto)
+        self.preco_min = filtros.get("preco_min", self.preco_min)
+        self.preco_max = filtros.get("preco_max", self.preco_max)
+        self.tipo = filtros.get("tipo", self.tipo)
+        self.atualizar_modelos(texto, modelos_conhecidos)
+
+    def atualizar_modelos(self, texto, modelos_conhecidos=()):
+        normalizado = remover_acentos(texto)
+        # Nomes mais longos primeiro: "DOLPHIN MINI" não deve contar também como "DOLPHIN".
+        for modelo in sorted(modelos_conhecidos, key=len, reverse=True):
+            padrao = r"\b" + re.escape(remover_acentos(modelo)) + r"\b"
+            if re.search(padrao, normalizado):
+                normalizado = re.sub(padrao, " ", normalizado)
+                if modelo not in self.modelos:
+                    self.modelos.append(modelo)
+
+    def estado(self):
+        """Campos do perfil como dict (entram na chave do cache de respostas)."""
+        return {
+            "nome": self.nome, "km_por_dia": self.km_por_dia, "preco_min": self.preco_min,
+            "preco_max": self.preco_max, "tipo": self.tipo, "modelos": list(self.modelos),
+        }
+
+    def como_texto(self):
+        linhas = []
+        if self.nome:
+            linhas.append(f"- Nome do cliente: {self.nome}")
+        if self.km_por_dia:
+            linhas.append(f"- Uso diário: {self.km_por_dia:g} km/dia")
+        if self.preco_min and self.preco_max:
+            linhas.append(f"- Orçamento: entre {formatar_preco(self.preco_min)} e {formatar_preco(self.preco_max)}")
+        elif self.preco_max:
+            linhas.append(f"- Orçamento: até {formatar_preco(self.preco_max)}")
+        elif self.preco_min:
+            linhas.append(f"- Orçamento: a partir de {formatar_preco(self.preco_min)}")
+        if self.tipo:
+            linhas.append(f"- Preferência: {self.tipo}")
+        if self.modelos:
+            linhas.append(f"- Modelos já discutidos: {', '.join(self.modelos)}")
+        return "\n".join(linhas)
+
+class GerenciadorHistorico:
+    """
+    Mantém o histórico de uma conversa dentro de `orcamento_tokens` (estimativa).
+    Os turnos mais antigos saem da janela e ficam representados pelo PerfilCliente;
+    `historico()` devolve a lista pronta para `model.start_chat(history=...)`.
+    """
+
+    def __init__(self, orcamento_tokens=ORCAMENTO_TOKENS_HISTORICO, turnos_recentes_minimos=TURNOS_RECENTES_MINIMOS,
+                 modelos_conhecidos=()):
+        self.orcamento_tokens = orcamento_tokens
+        self.turnos_recentes_minimos = turnos_recentes_minimos
+        self.modelos_conhecidos = list(modelos_conhecidos)
+        self.perfil = PerfilCliente()
+        self.turnos = []  # [(papel, texto, tokens)] só da janela recente
+        self.turnos_compactados = 0
+
+    def registrar_turno(self, mensagem_cliente, resposta_modelo):
+        """Registra um par cliente/vendedor (texto do cliente sem o bloco de estoque) e compacta se preciso."""
+        self.perfil.atualizar_com_cliente(mensagem_cliente, self.modelos_conhecidos)
+        self.perfil.atualizar_modelos(resposta_modelo, self.modelos_conhecidos)
+        self.turnos.append(("user", mensagem_cliente, estimar_tokens(mensagem_cliente)))
+        self.turnos.append(("model", resposta_modelo, estimar_tokens(resposta_modelo)))
+        self._compactar()
+
+    def _resumo(self):
+        if not self.turnos_compactados:
+            return None
+        texto = self.perfil.como_texto() or "- (sem dados do cliente ainda)"
+        return (
+            f"RESUMO DA CONVERSA ATÉ AGORA ({self.turnos_compactados} turnos antigos resumidos):\n{texto}"
+        )
+
+    def tokens(self):
+        resumo = self._resumo()
+        return sum(t[2] for t in self.turnos) + (estimar_tokens(resumo) if resumo else 0)
+
+    def _compactar(self):
+        minimo = 2 * self.turnos_recentes_minimos
+        while len(self.turnos) > minimo and self.tokens() > self.orcamento_tokens:
+            # Remove o par mais antigo; o perfil já absorveu o que importa dele.
+            del self.turnos[:2]
+            self.turnos_compactados += 1
+
+    def historico(self):
+        """Histórico no formato do Gemini: resumo (se houver) seguido dos turnos recentes."""
+        saida = []
+        resumo = self._resumo()
+        if resumo:
+            saida.append({"role": "user", "parts": [resumo]})
+            saida.append({"role": "model", "parts": ["Entendido, vou considerar esse resumo."]})
+        saida.extend({"role": papel, "parts": [texto]} for papel, texto, _ in self.turnos)
+        return saida
+
+    def assinatura(self):
+        """Hash do que o modelo vê desta conversa (resumo, turnos recentes e perfil), para chaves de cache."""
+        conteudo = json.dumps([self.historico(), self.perfil.como_texto()], ensure_ascii=False)
+        return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
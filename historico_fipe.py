@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+from catalogo import ANO_ZERO_KM, ARQUIVO_PADRAO, _escrever_json_atomico, carregar_catalogo, converter_mes_referencia
+from desvalorizacao import GRAU_POLINOMIO, ajustar_tabela_de_arrays, ano_atual_de_referencia
+
+# --- HISTÓRICO DE PREÇOS FIPE (VÁRIOS MESES, SÓ ACRÉSCIMO) ---
+# Cada coleta da FIPE vira um segmento imutável em disco, com as linhas ordenadas por
+# código e um índice de offsets por código. Um mês novo é acrescentado sem reescrever os
+# anteriores; as observações de um código em um segmento saem como fatia memory-mapped
+# (sem cópia). compactar() junta os segmentos em um só, quando se quer uma fatia única.
+#
+# pasta/meta.json          códigos (id global = posição), ModeloBase e lista de segmentos
+# pasta/<segmento>/*.npy   mes (AAAAMM), ano (AnoModelo), valor e offsets por código
+
+PASTA_PADRAO = "historico_fipe"
+VERSAO_FORMATO = 1
+COLUNAS_SEGMENTO = ("mes", "ano", "valor")
+
+class Segmento:
+    def __init__(self, pasta, meses):
+        self.pasta = pasta
+        self.meses = meses
+        colunas = {nome: np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode="r")
+                   for nome in COLUNAS_SEGMENTO + ("offsets",)}
+        self.mes, self.ano, self.valor, self.offsets = (colunas[n] for n in COLUNAS_SEGMENTO + ("offsets",))
+
+    def fatia(self, posicao):
+        """Linhas do código `posicao` neste segmento (views dos arrays mapeados, sem cópia)."""
+        if posicao + 1 >= len(self.offsets):
+            return slice(0, 0)
+        return slice(int(self.offsets[posicao]), int(self.offsets[posicao + 1]))
+
+    def codigos_por_linha(self):
+        return np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+
+def _gravar_segmento(pasta, codigo, mes, ano, valor, n_codigos):
+    """Ordena por (código, mês, ano-modelo) e grava as colunas e o índice de offsets."""
+    ordem = np.lexsort((ano, mes, codigo))
+    os.makedirs(pasta, exist_ok=True)
+    np.save(os.path.join(pasta, "mes.npy"), mes[ordem].astype(np.int32))
+    np.save(os.path.join(pasta, "ano.npy"), ano[ordem].astype(np.int32))
+    np.save(os.path.join(pasta, "valor.npy"), valor[ordem].astype(np.float64))
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(codigo, minlength=n_codigos)))).astype(np.int64)
+    np.save(os.path.join(pasta, "offsets.npy"), offsets)
+
+class HistoricoFipe:
+    """Série histórica de preços FIPE por (CodigoFipe, AnoModelo, mês de referência)."""
+
+    def __init__(self, pasta=PASTA_PADRAO):
+        self.pasta = pasta
+        caminho_meta = os.path.join(pasta, "meta.json")
+        if os.path.exists(caminho_meta):
+            with open(caminho_meta, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if self.meta.get("versao_formato") != VERSAO_FORMATO:
+                raise ValueError(f"Formato de histórico não suportado em '{pasta}'.")
+        else:
+            self.meta = {"versao_formato": VERSAO_FORMATO, "codigos": [], "modelos_base": [], "segmentos": []}
+        self._carregar_segmentos()
+
+    def _carregar_segmentos(self):
+        self.codigos = self.meta["codigos"]
+        self.modelos_base = self.meta["modelos_base"]
+        self._posicoes = {codigo: i for i, codigo in enumerate(self.codigos)}
+        self.segmentos = [Segmento(os.path.join(self.pasta, s["pasta"]), s["meses"]) for s in self.meta["segmentos"]]
+
+    def __len__(self):
+        return sum(len(s.valor) for s in self.segmentos)
+
+    @property
+    def meses(self):
+        return sorted(m for s in self.segmentos for m in s.meses)
+
+    def posicao(self, codigo_fipe):
+        return self._posicoes.get(codigo_fipe, -1)
+
+    # --- Escrita ---
+
+    def adicionar_catalogo(self, catalogo):
+        """
+        Acrescenta os meses de referência do catálogo que ainda não estão no histórico
+        (um segmento por mês). Meses já presentes são ignorados: o histórico só cresce.
+        Retorna a lista de meses (AAAAMM) acrescentados.
+        """
+        mes_por_categoria = np.array(
+            [converter_mes_referencia(m) or 0 for m in catalogo.categorias("MesReferencia")] + [0], dtype=np.int64
+        )
+        mes = mes_por_categoria[np.asarray(catalogo.codigos("MesReferencia"))]
+        codigo_local = np.asarray(catalogo.codigos("CodigoFipe"))
+        valor = np.asarray(catalogo["Valor"], dtype=np.float64)
+        ano = np.asarray(catalogo["AnoModelo"], dtype=np.int64)
+        validas = (mes > 0) & (codigo_local >= 0) & np.isfinite(valor)
+
+        existentes = set(self.meses)
+        novos = sorted(set(np.unique(mes[validas]).tolist()) - existentes)
+        if not novos:
+            return []
+
+        # Códigos novos ganham ids globais no fim da lista (os antigos não mudam).
+        textos_base = catalogo["ModeloBase"]
+        global_por_local = np.empty(len(catalogo.categorias("CodigoFipe")), dtype=np.int64)
+        for local, codigo in enumerate(catalogo.categorias("CodigoFipe")):
+            posicao = self._posicoes.get(codigo)
+            if posicao is None:
+                posicao = self._posicoes[codigo] = len(self.codigos)
+                self.codigos.append(codigo)
+                self.modelos_base.append(None)
+            global_por_local[local] = posicao
+        codigo = np.where(codigo_local >= 0, global_por_local[codigo_local], -1)
+        linhas_validas = np.flatnonzero(validas)
+        for linha in linhas_validas[np.unique(codigo_local[validas], return_index=True)[1]]:
+            self.modelos_base[codigo[linha]] = textos_base[linha]
+
+        for mes_novo in novos:
+            linhas = validas & (mes == mes_novo)
+            nome = str(mes_novo)
+            _gravar_segmento(os.path.join(self.pasta, nome), codigo[linhas], mes[linhas], ano[linhas], valor[linhas],
+                             len(self.codigos))
+            self.meta["segmentos"].append({"pasta": nome, "meses": [mes_novo], "linhas": int(linhas.sum())})
+
+        # Publica os segmentos novos de uma vez, trocando o meta.json.
+        _escrever_json_atomico(os.path.join(self.pasta, "meta.json"), self.meta)
+        self._carregar_segmentos()
+        return novos
+
+    def compactar(self):
+        """Junta todos os segmentos em um só (fatia única por código). Reescreve o histórico."""
+        if len(self.segmentos) <= 1:
+            return
+        codigo, mes, ano, valor = self._todas_as_linhas()
+        meses = self.meses
+        nome = f"{meses[0]}_{meses[-1]}"
+        pasta_nova = os.path.join(self.pasta, nome)
+        if os.path.exists(pasta_nova):
+            shutil.rmtree(pasta_nova)
+        _gravar_segmento(pasta_nova, codigo, mes, ano, valor, len(self.codigos))
+
+        antigas = [s.pasta for s in self.segmentos]
+        self.meta["segmentos"] = [{"pasta": nome, "meses": meses, "linhas": int(len(valor))}]
+        _escrever_json_atomico(os.path.join(self.pasta, "meta.json"), self.meta)
+        self._carregar_segmentos()
+        for pasta in antigas:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    # --- Consultas ---
+
+    def fatias(self, codigo_fipe):
+        """Observações do código por segmento: lista de (meses, anos, valores), views sem cópia."""
+        posicao = self.posicao(codigo_fipe)
+        if posicao < 0:
+            return []
+        saida = []
+        for segmento in self.segmentos:
+            fatia = segmento.fatia(posicao)
+            if fatia.stop > fatia.start:
+                saida.append((segmento.mes[fatia], segmento.ano[fatia], segmento.valor[fatia]))
+        return saida
+
+    def serie(self, codigo_fipe):
+        """Todas as observações do código (mes, ano, valor), ordenadas por mês e ano-modelo."""
+        fatias = self.fatias(codigo_fipe)
+        if len(fatias) == 1:
+            return fatias[0]
+        if not fatias:
+            vazio = np.empty(0)
+            return vazio.astype(np.int32), vazio.astype(np.int32), vazio
+        mes, ano, valor = (np.concatenate(colunas) for colunas in zip(*fatias))
+        # Os segmentos podem ter sido acrescentados fora da ordem cronológica.
+        ordem = np.lexsort((ano, mes))
+        return mes[ordem], ano[ordem], valor[ordem]
+
+    def tendencia(self, codigo_fipe, ano_modelo):
+        """Evolução mensal do preço de um (código, ano-modelo): (meses, valores)."""
+        mes, ano, valor = self.serie(codigo_fipe)
+        linhas = ano == ano_modelo
+        return mes[linhas], valor[linhas]
+
+    def _todas_as_linhas(self):
+        partes = [(s.codigos_por_linha(), s.mes, s.ano, s.valor) for s in self.segmentos]
+        return tuple(np.concatenate(colunas) for colunas in zip(*partes))
+
+    def tabela_desvalorizacao(self, grau=GRAU_POLINOMIO):
+        """
+        Tabela de desvalorização ajustada com todos os meses: cada linha entra com a idade
+        que o carro tinha no mês da observação; o valor zero km vem do mês mais recente.
+        """
+        if not self.segmentos:
+            raise ValueError("Histórico vazio.")
+        codigo, mes, ano, valor = self._todas_as_linhas()
+        zero_km = ano == ANO_ZERO_KM
+        idade = np.zeros(len(ano), dtype=np.int64)
+        for m in np.unique(mes):
+            linhas = mes == m
+            idade[linhas] = ano_atual_de_referencia([int(m)], ano[linhas]) - ano[linhas]
+
+        mais_recente = int(mes.max())
+        # Linhas zero km de meses antigos não têm idade útil nem dizem o preço de hoje.
+        usar = ~zero_km | (mes == mais_recente)
+        ano_atual = ano_atual_de_referencia([mais_recente], ano[mes == mais_recente])
+        return ajustar_tabela_de_arrays(
+            codigo[usar], valor[usar], ano[usar], zero_km[usar], self.codigos,
+            [m or "" for m in self.modelos_base], ano_atual, grau, idade=idade[usar],
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Histórico de preços FIPE por mês de referência.")
+    parser.add_argument("--pasta", default=PASTA_PADRAO)
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    adicionar = subcomandos.add_parser("adicionar", help="acrescenta os meses novos de um dataset (JSON ou pasta colunar)")
+    adicionar.add_argument("arquivo", nargs="?", default=ARQUIVO_PADRAO)
+    serie = subcomandos.add_parser("serie", help="mostra as observações de um código FIPE")
+    serie.add_argument("codigo_fipe")
+    subcomandos.add_parser("compactar", help="junta os segmentos mensais em um só")
+    subcomandos.add_parser("info", help="resumo do histórico")
+    args = parser.parse_args()
+
+    historico = HistoricoFipe(args.pasta)
+    if args.comando == "adicionar":
+        meses = historico.adicionar_catalogo(carregar_catalogo(args.arquivo))
+        if meses:
+            print(f"Meses acrescentados: {', '.join(map(str, meses))}.")
+        else:
+            print("Nenhum mês novo: o histórico já tem todos os meses deste arquivo.")
+    elif args.comando == "serie":
+        for mes, ano, valor in zip(*historico.serie(args.codigo_fipe)):
+            print(f"{mes}  {'0 km' if ano == ANO_ZERO_KM else ano}  R$ {valor:,.2f}")
+    elif args.comando == "compactar":
+        historico.compactar()
+        print(f"Histórico compactado em {len(historico.segmentos)} segmento(s).")
+    print(f"{len(historico)} observações, {len(historico.codigos)} códigos, {len(historico.meses)} meses.")
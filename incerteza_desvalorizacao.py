@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from catalogo import ARQUIVO_PADRAO
+from desvalorizacao import (
+    FAMILIA_EXPONENCIAL,
+    FAMILIA_POLINOMIO,
+    GRAU_ENCOLHIDO,
+    ajustar_polinomios_agrupados,
+    carregar_tabela_desvalorizacao,
+)
+
+# --- INTERVALOS DE CONFIANÇA (BOOTSTRAP) PARA A DESVALORIZAÇÃO ---
+# Reamostra os pontos históricos (idade, valor médio) de cada CodigoFipe milhares de
+# vezes. Cada réplica é representada por pesos multinomiais (quantas vezes cada ponto
+# foi sorteado), e todas as réplicas de um bloco de códigos são ajustadas de uma vez
+# pelo mínimos quadrados ponderado em lote de ajustar_polinomios_agrupados: o grupo
+# (código, réplica) é só mais uma linha da pseudo-inversa em lote, sem laço de ajustes.
+# Cada código é reamostrado com a própria curva (a da seleção de modelos, se houver):
+# polinômio do grau escolhido ou exponencial (reta em log(valor)); curvas encolhidas
+# para o grupo ficam sem faixa. Cada réplica precisa de grau + 1 idades distintas, e o
+# código de pelo menos grau + 2 pontos (com grau + 1 toda réplica interpola a mesma curva
+# e a "faixa" teria largura zero) e de MIN_REAMOSTRAS_DISTINTAS reamostragens possíveis;
+# senão o código fica sem faixa.
+# Blocos de códigos podem rodar em um pool de processos.
+
+REPLICAS_PADRAO = 2000
+PERCENTIS_PADRAO = (5, 50, 95)
+SEMENTE_PADRAO = 0
+ELEMENTOS_POR_BLOCO = 4_000_000  # limite de (réplicas x pontos) por ajuste em lote
+MAX_SORTEIOS = 50                # rodadas para trocar réplicas degeneradas antes de desistir da faixa
+MIN_REAMOSTRAS_DISTINTAS = 20    # com menos reamostragens possíveis, os percentis colapsam em poucos valores
+
+def _pesos_bootstrap(n_pontos, replicas, semente, posicao, idades=None, minimo_idades=1):
+    """
+    Contagens (replicas, n_pontos) de uma reamostragem com reposição; sementes por código
+    (reprodutível). Réplicas com menos de `minimo_idades` idades distintas (o ajuste ficaria
+    degenerado) são sorteadas de novo. Retorna None se não der para completar ou se sobrarem
+    menos de MIN_REAMOSTRAS_DISTINTAS reamostragens diferentes (histórico curto demais).
+    """
+    rng = np.random.default_rng([semente, posicao])
+
+    def sortear(quantidade):
+        return rng.multinomial(n_pontos, np.full(n_pontos, 1.0 / n_pontos), size=quantidade)
+
+    contagens = sortear(replicas)
+    if minimo_idades <= 1:
+        return contagens
+    _, rotulo = np.unique(idades, return_inverse=True)
+    por_idade = np.eye(rotulo.max() + 1, dtype=np.int64)[rotulo]  # (pontos, idades distintas)
+    for _ in range(MAX_SORTEIOS):
+        ruins = np.flatnonzero(((contagens @ por_idade) > 0).sum(axis=1) < minimo_idades)
+        if not len(ruins):
+            distintas = len(np.unique(contagens, axis=0))
+            return contagens if distintas >= min(MIN_REAMOSTRAS_DISTINTAS, replicas) else None
+        contagens[ruins] = sortear(len(ruins))
+    return None
+
+def _bandas_bloco(tarefa):
+    """
+    Ajusta todas as réplicas de um bloco de códigos em uma chamada por tipo de curva
+    (família, grau) e resume em percentis. Códigos com curva encolhida para o grupo ficam
+    com NaN (não há ajuste só com os pontos do código para reamostrar).
+    Retorna (valores (códigos, percentis, anos), desvalorização (códigos, percentis)).
+    """
+    replicas, anos = tarefa["replicas"], tarefa["anos_para_prever"]
+    n_codigos = len(tarefa["posicoes"])
+    percentis = tarefa["percentis"]
+    bandas_valores = np.full((n_codigos, len(percentis), anos), np.nan)
+    bandas_desvalorizacao = np.full((n_codigos, len(percentis)), np.nan)
+    idades_futuras = np.arange(1, anos + 1, dtype=np.float64)
+
+    tipos = sorted(set(zip(tarefa["familias"], tarefa["graus"])))
+    for familia, grau in tipos:
+        if grau == GRAU_ENCOLHIDO:
+            continue
+        codigos, grupos, idades, valores, pesos = [], [], [], [], []
+        for i in range(n_codigos):
+            if (tarefa["familias"][i], tarefa["graus"][i]) != (familia, grau):
+                continue
+            inicio, fim = tarefa["inicios"][i], tarefa["fins"][i]
+            n = fim - inicio
+            if n < grau + 2:
+                continue
+            contagens = _pesos_bootstrap(n, replicas, tarefa["semente"], tarefa["posicoes"][i],
+                                         tarefa["idades"][inicio:fim], grau + 1)
+            if contagens is None:
+                continue
+            local = len(codigos)
+            codigos.append(i)
+            grupos.append(np.repeat(local * replicas + np.arange(replicas), n))
+            idades.append(np.tile(tarefa["idades"][inicio:fim], replicas))
+            valores.append(np.tile(tarefa["valores"][inicio:fim], replicas))
+            pesos.append(contagens.ravel())
+        if not codigos:
+            continue
+
+        y = np.concatenate(valores)
+        if familia == FAMILIA_EXPONENCIAL:
+            y = np.log(np.maximum(y, 1.0))
+        coeficientes = ajustar_polinomios_agrupados(
+            np.concatenate(grupos), np.concatenate(idades), y, len(codigos) * replicas, grau,
+            pesos=np.concatenate(pesos),
+        ).reshape(len(codigos), replicas, -1)
+
+        potencias = idades_futuras[:, None] ** np.arange(coeficientes.shape[-1])
+        previstos = coeficientes @ potencias.T                              # (códigos, réplicas, anos)
+        if familia == FAMILIA_EXPONENCIAL:
+            with np.errstate(over="ignore"):
+                previstos = np.exp(previstos)
+        desvalorizacao = np.maximum(0.0, tarefa["valor_zero"][codigos][:, None] - previstos[:, :, -1])
+        bandas_valores[codigos] = np.moveaxis(np.percentile(previstos, percentis, axis=1), 0, 1)
+        bandas_desvalorizacao[codigos] = np.percentile(desvalorizacao, percentis, axis=1).T
+    return bandas_valores, bandas_desvalorizacao
+
+def bandas_desvalorizacao(tabela, codigos=None, anos_para_prever=3, replicas=REPLICAS_PADRAO,
+                          percentis=PERCENTIS_PADRAO, processos=1, semente=SEMENTE_PADRAO, grau=None):
+    """
+    Bandas de bootstrap para `codigos` (padrão: todos os códigos válidos da tabela).
+    Retorna um dict com:
+      - 'codigos' e 'percentis';
+      - 'valores': (códigos, percentis, anos) valores previstos após 1..N anos;
+      - 'desvalorizacao': (códigos, percentis) desvalorização em N anos.
+    Códigos desconhecidos, com poucos pontos para reamostrar ou com curva encolhida ficam com NaN.
+    `grau` força um polinômio desse grau em todos os códigos (padrão: a curva da tabela).
+    """
+    if codigos is None:
+        posicoes = np.flatnonzero(tabela.validos)
+        codigos = [tabela.codigos[i] for i in posicoes]
+    else:
+        posicoes = np.array([tabela.posicao(c) for c in codigos], dtype=np.int64)
+
+    percentis = list(percentis)
+    valores = np.full((len(codigos), len(percentis), anos_para_prever), np.nan)
+    desvalorizacao = np.full((len(codigos), len(percentis)), np.nan)
+    calcular = np.flatnonzero((posicoes >= 0) & tabela.validos[np.maximum(posicoes, 0)])
+
+    # Blocos de códigos com no máximo ELEMENTOS_POR_BLOCO pontos x réplicas cada.
+    n_pontos = (tabela.offsets[posicoes[calcular] + 1] - tabela.offsets[posicoes[calcular]])
+    tamanho = np.cumsum(n_pontos) * replicas
+    cortes = np.searchsorted(tamanho, np.arange(ELEMENTOS_POR_BLOCO, tamanho[-1] if len(tamanho) else 0,
+                                                ELEMENTOS_POR_BLOCO))
+    blocos = [b for b in np.split(calcular, np.unique(cortes)) if len(b)]
+
+    def tarefa(bloco):
+        pos = posicoes[bloco]
+        inicio, fim = tabela.offsets[pos], tabela.offsets[pos + 1]
+        # Só os pontos do bloco vão para o outro processo.
+        fatias = [np.arange(a, b) for a, b in zip(inicio, fim)]
+        todos = np.concatenate(fatias)
+        deslocamento = np.concatenate(([0], np.cumsum(fim - inicio)))
+        return {
+            "posicoes": pos.tolist(), "inicios": deslocamento[:-1].tolist(), "fins": deslocamento[1:].tolist(),
+            "idades": tabela.hist_idade[todos].astype(np.float64), "valores": tabela.hist_valor[todos],
+            "valor_zero": tabela.valor_zero[pos], "replicas": replicas, "anos_para_prever": anos_para_prever,
+            "percentis": percentis, "semente": semente,
+            "familias": tabela.familias[pos].tolist() if grau is None else [FAMILIA_POLINOMIO] * len(pos),
+            "graus": tabela.graus[pos].tolist() if grau is None else [grau] * len(pos),
+        }
+
+    tarefas = [tarefa(b) for b in blocos]
+    processos = processos or os.cpu_count() or 1
+    if processos == 1 or len(tarefas) <= 1:
+        resultados = [_bandas_bloco(t) for t in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(tarefas))) as pool:
+            resultados = list(pool.map(_bandas_bloco, tarefas))
+    for bloco, (bandas_valores, bandas_desv) in zip(blocos, resultados):
+        valores[bloco] = bandas_valores
+        desvalorizacao[bloco] = bandas_desv
+
+    return {"codigos": list(codigos), "percentis": percentis, "valores": valores, "desvalorizacao": desvalorizacao}
+
+def bandas_balanco(economia_bruta, bandas_desv, percentis=PERCENTIS_PADRAO):
+    """
+    Bandas do balanço líquido (economia bruta - desvalorização). Como o balanço decresce
+    com a desvalorização, o percentil p do balanço vem do percentil 100 - p da desvalorização;
+    os percentis precisam ser simétricos (ex.: 5, 50, 95).
+    """
+    percentis = list(percentis)
+    if percentis != [100 - p for p in reversed(percentis)]:
+        raise ValueError("Os percentis precisam ser simétricos em torno de 50 para as bandas do balanço.")
+    return economia_bruta - np.asarray(bandas_desv)[..., ::-1]
+
+def prever_com_incerteza(codigo_fipe, anos_para_prever=3, replicas=REPLICAS_PADRAO, percentis=PERCENTIS_PADRAO,
+                         arquivo_json=ARQUIVO_PADRAO, semente=SEMENTE_PADRAO):
+    """
+    Bandas de um único código: dict com 'percentis', 'valores' (percentis x anos) e
+    'desvalorizacao' (percentis), ou None se o código não tiver dados suficientes.
+    """
+    tabela = carregar_tabela_desvalorizacao(arquivo_json)
+    bandas = bandas_desvalorizacao(tabela, [codigo_fipe], anos_para_prever, replicas, percentis, 1, semente)
+    if np.isnan(bandas["desvalorizacao"][0]).all():
+        return None
+    return {"percentis": bandas["percentis"], "valores": bandas["valores"][0], "desvalorizacao": bandas["desvalorizacao"][0]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intervalos de bootstrap para a previsão de desvalorização.")
+    parser.add_argument("codigos", nargs="*", help="códigos FIPE (padrão: todos com dados suficientes)")
+    parser.add_argument("--anos", type=int, default=3, help="horizonte da previsão em anos")
+    parser.add_argument("--replicas", type=int, default=REPLICAS_PADRAO)
+    parser.add_argument("--percentis", nargs="+", type=float, default=list(PERCENTIS_PADRAO))
+    parser.add_argument("--processos", type=int, default=None, help="número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--arquivo", default=ARQUIVO_PADRAO)
+    parser.add_argument("--saida", metavar="ARQUIVO", help="grava as bandas em JSON")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    tabela = carregar_tabela_desvalorizacao(args.arquivo)
+    bandas = bandas_desvalorizacao(tabela, args.codigos or None, args.anos, args.replicas, args.percentis,
+                                   args.processos, args.semente)
+    print(f"{len(bandas['codigos'])} códigos x {args.replicas} réplicas em {time.perf_counter() - inicio:.2f} s.")
+
+    rotulos = " / ".join(f"P{p:g}" for p in bandas["percentis"])
+    for codigo, valores in zip(bandas["codigos"][:20], bandas["valores"]):
+        if np.isnan(valores).all():
+            print(f"  {codigo}: sem faixa (poucos pontos históricos para reamostrar).")
+            continue
+        faixa = " / ".join(f"R$ {v:,.0f}" for v in valores[:, -1])
+        print(f"  {codigo}: valor em {args.anos} ano(s) ({rotulos}): {faixa}")
+
+    if args.saida:
+        saida = {
+            "percentis": bandas["percentis"], "anos_para_prever": args.anos, "replicas": args.replicas,
+            "codigos": {
+                codigo: {"valores": valores.tolist(), "desvalorizacao": desv.tolist()}
+                for codigo, valores, desv in zip(bandas["codigos"], bandas["valores"], bandas["desvalorizacao"])
+                if not np.isnan(desv).all()
+            },
+        }
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(saida, f, ensure_ascii=False, indent=1)
+        print(f"Bandas salvas em '{args.saida}'.")
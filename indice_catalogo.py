@@ -0,0 +1,111 @@
+import numpy as np
+
+from catalogo import ARQUIVO_PADRAO, carregar_catalogo
+
+# --- ÍNDICE DE FAIXAS DO CATÁLOGO ---
+# Arrays ordenados de preço, autonomia e custo por km (no catálogo inteiro e em uma
+# partição por TipoVeiculo) para responder consultas de faixa por busca binária.
+# As linhas de cada partição ficam em ordem de preço, com as outras colunas na mesma
+# ordem: a janela de orçamento de uma recomendação é uma fatia contígua, sem cópia.
+
+COLUNAS_INDEXADAS = ("Valor", "AutonomiaTotalKM", "CustoMedioPorKM_R$")
+
+class ParticaoOrdenada:
+    """Linhas de uma partição em ordem de preço, com índices ordenados de autonomia e custo."""
+
+    def __init__(self, linhas, colunas):
+        ordem = np.argsort(colunas["Valor"][linhas], kind="stable")
+        self.linhas = linhas[ordem]
+        self.valor = colunas["Valor"][self.linhas]
+        self.autonomia = colunas["AutonomiaTotalKM"][self.linhas]
+        self.custo_km = colunas["CustoMedioPorKM_R$"][self.linhas]
+
+        # Para cada coluna: (posições na ordem de preço, valores ordenados). O preço já é a ordem base.
+        self._ordens = {"Valor": (None, self.valor)}
+        for nome, array in (("AutonomiaTotalKM", self.autonomia), ("CustoMedioPorKM_R$", self.custo_km)):
+            ordem = np.argsort(array, kind="stable")
+            self._ordens[nome] = (ordem, array[ordem])
+
+        self.custo_km_minimo = float(self.custo_km.min()) if len(self.linhas) else np.inf
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def limites(self, coluna, minimo=-np.inf, maximo=np.inf):
+        """Intervalo [inicio, fim) dos valores ordenados de `coluna` dentro de [minimo, maximo]."""
+        ordenado = self._ordens[coluna][1]
+        return int(np.searchsorted(ordenado, minimo, "left")), int(np.searchsorted(ordenado, maximo, "right"))
+
+    def fatia_preco(self, minimo=-np.inf, maximo=np.inf):
+        """Fatia (na ordem de preço) das linhas com minimo <= Valor <= maximo."""
+        return slice(*self.limites("Valor", minimo, maximo))
+
+    def posicoes(self, faixas):
+        """
+        Posições (na ordem de preço, crescentes) das linhas que atendem a todas as `faixas`
+        ({coluna: (minimo, maximo)}). Busca a faixa mais seletiva e filtra as demais nela.
+        """
+        if not faixas:
+            return np.arange(len(self))
+        limites = {coluna: self.limites(coluna, *faixa) for coluna, faixa in faixas.items()}
+        mais_seletiva = min(limites, key=lambda coluna: limites[coluna][1] - limites[coluna][0])
+        inicio, fim = limites[mais_seletiva]
+        ordem = self._ordens[mais_seletiva][0]
+        posicoes = np.arange(inicio, fim) if ordem is None else np.sort(ordem[inicio:fim])
+
+        arrays = {"Valor": self.valor, "AutonomiaTotalKM": self.autonomia, "CustoMedioPorKM_R$": self.custo_km}
+        for coluna, (minimo, maximo) in faixas.items():
+            if coluna != mais_seletiva:
+                valores = arrays[coluna][posicoes]
+                posicoes = posicoes[(valores >= minimo) & (valores <= maximo)]
+        return posicoes
+
+class IndiceCatalogo:
+    """
+    Índice de faixas do catálogo: uma ParticaoOrdenada com todas as linhas válidas
+    (preço e custo por km conhecidos) e uma por TipoVeiculo.
+    """
+
+    def __init__(self, catalogo):
+        self.catalogo = catalogo
+        colunas = {nome: np.asarray(catalogo[nome], dtype=np.float64) for nome in COLUNAS_INDEXADAS}
+        validas = np.isfinite(colunas["Valor"]) & np.isfinite(colunas["CustoMedioPorKM_R$"])
+        self.todos = ParticaoOrdenada(np.flatnonzero(validas), colunas)
+
+        self._vazia = ParticaoOrdenada(np.empty(0, dtype=np.int64), colunas)
+        codigos_tipo = np.asarray(catalogo.codigos("TipoVeiculo"))
+        self.particoes = {
+            tipo: ParticaoOrdenada(np.flatnonzero(validas & (codigos_tipo == codigo)), colunas)
+            for codigo, tipo in enumerate(catalogo.categorias("TipoVeiculo"))
+        }
+
+    def __len__(self):
+        return len(self.todos)
+
+    def particao(self, tipo=None):
+        """Partição do tipo (ex.: 'eletrico'); None = catálogo inteiro. Tipo desconhecido = partição vazia."""
+        if tipo is None:
+            return self.todos
+        return self.particoes.get(tipo, self._vazia)
+
+    def consultar(self, preco_min=None, preco_max=None, autonomia_min=None, autonomia_max=None,
+                  custo_km_max=None, tipo=None):
+        """Linhas do catálogo (crescentes) que atendem aos limites informados."""
+        faixas = {}
+        for coluna, minimo, maximo in (("Valor", preco_min, preco_max),
+                                       ("AutonomiaTotalKM", autonomia_min, autonomia_max),
+                                       ("CustoMedioPorKM_R$", None, custo_km_max)):
+            if minimo is not None or maximo is not None:
+                faixas[coluna] = (-np.inf if minimo is None else minimo, np.inf if maximo is None else maximo)
+        particao = self.particao(tipo)
+        return np.sort(particao.linhas[particao.posicoes(faixas)])
+
+_INDICES = {}
+
+def carregar_indice_catalogo(arquivo_json=ARQUIVO_PADRAO):
+    """Retorna o índice de faixas do catálogo, montando-o só na primeira chamada."""
+    catalogo = carregar_catalogo(arquivo_json)
+    indice = _INDICES.get(catalogo.versao)
+    if indice is None:
+        indice = _INDICES[catalogo.versao] = IndiceCatalogo(catalogo)
+    return indice
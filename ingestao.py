@@ -0,0 +1,347 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from catalogo import (
+    ANO_ZERO_KM,
+    COLUNAS_CATEGORICAS,
+    _hash_arquivo,
+    abrir_catalogo_colunar,
+    converter_preco,
+    gravar_catalogo_colunar,
+)
+
+# --- INGESTÃO E ENRIQUECIMENTO DO DUMP DA FIPE ---
+# Versão em Python do enriquecer_dados.js. O dump (JSON em lista ou JSONL) é lido em
+# streaming, lote a lote. O nome de cada modelo é casado com a tabela técnica por um
+# autômato Aho-Corasick compilado uma vez, que sempre escolhe a chave mais longa
+# ("DOLPHIN MINI" antes de "DOLPHIN"). Os custos são calculados vetorizados, e o
+# resultado vai direto para o formato colunar lido por carregar_catalogo().
+
+# --- 1. PARÂMETROS DE CUSTO ---
+PRECO_KWH_ELETRICO = 1.00  # R$ por kWh
+PRECO_COMBUSTIVEL_HIBRIDO = 6.00  # R$ por litro de gasolina
+
+# --- 2. TABELA DE REFERÊNCIA COM DADOS TÉCNICOS ---
+# Dados baseados em fichas técnicas e no padrão PBEV/INMETRO (mesma tabela do enriquecer_dados.js).
+DADOS_TECNICOS_BYD = {
+    'D1': {'tipo': 'eletrico', 'bateria_kwh': 53.6, 'autonomia_km': 270},
+    'DOLPHIN MINI': {'tipo': 'eletrico', 'bateria_kwh': 38, 'autonomia_km': 280},
+    'DOLPHIN': {'tipo': 'eletrico', 'bateria_kwh': 44.9, 'autonomia_km': 291},
+    'ET3': {'tipo': 'eletrico', 'bateria_kwh': 44.9, 'autonomia_km': 170},
+    'HAN': {'tipo': 'eletrico', 'bateria_kwh': 85.4, 'autonomia_km': 349},
+    'SEAL': {'tipo': 'eletrico', 'bateria_kwh': 82.5, 'autonomia_km': 372},
+    'TAN': {'tipo': 'eletrico', 'bateria_kwh': 108.8, 'autonomia_km': 309},
+    'YUAN PLUS': {'tipo': 'eletrico', 'bateria_kwh': 60.5, 'autonomia_km': 294},
+    'YUAN PRO': {'tipo': 'eletrico', 'bateria_kwh': 47.5, 'autonomia_km': 310},
+    'KING': {'tipo': 'hibrido', 'bateria_kwh': 8.3, 'autonomia_eletrica_km': 55,
+             'consumo_gasolina_km_por_litro': 25.6, 'tanque_litros': 48},
+    'SHARK': {'tipo': 'hibrido', 'bateria_kwh': 29.6, 'autonomia_eletrica_km': 100,
+              'consumo_gasolina_km_por_litro': 10.5, 'tanque_litros': 50},  # consumo estimado
+    'SONG PLUS': {'tipo': 'hibrido', 'bateria_kwh': 18.3, 'autonomia_eletrica_km': 78,
+                  'consumo_gasolina_km_por_litro': 15.1, 'tanque_litros': 52},
+    'SONG PRO': {'tipo': 'hibrido', 'bateria_kwh': 12.9, 'autonomia_eletrica_km': 51,
+                 'consumo_gasolina_km_por_litro': 16.5, 'tanque_litros': 52},
+}
+
+SEM_DADOS = 'N/A'
+TAMANHO_LOTE = 10_000
+TAMANHO_BLOCO_LEITURA = 1 << 20  # caracteres lidos por vez do JSON
+
+# --- 3. CASAMENTO DE MODELOS (AHO-CORASICK) ---
+
+class CasadorModelos:
+    """
+    Autômato Aho-Corasick sobre as chaves da tabela técnica. `casar(texto)` percorre o
+    nome do modelo uma única vez e devolve o índice da chave mais longa encontrada como
+    palavra inteira (empate: a que aparece primeiro), ou -1. O resultado por nome é
+    memorizado, já que um dump tem poucos nomes distintos e muitas linhas.
+    """
+
+    def __init__(self, chaves):
+        self.chaves = list(chaves)
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._saidas = [[]]  # estado -> índices das chaves que terminam nele
+        for indice, chave in enumerate(self.chaves):
+            estado = 0
+            for caractere in chave.upper():
+                proximo = self._transicoes[estado].get(caractere)
+                if proximo is None:
+                    proximo = len(self._transicoes)
+                    self._transicoes[estado][caractere] = proximo
+                    self._transicoes.append({})
+                    self._falha.append(0)
+                    self._saidas.append([])
+                estado = proximo
+            self._saidas[estado].append(indice)
+
+        # Links de falha em largura; as saídas herdam as do estado de falha.
+        fila = list(self._transicoes[0].values())
+        while fila:
+            estado = fila.pop(0)
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[proximo] = destino if destino != proximo else 0
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falha[proximo]]
+        self._memo = {}
+
+    def casar(self, texto):
+        indice = self._memo.get(texto)
+        if indice is None:
+            indice = self._memo[texto] = self._casar(texto)
+        return indice
+
+    def _casar(self, texto):
+        texto = texto.upper()
+        melhor, melhor_tamanho, melhor_inicio = -1, 0, 0
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in self._transicoes[estado]:
+                estado = self._falha[estado]
+            estado = self._transicoes[estado].get(caractere, 0)
+            for indice in self._saidas[estado]:
+                tamanho = len(self.chaves[indice])
+                inicio = posicao - tamanho + 1
+                # Só palavras inteiras: "TAN" não casa dentro de "STANDARD".
+                if inicio > 0 and texto[inicio - 1].isalnum():
+                    continue
+                if posicao + 1 < len(texto) and texto[posicao + 1].isalnum():
+                    continue
+                if tamanho > melhor_tamanho or (tamanho == melhor_tamanho and inicio < melhor_inicio):
+                    melhor, melhor_tamanho, melhor_inicio = indice, tamanho, inicio
+        return melhor
+
+class TabelaTecnica:
+    """Tabela técnica em arrays (uma posição por chave) com custo por km e autonomia já calculados."""
+
+    def __init__(self, dados_tecnicos=DADOS_TECNICOS_BYD, preco_kwh=PRECO_KWH_ELETRICO,
+                 preco_combustivel=PRECO_COMBUSTIVEL_HIBRIDO):
+        self.dados_tecnicos = dados_tecnicos
+        self.preco_kwh = preco_kwh
+        self.preco_combustivel = preco_combustivel
+        self.chaves = list(dados_tecnicos)
+        self.casador = CasadorModelos(self.chaves)
+
+        def campo(nome):
+            return np.array([float(d.get(nome, np.nan)) for d in dados_tecnicos.values()], dtype=np.float64)
+
+        self.tipos = [d['tipo'] for d in dados_tecnicos.values()]
+        self.hibrido = np.array([t == 'hibrido' for t in self.tipos])
+        self.bateria_kwh = campo('bateria_kwh')
+        self.autonomia_eletrica_km = np.where(self.hibrido, campo('autonomia_eletrica_km'), np.nan)
+        self.consumo_km_por_litro = campo('consumo_gasolina_km_por_litro')
+        self.tanque_litros = campo('tanque_litros')
+
+        # Mesmas fórmulas do enriquecer_dados.js, para todas as chaves de uma vez.
+        custo_carga = self.bateria_kwh * preco_kwh
+        autonomia_hibrido = self.autonomia_eletrica_km + self.tanque_litros * self.consumo_km_por_litro
+        custo_hibrido = custo_carga + self.tanque_litros * preco_combustivel
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.autonomia_total_km = np.where(self.hibrido, np.round(autonomia_hibrido, 2), campo('autonomia_km'))
+            self.custo_por_km = np.round(
+                np.where(self.hibrido, custo_hibrido / autonomia_hibrido, custo_carga / self.autonomia_total_km), 4
+            )
+            # Consumo por km, para recalcular o custo com outros preços (cenarios.py).
+            self.kwh_por_km = self.bateria_kwh / np.where(self.hibrido, autonomia_hibrido, self.autonomia_total_km)
+            self.litros_por_km = np.where(self.hibrido, self.tanque_litros / autonomia_hibrido, 0.0)
+
+    def assinatura(self):
+        """Identifica tabela + preços (entra na versão do catálogo gerado)."""
+        conteudo = json.dumps([self.dados_tecnicos, self.preco_kwh, self.preco_combustivel], sort_keys=True)
+        return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+# --- 4. LEITURA EM STREAMING ---
+
+def _ler_array_json(arquivo, tamanho_bloco):
+    """Itera os objetos de um JSON `[{...}, {...}]` sem carregar o arquivo inteiro."""
+    decodificador = json.JSONDecoder()
+    buffer, posicao, fim_arquivo = "", 0, False
+    dentro = False
+    while True:
+        # Pula espaços, vírgulas e o colchete de abertura.
+        while posicao < len(buffer) and (buffer[posicao].isspace() or buffer[posicao] == ',' or
+                                         (not dentro and buffer[posicao] == '[')):
+            dentro = dentro or buffer[posicao] == '['
+            posicao += 1
+        if posicao < len(buffer) and buffer[posicao] == ']':
+            return
+        try:
+            if posicao >= len(buffer):
+                raise json.JSONDecodeError("fim do bloco", buffer, posicao)
+            objeto, posicao = decodificador.raw_decode(buffer, posicao)
+        except json.JSONDecodeError:
+            if fim_arquivo:
+                if buffer[posicao:].strip():
+                    raise
+                return
+            bloco = arquivo.read(tamanho_bloco)
+            fim_arquivo = not bloco
+            buffer = buffer[posicao:] + bloco
+            posicao = 0
+            continue
+        yield objeto
+
+def ler_registros(caminho, tamanho_bloco=TAMANHO_BLOCO_LEITURA):
+    """
+    Itera os registros de um dump da FIPE, em JSON (lista de objetos) ou JSONL
+    (um objeto por linha), lendo o arquivo aos poucos.
+    """
+    with open(caminho, 'r', encoding='utf-8') as f:
+        inicio = f.read(1)
+        while inicio and inicio.isspace():
+            inicio = f.read(1)
+        if inicio == '[':
+            yield from _ler_array_json(f, tamanho_bloco)
+            return
+        linha = inicio + f.readline()
+        while linha:
+            if linha.strip():
+                yield json.loads(linha)
+            linha = f.readline()
+
+def _em_lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+# --- 5. ENRIQUECIMENTO EM COLUNAS ---
+
+def _numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+class _Acumulador:
+    """Junta as colunas de vários lotes; categóricas ganham códigos globais conforme aparecem."""
+
+    def __init__(self):
+        self.partes = {}
+        self.indices = {nome: {} for nome in COLUNAS_CATEGORICAS}
+
+    def codificar(self, nome, valores):
+        indice = self.indices[nome]
+        codigos = np.empty(len(valores), dtype=np.int32)
+        for i, valor in enumerate(valores):
+            if valor is None:
+                codigos[i] = -1
+                continue
+            valor = str(valor)
+            codigo = indice.get(valor)
+            if codigo is None:
+                codigo = indice[valor] = len(indice)
+            codigos[i] = codigo
+        return codigos
+
+    def adicionar(self, colunas):
+        for nome, coluna in colunas.items():
+            self.partes.setdefault(nome, []).append(coluna)
+
+    def colunas(self):
+        return {nome: np.concatenate(partes) for nome, partes in self.partes.items()}
+
+    def categorias(self):
+        return {nome: list(indice) for nome, indice in self.indices.items()}
+
+def enriquecer_lote(registros, tabela, acumulador):
+    """Converte um lote de registros crus da FIPE em colunas tipadas já enriquecidas."""
+    n = len(registros)
+    casar = tabela.casador.casar
+    especificacao = np.fromiter((casar(str(r.get('Modelo', ''))) for r in registros), np.int64, n)
+    casou = especificacao >= 0
+    posicao = np.where(casou, especificacao, 0)
+
+    def por_especificacao(valores):
+        return np.where(casou, valores[posicao], np.nan)
+
+    anos = np.fromiter((_numero(r.get('AnoModelo')) for r in registros), np.float64, n)
+    colunas = {
+        'Valor': np.fromiter((converter_preco(r.get('Valor')) for r in registros), np.float64, n),
+        'AnoModelo': np.nan_to_num(anos, nan=0).astype(np.int32),
+    }
+    colunas['ZeroKm'] = colunas['AnoModelo'] == ANO_ZERO_KM
+    colunas['CapacidadeBateriaKWH'] = por_especificacao(tabela.bateria_kwh)
+    colunas['AutonomiaTotalKM'] = por_especificacao(tabela.autonomia_total_km)
+    colunas['AutonomiaEletricaKM'] = por_especificacao(tabela.autonomia_eletrica_km)
+    colunas['CustoMedioPorKM_R$'] = por_especificacao(tabela.custo_por_km)
+
+    chaves = [tabela.chaves[i] if i >= 0 else SEM_DADOS for i in especificacao.tolist()]
+    tipos = [tabela.tipos[i] if i >= 0 else SEM_DADOS for i in especificacao.tolist()]
+    for nome in COLUNAS_CATEGORICAS:
+        if nome == 'ModeloBase':
+            valores = chaves
+        elif nome == 'TipoVeiculo':
+            valores = tipos
+        else:
+            valores = [r.get(nome) for r in registros]
+        colunas[nome] = acumulador.codificar(nome, valores)
+
+    acumulador.adicionar(colunas)
+    return int(casou.sum())
+
+def destino_padrao(entrada):
+    return os.path.splitext(entrada)[0] + '.colunar'
+
+def ingerir(entrada, destino=None, tabela=None, tamanho_lote=TAMANHO_LOTE, verbose=True):
+    """
+    Lê o dump `entrada` em lotes, enriquece com a tabela técnica e grava o catálogo
+    colunar em `destino` (padrão: <entrada sem extensão>.colunar). Retorna o Catalogo,
+    que pode ser passado (pela pasta) a carregar_catalogo() nas outras ferramentas.
+    """
+    tabela = tabela or TabelaTecnica()
+    destino = destino or destino_padrao(entrada)
+    inicio = time.perf_counter()
+
+    acumulador = _Acumulador()
+    linhas = casadas = 0
+    for lote in _em_lotes(ler_registros(entrada), tamanho_lote):
+        casadas += enriquecer_lote(lote, tabela, acumulador)
+        linhas += len(lote)
+        if verbose:
+            print(f"  {linhas} registros processados...", end='\r', flush=True)
+
+    if not linhas:
+        raise ValueError(f"Nenhum registro encontrado em '{entrada}'.")
+
+    estado = os.stat(entrada)
+    sha = _hash_arquivo(entrada)
+    origem = {
+        'caminho': os.path.abspath(entrada), 'mtime_ns': estado.st_mtime_ns, 'tamanho': estado.st_size,
+        'sha256': sha, 'tabela_tecnica': tabela.assinatura(),
+    }
+    versao = hashlib.sha256(f"{sha}:{origem['tabela_tecnica']}".encode()).hexdigest()
+    meta = gravar_catalogo_colunar(destino, acumulador.colunas(), acumulador.categorias(), origem, versao)
+
+    if verbose:
+        print(f"\r{linhas} registros ({casadas} com dados técnicos, {linhas - casadas} sem) "
+              f"gravados em '{destino}' em {time.perf_counter() - inicio:.1f} s.")
+    return abrir_catalogo_colunar(destino, meta)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Enriquece um dump da FIPE (JSON ou JSONL) e grava o catálogo colunar.")
+    parser.add_argument('entrada', nargs='?', default='dataset_byd_fipe.json')
+    parser.add_argument('destino', nargs='?', help="pasta do catálogo colunar (padrão: <entrada>.colunar)")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="registros por lote")
+    parser.add_argument('--preco-kwh', type=float, default=PRECO_KWH_ELETRICO)
+    parser.add_argument('--preco-combustivel', type=float, default=PRECO_COMBUSTIVEL_HIBRIDO)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.entrada):
+        print(f"Erro: O arquivo '{args.entrada}' não foi encontrado.")
+    else:
+        tabela = TabelaTecnica(preco_kwh=args.preco_kwh, preco_combustivel=args.preco_combustivel)
+        ingerir(args.entrada, args.destino, tabela, args.lote)
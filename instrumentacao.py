@@ -0,0 +1,213 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# --- INSTRUMENTAÇÃO DOS CAMINHOS QUENTES ---
+# Registro em memória (por processo) de durações, contadores e valores (caracteres e
+# tokens de prompt, acertos de cache...). Medir custa dois perf_counter e um lock, então
+# fica ligado sempre; só a exportação (JSONL de eventos e texto no formato do Prometheus)
+# e a captura de cProfile são opcionais.
+#
+#   with medir("recomendar.pontuacao"): ...
+#   @cronometrado("desvalorizacao.ajuste")
+#   contar("catalogo.cache", resultado="acerto")
+#   observar("llm.prompt_caracteres", len(prompt))
+
+PREFIXO_PROMETHEUS = "vendedor"
+MAXIMO_EVENTOS = 100_000  # eventos guardados para o JSONL (os mais antigos são descartados)
+# Limites (segundos) dos buckets do histograma de durações no Prometheus
+BUCKETS_DURACAO = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+
+class RegistroMetricas:
+    """Durações (com histograma), contadores e valores observados, por nome + rótulos."""
+
+    def __init__(self, maximo_eventos=MAXIMO_EVENTOS):
+        self._lock = threading.Lock()
+        self.duracoes = {}    # chave -> [contagem, soma, mínimo, máximo, contagens por bucket]
+        self.contadores = {}  # chave -> total
+        self.valores = {}     # chave -> [contagem, soma, mínimo, máximo]
+        self.eventos = deque(maxlen=maximo_eventos)
+
+    def _evento(self, tipo, nome, valor, rotulos):
+        self.eventos.append({"ts": time.time(), "tipo": tipo, "nome": nome, "valor": valor, "rotulos": rotulos})
+
+    def registrar_duracao(self, nome, segundos, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self._lock:
+            item = self.duracoes.get(chave)
+            if item is None:
+                item = self.duracoes[chave] = [0, 0.0, segundos, segundos, [0] * len(BUCKETS_DURACAO)]
+            item[0] += 1
+            item[1] += segundos
+            item[2] = min(item[2], segundos)
+            item[3] = max(item[3], segundos)
+            for i, limite in enumerate(BUCKETS_DURACAO):
+                if segundos <= limite:
+                    item[4][i] += 1
+                    break
+            self._evento("duracao", nome, segundos, rotulos)
+
+    def contar(self, nome, quantidade=1, **rotulos):
+        chave = _chave(nome, rotulos)
+        with self._lock:
+            self.contadores[chave] = self.contadores.get(chave, 0) + quantidade
+            self._evento("contador", nome, quantidade, rotulos)
+
+    def observar(self, nome, valor, **rotulos):
+        """Valor numérico qualquer (caracteres, tokens, linhas...): guarda contagem, soma, mínimo e máximo."""
+        chave = _chave(nome, rotulos)
+        with self._lock:
+            item = self.valores.get(chave)
+            if item is None:
+                item = self.valores[chave] = [0, 0.0, valor, valor]
+            item[0] += 1
+            item[1] += valor
+            item[2] = min(item[2], valor)
+            item[3] = max(item[3], valor)
+            self._evento("valor", nome, valor, rotulos)
+
+    @contextmanager
+    def medir(self, nome, **rotulos):
+        """Mede o bloco (também quando ele levanta exceção, com o rótulo erro=<classe>)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.registrar_duracao(nome, time.perf_counter() - inicio, erro=type(e).__name__, **rotulos)
+            raise
+        self.registrar_duracao(nome, time.perf_counter() - inicio, **rotulos)
+
+    def cronometrado(self, nome=None, **rotulos):
+        """Decorador: mede cada chamada da função (nome padrão: modulo.funcao)."""
+        def decorar(funcao):
+            nome_metrica = nome or f"{funcao.__module__}.{funcao.__name__}"
+
+            @functools.wraps(funcao)
+            def envolvida(*args, **kwargs):
+                with self.medir(nome_metrica, **rotulos):
+                    return funcao(*args, **kwargs)
+            return envolvida
+        return decorar
+
+    def limpar(self):
+        with self._lock:
+            self.duracoes.clear()
+            self.contadores.clear()
+            self.valores.clear()
+            self.eventos.clear()
+
+    def resumo(self):
+        """Dict serializável com os agregados (útil para imprimir ou gravar em JSON)."""
+        def rotulado(chave):
+            nome, rotulos = chave
+            return {"nome": nome, "rotulos": dict(rotulos)}
+
+        with self._lock:
+            return {
+                "duracoes": [
+                    dict(rotulado(k), contagem=c, soma_s=s, min_s=mn, max_s=mx, media_s=s / c)
+                    for k, (c, s, mn, mx, _) in sorted(self.duracoes.items())
+                ],
+                "contadores": [dict(rotulado(k), total=t) for k, t in sorted(self.contadores.items())],
+                "valores": [
+                    dict(rotulado(k), contagem=c, soma=s, min=mn, max=mx, media=s / c)
+                    for k, (c, s, mn, mx) in sorted(self.valores.items())
+                ],
+            }
+
+    # --- Exportação ---
+
+    def exportar_jsonl(self, caminho):
+        """Um evento por linha (duração, contador ou valor), mais os agregados no fim (tipo 'resumo')."""
+        with self._lock:
+            eventos = list(self.eventos)
+        with open(caminho, "a", encoding="utf-8") as f:
+            for evento in eventos:
+                f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"ts": time.time(), "tipo": "resumo", "pid": os.getpid(), **self.resumo()},
+                               ensure_ascii=False) + "\n")
+        return caminho
+
+    def texto_prometheus(self):
+        """Agregados no formato de texto do Prometheus (para o textfile collector do node_exporter)."""
+        linhas = []
+        with self._lock:
+            duracoes = sorted(self.duracoes.items())
+            contadores = sorted(self.contadores.items())
+            valores = sorted(self.valores.items())
+
+        if duracoes:
+            metrica = f"{PREFIXO_PROMETHEUS}_duracao_segundos"
+            linhas += [f"# HELP {metrica} Duração das etapas instrumentadas.", f"# TYPE {metrica} histogram"]
+            for (nome, rotulos), (contagem, soma, _, _, buckets) in duracoes:
+                base = (("etapa", nome),) + rotulos
+                acumulado = 0
+                for limite, n in zip(BUCKETS_DURACAO, buckets):
+                    acumulado += n
+                    linhas.append(f"{metrica}_bucket{_rotulos(base + (('le', f'{limite:g}'),))} {acumulado}")
+                linhas.append(f"{metrica}_bucket{_rotulos(base + (('le', '+Inf'),))} {contagem}")
+                linhas.append(f"{metrica}_sum{_rotulos(base)} {soma:.9g}")
+                linhas.append(f"{metrica}_count{_rotulos(base)} {contagem}")
+
+        if contadores:
+            metrica = f"{PREFIXO_PROMETHEUS}_eventos_total"
+            linhas += [f"# HELP {metrica} Contadores (chamadas, acertos de cache, erros...).", f"# TYPE {metrica} counter"]
+            for (nome, rotulos), total in contadores:
+                linhas.append(f"{metrica}{_rotulos((('evento', nome),) + rotulos)} {total:.9g}")
+
+        if valores:
+            metrica = f"{PREFIXO_PROMETHEUS}_valor"
+            linhas += [f"# HELP {metrica} Valores observados (caracteres, tokens...).", f"# TYPE {metrica} summary"]
+            for (nome, rotulos), (contagem, soma, _, _) in valores:
+                base = (("medida", nome),) + rotulos
+                linhas.append(f"{metrica}_sum{_rotulos(base)} {soma:.9g}")
+                linhas.append(f"{metrica}_count{_rotulos(base)} {contagem}")
+        return "\n".join(linhas) + "\n"
+
+    def exportar_prometheus(self, caminho):
+        """Grava o texto do Prometheus de forma atômica (o collector nunca lê um arquivo pela metade)."""
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(self.texto_prometheus())
+        os.replace(temporario, caminho)
+        return caminho
+
+def _rotulos(pares):
+    def escapar(valor):
+        return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+# Registro padrão do processo e atalhos
+REGISTRO = RegistroMetricas()
+medir = REGISTRO.medir
+cronometrado = REGISTRO.cronometrado
+contar = REGISTRO.contar
+observar = REGISTRO.observar
+registrar_duracao = REGISTRO.registrar_duracao
+
+def exportar_metricas(base, registro=REGISTRO):
+    """Grava <base>.jsonl (eventos, acrescentados) e <base>.prom (Prometheus). Retorna os dois caminhos."""
+    return registro.exportar_jsonl(f"{base}.jsonl"), registro.exportar_prometheus(f"{base}.prom")
+
+@contextmanager
+def capturar_perfil(caminho, linhas_resumo=25):
+    """cProfile de uma execução: grava as estatísticas em `caminho` (leia com pstats/snakeviz) e imprime o topo."""
+    import cProfile
+    import pstats
+
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield perfil
+    finally:
+        perfil.disable()
+        perfil.dump_stats(caminho)
+        if linhas_resumo:
+            pstats.Stats(perfil).sort_stats("cumulative").print_stats(linhas_resumo)
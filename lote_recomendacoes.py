@@ -0,0 +1,312 @@
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from catalogo import ARQUIVO_PADRAO, carregar_catalogo
+from desvalorizacao import carregar_tabela_desvalorizacao
+from instrumentacao import contar, cronometrado
+from recomendar_carro import ALIQUOTA_IPVA, CAMPOS_PERFIL, recomendar_em_lote
+
+# --- RECOMENDAÇÃO EM LOTE (LEADS DO CRM) ---
+# Lê perfis de clientes de um JSONL ou CSV em streaming, recomenda os top-k carros de
+# cada um com o balanço líquido em N anos (economia de combustível + IPVA - desvalorização)
+# e grava um JSONL de saída, uma linha por perfil, na mesma ordem da entrada.
+#
+# - Os perfis vão em blocos para um pool de processos; cada processo carrega catálogo e
+#   tabela de desvalorização uma vez (caches por versão do catálogo) e pontua o bloco
+#   inteiro de uma vez com recomendar_em_lote.
+# - Só alguns blocos ficam em andamento ao mesmo tempo, então a memória não cresce com o
+#   tamanho do arquivo; cada bloco pronto é gravado e descarregado (flush) em seguida.
+# - Retomada: a saída tem o 'indice' de cada perfil; rodando de novo com a mesma saída,
+#   uma linha final incompleta é descartada e os perfis já gravados são pulados.
+# - Gráficos de desvalorização (do carro recomendado) só com --graficos.
+
+TOP_K_PADRAO = 3
+ANOS_PADRAO = 3
+TAMANHO_BLOCO = 1024        # perfis por tarefa do pool
+BLOCOS_POR_PROCESSO = 2     # blocos em andamento por processo (limita a memória)
+REPLICAS_FAIXAS = 1000      # réplicas de bootstrap por código em --faixas
+CAMPOS_OBRIGATORIOS = ("preco_carro_atual", "km_rodados_anual", "viagens_longas")
+CAMPO_ID_PADRAO = "id"
+
+# --- 1. LEITURA DOS PERFIS ---
+
+def ler_registros(caminho, delimitador=","):
+    """Dicts brutos do arquivo de entrada (.csv ou JSONL), um por vez. Linhas em branco são ignoradas."""
+    if caminho.lower().endswith(".csv"):
+        with open(caminho, "r", newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f, delimiter=delimitador)
+        return
+    with open(caminho, "r", encoding="utf-8") as f:
+        for numero, linha in enumerate(f, 1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError as e:
+                registro = {"_erro": f"JSON inválido na linha {numero}: {e.msg}"}
+            yield registro if isinstance(registro, dict) else {"_erro": f"linha {numero} não é um objeto JSON"}
+
+def converter_perfil(registro):
+    """Perfil no formato de PERFIL_USUARIO a partir de um registro bruto. Levanta ValueError se inválido."""
+    if "_erro" in registro:
+        raise ValueError(registro["_erro"])
+    perfil = {}
+    for campo in CAMPOS_PERFIL:
+        valor = registro.get(campo)
+        if valor is None or (isinstance(valor, str) and not valor.strip()):
+            if campo in CAMPOS_OBRIGATORIOS:
+                raise ValueError(f"campo '{campo}' ausente")
+            continue  # dados do carro atual: recomendar_carro usa CARRO_ATUAL_PERFIL
+        try:
+            perfil[campo] = float(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"campo '{campo}' não numérico: {valor!r}") from None
+        if not math.isfinite(perfil[campo]) or perfil[campo] < 0:
+            raise ValueError(f"campo '{campo}' inválido: {valor!r}")
+    # Divisores em pontuar_perfis: zero não é "dado ausente", é perfil inválido.
+    for campo in ("preco_carro_atual", "consumo_km_por_litro", "preco_gasolina_litro"):
+        if campo in perfil and perfil[campo] <= 0:
+            raise ValueError(f"{campo} deve ser maior que zero")
+    return perfil
+
+# --- 2. PROCESSAMENTO DE UM BLOCO (EM QUALQUER PROCESSO) ---
+
+# Bandas de bootstrap já calculadas neste processo: (versão do catálogo, anos, código) -> (P5, P95)
+_FAIXAS = {}
+
+def _faixas_desvalorizacao(tabela, versao, codigos, anos):
+    from incerteza_desvalorizacao import bandas_desvalorizacao
+
+    novos = [c for c in codigos if (versao, anos, c) not in _FAIXAS]
+    if novos:
+        bandas = bandas_desvalorizacao(tabela, novos, anos, REPLICAS_FAIXAS, (5, 50, 95))
+        for codigo, desvalorizacao in zip(novos, bandas["desvalorizacao"]):
+            _FAIXAS[(versao, anos, codigo)] = (desvalorizacao[0], desvalorizacao[2])
+    return {c: _FAIXAS[(versao, anos, c)] for c in codigos}
+
+def _numero(valor, casas=2):
+    valor = float(valor)
+    return round(valor, casas) if math.isfinite(valor) else None
+
+def _processar_bloco(tarefa):
+    """
+    Recomenda os perfis de um bloco. Retorna (texto JSONL do bloco, número de erros,
+    códigos FIPE dos carros recomendados em 1º lugar).
+    """
+    catalogo = carregar_catalogo(tarefa["arquivo_json"])
+    tabela = carregar_tabela_desvalorizacao(tarefa["arquivo_json"])
+    anos = tarefa["anos"]
+
+    validos, linhas_saida = [], []
+    for indice, id_perfil, perfil in tarefa["perfis"]:
+        if isinstance(perfil, str):
+            linhas_saida.append({"indice": indice, "id": id_perfil, "erro": perfil})
+        else:
+            validos.append(len(linhas_saida))
+            linhas_saida.append({"indice": indice, "id": id_perfil})
+    if not validos:
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in linhas_saida), len(linhas_saida), []
+
+    resultado = recomendar_em_lote(catalogo, [tarefa["perfis"][i][2] for i in validos], tarefa["top_k"])
+    indices = resultado["indices"]
+
+    # Dados dos carros e previsão de desvalorização: uma vez por linha do catálogo do bloco.
+    unicas = np.unique(indices)
+    registros = {int(linha): catalogo.registro(int(linha)) for linha in unicas}
+    codigos = [registros[int(linha)]["CodigoFipe"] for linha in unicas]
+    previstos = tabela.prever(codigos, anos)[:, -1]
+    posicoes = np.array([tabela.posicao(c) for c in codigos], dtype=np.int64)
+    valor_zero = np.where(posicoes >= 0, tabela.valor_zero[posicoes], np.nan)
+    desvalorizacao = dict(zip(unicas.tolist(), np.maximum(0.0, valor_zero - previstos)))
+    faixas = {}
+    if tarefa["faixas"]:
+        faixas = _faixas_desvalorizacao(tabela, catalogo.versao, sorted(set(codigos)), anos)
+
+    codigos_top1 = set()
+    for posicao_lote, saida in enumerate(linhas_saida[i] for i in validos):
+        recomendacoes = []
+        for linha, pontuacao, economia in zip(indices[posicao_lote], resultado["pontuacao"][posicao_lote],
+                                              resultado["economia_anual"][posicao_lote]):
+            carro = registros[int(linha)]
+            economia_ipva = carro["Valor"] * ALIQUOTA_IPVA
+            economia_bruta = (economia + economia_ipva) * anos
+            desv = desvalorizacao[int(linha)]
+            item = {
+                "CodigoFipe": carro["CodigoFipe"],
+                "Modelo": carro["Modelo"],
+                "AnoModelo": carro["AnoModelo"],
+                "TipoVeiculo": carro["TipoVeiculo"],
+                "Valor": _numero(carro["Valor"]),
+                "Pontuacao": _numero(pontuacao, 4),
+                "EconomiaAnualEstimada_R$": _numero(economia),
+                "EconomiaIPVAAnual_R$": _numero(economia_ipva),
+                "EconomiaBruta_R$": _numero(economia_bruta),
+                "Desvalorizacao_R$": _numero(desv),
+                # Sem dados de desvalorização o balanço fica null (a economia bruta continua valendo).
+                "BalancoLiquido_R$": _numero(economia_bruta - desv),
+            }
+            faixa = faixas.get(carro["CodigoFipe"])
+            if faixa is not None and math.isfinite(faixa[0]):
+                # Balanço decresce com a desvalorização: o P5 do balanço vem do P95 da desvalorização.
+                item["FaixaBalanco90_R$"] = [_numero(economia_bruta - faixa[1]), _numero(economia_bruta - faixa[0])]
+            recomendacoes.append(item)
+
+        if tarefa["pasta_graficos"] and recomendacoes and recomendacoes[0]["Desvalorizacao_R$"] is not None:
+            from graficos_desvalorizacao import nome_arquivo_grafico
+
+            melhor = registros[int(indices[posicao_lote][0])]
+            recomendacoes[0]["grafico"] = os.path.join(
+                tarefa["pasta_graficos"], nome_arquivo_grafico(melhor["ModeloBase"], melhor["CodigoFipe"])
+            )
+            codigos_top1.add(melhor["CodigoFipe"])
+        saida["anos"] = anos
+        saida["recomendacoes"] = recomendacoes
+
+    texto = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in linhas_saida)
+    return texto, len(linhas_saida) - len(validos), sorted(codigos_top1)
+
+def _iniciar_processo(arquivo_json):
+    # Com fork os caches do processo pai já vêm prontos; com spawn, carrega aqui uma vez.
+    carregar_tabela_desvalorizacao(arquivo_json)
+
+# --- 3. RETOMADA E EXECUÇÃO ---
+
+def preparar_saida(caminho, recomecar=False, coletar_graficos=False):
+    """
+    Deixa a saída pronta para acréscimo. Descarta uma última linha incompleta (execução
+    interrompida no meio da escrita) e retorna (perfis já processados, códigos com gráfico
+    pedido nessas linhas).
+    """
+    if recomecar or not os.path.exists(caminho):
+        open(caminho, "w", encoding="utf-8").close()
+        return 0, set()
+
+    fim = 0
+    ultima = None
+    codigos = set()
+    with open(caminho, "rb+") as f:
+        for linha in f:
+            if not linha.endswith(b"\n"):
+                break
+            fim += len(linha)
+            ultima = linha
+            if coletar_graficos and b'"grafico"' in linha:
+                codigos.add(json.loads(linha)["recomendacoes"][0]["CodigoFipe"])
+        f.truncate(fim)
+    if ultima is None:
+        return 0, codigos
+    return json.loads(ultima)["indice"] + 1, codigos
+
+def _tarefas(caminho, ja_processados, tamanho_bloco, base, delimitador, campo_id):
+    registros = enumerate(ler_registros(caminho, delimitador))
+    registros = islice(registros, ja_processados, None)
+    while True:
+        bloco = list(islice(registros, tamanho_bloco))
+        if not bloco:
+            return
+        perfis = []
+        for indice, registro in bloco:
+            try:
+                perfil = converter_perfil(registro)
+            except ValueError as e:
+                perfil = str(e)  # vira uma linha de erro na saída
+            perfis.append((indice, registro.get(campo_id), perfil))
+        yield dict(base, perfis=perfis)
+
+@cronometrado("lote.recomendar_arquivo")
+def recomendar_arquivo(entrada, saida, top_k=TOP_K_PADRAO, anos=ANOS_PADRAO, processos=None,
+                       tamanho_bloco=TAMANHO_BLOCO, arquivo_json=ARQUIVO_PADRAO, pasta_graficos=None,
+                       faixas=False, recomecar=False, delimitador=",", campo_id=CAMPO_ID_PADRAO, verbose=True):
+    """
+    Processa todos os perfis de `entrada` e acrescenta os resultados em `saida` (JSONL).
+    Com `pasta_graficos`, gera no fim os gráficos de desvalorização dos carros recomendados
+    em 1º lugar. Retorna um dict com processados, pulados (já feitos antes), erros e graficos.
+    """
+    # Carrega no processo pai: erros de arquivo aparecem logo e, com fork, os filhos herdam os caches.
+    carregar_tabela_desvalorizacao(arquivo_json)
+
+    pulados, codigos_graficos = preparar_saida(saida, recomecar, coletar_graficos=bool(pasta_graficos))
+    if verbose and pulados:
+        print(f"Retomando: {pulados} perfis já estavam em '{saida}'.")
+
+    base = {"arquivo_json": arquivo_json, "top_k": top_k, "anos": anos, "faixas": faixas,
+            "pasta_graficos": pasta_graficos}
+    tarefas = _tarefas(entrada, pulados, tamanho_bloco, base, delimitador, campo_id)
+    processados = erros = 0
+    inicio = time.perf_counter()
+
+    with open(saida, "a", encoding="utf-8") as arquivo:
+        def gravar(resultado):
+            nonlocal processados, erros
+            texto, n_erros, codigos = resultado
+            arquivo.write(texto)
+            arquivo.flush()
+            n = texto.count("\n")
+            processados += n
+            erros += n_erros
+            codigos_graficos.update(codigos)
+            contar("lote.perfis", n - n_erros, resultado="ok")
+            contar("lote.perfis", n_erros, resultado="erro")
+            if verbose:
+                print(f"  {pulados + processados} perfis ({processados / (time.perf_counter() - inicio):,.0f}/s)",
+                      end="\r", flush=True)
+
+        processos = processos or os.cpu_count() or 1
+        if processos == 1:
+            for tarefa in tarefas:
+                gravar(_processar_bloco(tarefa))
+        else:
+            with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo,
+                                     initargs=(arquivo_json,)) as pool:
+                # Janela limitada de blocos em andamento, gravados na ordem da entrada.
+                pendentes = deque()
+                for tarefa in tarefas:
+                    pendentes.append(pool.submit(_processar_bloco, tarefa))
+                    if len(pendentes) >= processos * BLOCOS_POR_PROCESSO:
+                        gravar(pendentes.popleft().result())
+                while pendentes:
+                    gravar(pendentes.popleft().result())
+    if verbose and processados:
+        print()
+
+    graficos = None
+    if pasta_graficos and codigos_graficos:
+        from graficos_desvalorizacao import renderizar_lote
+
+        graficos = renderizar_lote(sorted(codigos_graficos), anos, pasta_graficos, processos, arquivo_json=arquivo_json)
+    return {"processados": processados, "pulados": pulados, "erros": erros, "graficos": graficos}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recomendação em lote para perfis de clientes (JSONL ou CSV).")
+    parser.add_argument("entrada", help="arquivo de perfis: .jsonl (um objeto por linha) ou .csv com cabeçalho")
+    parser.add_argument("saida", help="arquivo JSONL de resultados (se já existir, a execução é retomada)")
+    parser.add_argument("--top-k", type=int, default=TOP_K_PADRAO, help="carros recomendados por perfil")
+    parser.add_argument("--anos", type=int, default=ANOS_PADRAO, help="horizonte do balanço líquido em anos")
+    parser.add_argument("--processos", type=int, default=None, help="número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO, help="perfis por tarefa do pool")
+    parser.add_argument("--arquivo", default=ARQUIVO_PADRAO, help="catálogo (JSON ou pasta colunar)")
+    parser.add_argument("--graficos", nargs="?", const="images", metavar="PASTA",
+                        help="gera os gráficos de desvalorização dos carros recomendados (padrão: images)")
+    parser.add_argument("--faixas", action="store_true", help="inclui a faixa de 90%% do balanço (bootstrap)")
+    parser.add_argument("--recomecar", action="store_true", help="apaga a saída existente em vez de retomar")
+    parser.add_argument("--delimitador", default=",", help="delimitador do CSV")
+    parser.add_argument("--campo-id", default=CAMPO_ID_PADRAO, help="campo com o identificador do lead")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resumo = recomendar_arquivo(args.entrada, args.saida, args.top_k, args.anos, args.processos, args.tamanho_bloco,
+                                args.arquivo, args.graficos, args.faixas, args.recomecar, args.delimitador,
+                                args.campo_id)
+    print(f"{resumo['processados']} perfis processados ({resumo['erros']} com erro, {resumo['pulados']} já feitos) "
+          f"em {time.perf_counter() - inicio:.1f} s -> '{args.saida}'.")
+    if resumo["graficos"]:
+        print(f"{len(resumo['graficos']['renderizados'])} gráficos gerados, {resumo['graficos']['pulados']} sem alteração.")
@@ -0,0 +1,158 @@
+import itertools
+import random
+import threading
+import time
+from collections import deque
+
+# --- MODELO LOCAL (FALSO) ---
+# Imita a interface do google.generativeai (start_chat / send_message / stream)
+# para testar o assistente offline, com atrasos configuráveis por chunk.
+
+RESPOSTA_PADRAO = (
+    "Olá! Eu sou a VendedorAI da BYD. Pelo que você contou, um elétrico pode te fazer "
+    "economizar bastante com combustível. Que tal agendar um test drive para sentir o carro?"
+)
+
+class ErroCotaLocal(Exception):
+    """Imita o 429 (ResourceExhausted) da API."""
+    code = 429
+
+    def __init__(self, mensagem, retry_after=None):
+        super().__init__(mensagem)
+        self.retry_after = retry_after
+
+class ErroEntradaLocal(Exception):
+    """Imita o 400 (InvalidArgument) da API."""
+    code = 400
+
+class ChunkLocal:
+    def __init__(self, text):
+        self.text = text
+
+class RespostaLocal:
+    """
+    Resposta do modelo local. Com stream=True, iterar sobre ela produz os chunks
+    respeitando os atrasos; `text` sempre devolve a resposta completa.
+    """
+
+    def __init__(self, texto, tamanho_chunk, atraso_primeiro_chunk, atraso_chunk, ao_concluir=None):
+        self._texto = texto
+        self._tamanho_chunk = tamanho_chunk
+        self._atraso_primeiro_chunk = atraso_primeiro_chunk
+        self._atraso_chunk = atraso_chunk
+        self._ao_concluir = ao_concluir
+        self._consumida = False
+
+    def __iter__(self):
+        time.sleep(self._atraso_primeiro_chunk)
+        for inicio in range(0, len(self._texto), self._tamanho_chunk):
+            if inicio:
+                time.sleep(self._atraso_chunk)
+            yield ChunkLocal(self._texto[inicio:inicio + self._tamanho_chunk])
+        self._concluir()
+
+    def _concluir(self):
+        if not self._consumida:
+            self._consumida = True
+            if self._ao_concluir:
+                self._ao_concluir(self._texto)
+
+    def resolve(self):
+        for _ in self:
+            pass
+
+    @property
+    def text(self):
+        return self._texto
+
+class ChatLocal:
+    def __init__(self, modelo, history=None):
+        self.model = modelo
+        self.history = list(history or [])
+
+    def send_message(self, content, stream=False, **kwargs):
+        # Falhas injetadas acontecem antes de mexer no histórico, como no SDK.
+        self.model.talvez_falhar()
+        texto = self.model.gerar_resposta(content, self.history)
+        self.history.append({"role": "user", "parts": [content]})
+
+        def registrar(resposta):
+            self.history.append({"role": "model", "parts": [resposta]})
+
+        resposta = RespostaLocal(
+            texto, self.model.tamanho_chunk, self.model.atraso_primeiro_chunk, self.model.atraso_chunk, registrar,
+        )
+        if not stream:
+            # Sem streaming o modelo real só responde depois de gerar tudo.
+            time.sleep(self.model.atraso_primeiro_chunk + self.model.atraso_chunk * (len(texto) // self.model.tamanho_chunk))
+            resposta._concluir()
+        return resposta
+
+class ModeloLocal:
+    """
+    Modelo generativo falso. `respostas` (lista de textos) é usada em ciclo; sem ela,
+    responde sempre RESPOSTA_PADRAO. Os atrasos simulam o tempo até o primeiro token
+    e o intervalo entre chunks de `tamanho_chunk` caracteres.
+
+    Para testar retentativas e limites, injeta falhas em send_message:
+      - `falhas`: roteiro consumido em ordem ('cota', 'timeout', 'entrada' ou None = sucesso);
+      - `taxa_cota` / `taxa_timeout`: probabilidade de 429 / timeout em cada chamada;
+      - `cota_por_segundo`: imita a cota da API, respondendo 429 acima dessa taxa.
+    Um timeout espera `tempo_timeout` segundos antes de falhar. `chamadas` e
+    `falhas_injetadas` contam o que chegou ao "servidor".
+    """
+
+    def __init__(self, respostas=None, atraso_primeiro_chunk=0.3, atraso_chunk=0.05, tamanho_chunk=24,
+                 system_instruction=None, falhas=None, taxa_cota=0.0, taxa_timeout=0.0, tempo_timeout=1.0,
+                 cota_por_segundo=None, semente=None):
+        self._respostas = itertools.cycle(respostas or [RESPOSTA_PADRAO])
+        self.atraso_primeiro_chunk = atraso_primeiro_chunk
+        self.atraso_chunk = atraso_chunk
+        self.tamanho_chunk = tamanho_chunk
+        self.system_instruction = system_instruction
+
+        self._falhas = iter(falhas or ())
+        self.taxa_cota = taxa_cota
+        self.taxa_timeout = taxa_timeout
+        self.tempo_timeout = tempo_timeout
+        self.cota_por_segundo = cota_por_segundo
+        self._recentes = deque()  # instantes das chamadas aceitas no último segundo
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self.chamadas = 0
+        self.falhas_injetadas = {"cota": 0, "timeout": 0, "entrada": 0}
+
+    def talvez_falhar(self):
+        with self._lock:
+            self.chamadas += 1
+            falha = next(self._falhas, None)
+            if falha is None:
+                sorteio = self._rng.random()
+                if sorteio < self.taxa_cota:
+                    falha = "cota"
+                elif sorteio < self.taxa_cota + self.taxa_timeout:
+                    falha = "timeout"
+            if falha is None and self.cota_por_segundo:
+                agora = time.monotonic()
+                while self._recentes and agora - self._recentes[0] >= 1.0:
+                    self._recentes.popleft()
+                if len(self._recentes) >= self.cota_por_segundo:
+                    falha = "cota"
+                else:
+                    self._recentes.append(agora)
+            if falha is not None:
+                self.falhas_injetadas[falha] += 1
+
+        if falha == "cota":
+            raise ErroCotaLocal("429 Resource has been exhausted (modelo local)")
+        if falha == "timeout":
+            time.sleep(self.tempo_timeout)
+            raise TimeoutError("Tempo esgotado esperando o modelo local")
+        if falha == "entrada":
+            raise ErroEntradaLocal("400 Request contains an invalid argument (modelo local)")
+
+    def gerar_resposta(self, mensagem, historico):
+        return next(self._respostas)
+
+    def start_chat(self, history=None, **kwargs):
+        return ChatLocal(self, history)
@@ -1,7 +1,9 @@
-import json
-import pandas as pd
 import numpy as np
 
+from catalogo import carregar_catalogo
+from incerteza_desvalorizacao import bandas_balanco, prever_com_incerteza
+from indice_catalogo import carregar_indice_catalogo
+from instrumentacao import cronometrado, observar
 # Importa a função de previsão de desvalorização do outro arquivo
 from desvalorizacao import prever_valor_futuro_ml, gerar_imagem_desvalorizacao
 
@@ -13,6 +15,12 @@ CARRO_ATUAL_PERFIL = {
     'preco_gasolina_litro': 6.00
 }
 
+# IPVA (alíquota sobre o valor do carro) que os elétricos/híbridos deixam de pagar
+ALIQUOTA_IPVA = 0.03
+
+# Janela inicial de preço (em desvios-padrão do orçamento) pontuada por recomendar_com_indice
+JANELA_INICIAL_DESVIOS = 2.0
+
 # --- 2. PERFIL DO USUÁRIO ---
 # Estes são os inputs para o modelo. Altere com seus dados!
 PERFIL_USUARIO = {
@@ -21,16 +29,16 @@ PERFIL_USUARIO = {
     'viagens_longas': 600,
 }
 
+@cronometrado("recomendar.carregar_dados")
 def carregar_dados(filepath='dataset_byd_completo_custos.json'):
     try:
-        df = pd.read_json(filepath)
+        catalogo = carregar_catalogo(filepath)
         print(f"Dados carregados com sucesso de '{filepath}'.")
-        
-        df = df[df['CustoMedioPorKM_R$'] != 'N/A'].copy()
-        df['Valor'] = df['Valor'].replace({'R\$ ': ''}, regex=True).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).astype(float)
-        df['CustoMedioPorKM_R$'] = pd.to_numeric(df['CustoMedioPorKM_R$'])
-        df['AutonomiaTotalKM'] = pd.to_numeric(df['AutonomiaTotalKM'])
-        
+
+        # O catálogo já vem tipado; 'N/A' no custo por km vira NaN.
+        df = catalogo.para_dataframe()
+        df = df[df['CustoMedioPorKM_R$'].notna()].copy()
+
         return df
     except FileNotFoundError:
         print(f"ERRO: O arquivo '{filepath}' não foi encontrado.")
@@ -39,57 +47,197 @@ def carregar_dados(filepath='dataset_byd_completo_custos.json'):
         print(f"Ocorreu um erro ao processar o arquivo: {e}")
         return None
 
+# Campos de um perfil de cliente; os dois últimos descrevem o carro atual
+# e, se omitidos, vêm de CARRO_ATUAL_PERFIL.
+CAMPOS_PERFIL = (
+    'preco_carro_atual',
+    'km_rodados_anual',
+    'viagens_longas',
+    'consumo_km_por_litro',
+    'preco_gasolina_litro',
+)
+
+def perfis_para_arrays(perfis):
+    """
+    Converte uma lista de perfis (dicts no formato de PERFIL_USUARIO) em um dict
+    de arrays (N,), preenchendo os dados do carro atual com CARRO_ATUAL_PERFIL.
+    Também aceita um dict de arrays já pronto.
+    """
+    if isinstance(perfis, dict):
+        n = len(np.atleast_1d(perfis['preco_carro_atual']))
+        return {
+            campo: np.broadcast_to(np.asarray(perfis.get(campo, CARRO_ATUAL_PERFIL.get(campo)), dtype=np.float64), (n,))
+            for campo in CAMPOS_PERFIL
+        }
+    return {
+        campo: np.array([p.get(campo, CARRO_ATUAL_PERFIL.get(campo)) for p in perfis], dtype=np.float64)
+        for campo in CAMPOS_PERFIL
+    }
+
+def pontuar_perfis(valor, autonomia, custo_km, perfis):
+    """
+    Núcleo vetorizado do modelo: pontua N perfis contra M carros de uma vez.
+    `valor`, `autonomia` e `custo_km` são arrays (M,); `perfis` é o dict de
+    arrays (N,) de `perfis_para_arrays`. Retorna (pontuacao, economia_anual), ambos (N, M).
+    """
+    orcamento = perfis['preco_carro_atual'][:, None]
+    km_anual = perfis['km_rodados_anual'][:, None]
+    viagens = perfis['viagens_longas'][:, None]
+
+    custo_anual_atual = km_anual / perfis['consumo_km_por_litro'][:, None] * perfis['preco_gasolina_litro'][:, None]
+
+    std_dev = orcamento * 0.3
+    score_orcamento = np.exp(-0.5 * ((valor[None, :] - orcamento) / std_dev) ** 2)
+
+    score_autonomia = np.where(autonomia[None, :] < viagens * 0.5, 0.5, 1.0)
+    score_autonomia = np.where(autonomia[None, :] > viagens, score_autonomia * 1.2, score_autonomia)
+
+    economia_anual = custo_anual_atual - km_anual * custo_km[None, :]
+    score_economia = economia_anual / 5000
+
+    pontuacao = (score_orcamento * 0.4) + (score_autonomia * 0.2) + (score_economia * 0.4)
+    return pontuacao, economia_anual
+
+@cronometrado("recomendar.pontuacao")
 def calcular_pontuacao_e_economia(df, perfil_usuario):
     """
     Calcula a pontuação de adequação e a economia anual para cada carro.
     Esta é a função principal do nosso "modelo".
     """
-    scores = []
-    economias = []
-    
-    custo_anual_atual = (perfil_usuario['km_rodados_anual'] / CARRO_ATUAL_PERFIL['consumo_km_por_litro']) * CARRO_ATUAL_PERFIL['preco_gasolina_litro']
-
-    for index, carro in df.iterrows():
-        preco_carro_byd = carro['Valor']
-        orcamento = perfil_usuario['preco_carro_atual']
-        std_dev = orcamento * 0.3
-        score_orcamento = np.exp(-0.5 * ((preco_carro_byd - orcamento) / std_dev) ** 2)
-
-        score_autonomia = 1.0
-        if carro['AutonomiaTotalKM'] < PERFIL_USUARIO['viagens_longas']*0.5:
-            score_autonomia *= 0.5
-        if carro['AutonomiaTotalKM'] > PERFIL_USUARIO['viagens_longas']:
-            score_autonomia *= 1.2
-            
-        custo_anual_byd = perfil_usuario['km_rodados_anual'] * carro['CustoMedioPorKM_R$']
-        economia_anual = custo_anual_atual - custo_anual_byd
-        economias.append(economia_anual)
-        
-        score_economia = economia_anual / 5000
+    pontuacao, economia = pontuar_perfis(
+        df['Valor'].to_numpy(dtype=np.float64),
+        df['AutonomiaTotalKM'].to_numpy(dtype=np.float64),
+        df['CustoMedioPorKM_R$'].to_numpy(dtype=np.float64),
+        perfis_para_arrays([perfil_usuario]),
+    )
 
-        pontuacao_final = (score_orcamento * 0.4) + (score_autonomia * 0.2) + (score_economia * 0.4)
-        scores.append(pontuacao_final)
-
-    df['Pontuacao'] = scores
-    df['EconomiaAnualEstimada_R$'] = economias
+    df['Pontuacao'] = pontuacao[0]
+    df['EconomiaAnualEstimada_R$'] = economia[0]
     return df.sort_values(by='Pontuacao', ascending=False)
 
-def main():
+@cronometrado("recomendar.lote")
+def recomendar_em_lote(catalogo, perfis, top_k=5, tamanho_bloco=4096):
+    """
+    Pontua muitos perfis de uma vez contra todo o catálogo e devolve os top-k por perfil.
+    `perfis` pode ser uma lista de dicts (como PERFIL_USUARIO) ou um dict de arrays.
+    Os perfis são processados em blocos para limitar a memória da matriz (bloco x carros).
+
+    Retorna um dict com arrays (N, k):
+      - 'indices': linha do carro no catálogo (use catalogo.registro(i));
+      - 'pontuacao' e 'economia_anual': valores correspondentes, em ordem decrescente de pontuação.
+    """
+    custo_km = np.asarray(catalogo['CustoMedioPorKM_R$'], dtype=np.float64)
+    linhas_validas = np.flatnonzero(np.isfinite(custo_km))
+    valor = np.asarray(catalogo['Valor'], dtype=np.float64)[linhas_validas]
+    autonomia = np.asarray(catalogo['AutonomiaTotalKM'], dtype=np.float64)[linhas_validas]
+    custo_km = custo_km[linhas_validas]
+
+    arrays = perfis_para_arrays(perfis)
+    n = len(arrays['preco_carro_atual'])
+    k = min(top_k, len(linhas_validas))
+
+    indices = np.empty((n, k), dtype=np.int64)
+    pontuacoes = np.empty((n, k), dtype=np.float64)
+    economias = np.empty((n, k), dtype=np.float64)
+
+    for inicio in range(0, n, tamanho_bloco):
+        fatia = slice(inicio, min(inicio + tamanho_bloco, n))
+        bloco = {campo: coluna[fatia] for campo, coluna in arrays.items()}
+        pontuacao, economia = pontuar_perfis(valor, autonomia, custo_km, bloco)
+
+        # Seleção parcial dos k melhores e ordenação só desses k.
+        if k < pontuacao.shape[1]:
+            melhores = np.argpartition(-pontuacao, k - 1, axis=1)[:, :k]
+        else:
+            melhores = np.broadcast_to(np.arange(k), (pontuacao.shape[0], k))
+        ordem = np.argsort(-np.take_along_axis(pontuacao, melhores, axis=1), axis=1, kind='stable')
+        melhores = np.take_along_axis(melhores, ordem, axis=1)
+
+        indices[fatia] = linhas_validas[melhores]
+        pontuacoes[fatia] = np.take_along_axis(pontuacao, melhores, axis=1)
+        economias[fatia] = np.take_along_axis(economia, melhores, axis=1)
+
+    return {'indices': indices, 'pontuacao': pontuacoes, 'economia_anual': economias}
+
+def carregar_indice(filepath='dataset_byd_completo_custos.json'):
+    try:
+        indice = carregar_indice_catalogo(filepath)
+        print(f"Dados carregados com sucesso de '{filepath}'.")
+        return indice
+    except FileNotFoundError:
+        print(f"ERRO: O arquivo '{filepath}' não foi encontrado.")
+        return None
+    except Exception as e:
+        print(f"Ocorreu um erro ao processar o arquivo: {e}")
+        return None
+
+@cronometrado("recomendar.top_k_indice")
+def recomendar_com_indice(indice, perfil_usuario, top_k=5, tipo=None):
+    """
+    Top-k exato do modelo de pontuação usando o índice de faixas (indice_catalogo.py):
+    só os carros numa janela de preço em torno do orçamento são pontuados.
+
+    Fora de uma janela de w desvios-padrão, a nota de orçamento é no máximo
+    0.4 * exp(-w²/2); autonomia (até 1.2) e economia (com o menor custo por km da
+    partição) também têm teto. Se o k-ésimo carro da janela já alcança esse teto,
+    nenhum carro de fora entraria no top-k; senão a janela dobra até cobrir a partição.
+
+    Retorna (linhas do catálogo, pontuação, economia anual), em ordem decrescente de pontuação.
+    """
+    particao = indice.particao(tipo)
+    perfil = perfis_para_arrays([perfil_usuario])
+    k = min(top_k, len(particao))
+    if k <= 0:
+        vazio = np.empty(0)
+        return vazio.astype(np.int64), vazio, vazio
+
+    orcamento = float(perfil['preco_carro_atual'][0])
+    km_anual = float(perfil['km_rodados_anual'][0])
+    std_dev = orcamento * 0.3
+    custo_anual_atual = km_anual / perfil['consumo_km_por_litro'][0] * perfil['preco_gasolina_litro'][0]
+    teto_sem_orcamento = 0.2 * 1.2 + 0.4 * (custo_anual_atual - km_anual * particao.custo_km_minimo) / 5000
+
+    largura = JANELA_INICIAL_DESVIOS
+    while True:
+        if std_dev > 0 and np.isfinite(std_dev):
+            fatia = particao.fatia_preco(orcamento - largura * std_dev, orcamento + largura * std_dev)
+        else:
+            fatia = slice(0, len(particao))
+        cobre_tudo = fatia.start == 0 and fatia.stop == len(particao)
+        if fatia.stop - fatia.start >= k or cobre_tudo:
+            pontuacao, economia = pontuar_perfis(
+                particao.valor[fatia], particao.autonomia[fatia], particao.custo_km[fatia], perfil
+            )
+            pontuacao, economia = pontuacao[0], economia[0]
+            k_janela = min(k, len(pontuacao))
+            melhores = np.argpartition(-pontuacao, k_janela - 1)[:k_janela]
+            if cobre_tudo or pontuacao[melhores].min() >= 0.4 * np.exp(-0.5 * largura ** 2) + teto_sem_orcamento:
+                break
+        largura *= 2
+
+    observar("recomendar.candidatos_pontuados", len(pontuacao))
+    linhas = particao.linhas[fatia][melhores]
+    ordem = np.lexsort((linhas, -pontuacao[melhores]))
+    return linhas[ordem], pontuacao[melhores][ordem], economia[melhores][ordem]
+
+def main(perfil_usuario=PERFIL_USUARIO, gerar_grafico=True):
     """Função principal para executar o processo de recomendação."""
-    df_byd = carregar_dados()
+    indice = carregar_indice()
     
-    if df_byd is not None and not df_byd.empty:
-        df_recomendacoes = calcular_pontuacao_e_economia(df_byd, PERFIL_USUARIO)
+    if indice is not None and len(indice):
+        linhas, pontuacoes, economias = recomendar_com_indice(indice, perfil_usuario, top_k=1)
         
-        if df_recomendacoes.empty:
+        if len(linhas) == 0:
             print("Não foi possível gerar recomendações com os dados disponíveis.")
             return
 
-        melhor_opcao = df_recomendacoes.iloc[0]
+        melhor_opcao = indice.catalogo.registro(int(linhas[0]))
+        melhor_opcao['Pontuacao'] = pontuacoes[0]
+        melhor_opcao['EconomiaAnualEstimada_R$'] = economias[0]
         
         print("\n--- Modelo de Recomendação de Carro BYD ---")
         print("\nAnalisando seu perfil:")
-        for chave, valor in PERFIL_USUARIO.items():
+        for chave, valor in perfil_usuario.items():
             print(f"  - {chave.replace('_', ' ').capitalize()}: {valor}")
         
         print("\n--- RECOMENDAÇÃO PRINCIPAL ---")
@@ -101,17 +249,17 @@ def main():
         print(f"Pontuação de Adequação: {melhor_opcao['Pontuacao']:.2f}")
 
         print("\n--- ANÁLISE DE ECONOMIA ---")
-        print(f"Custo Anual com carro atual (gasolina): R$ {(PERFIL_USUARIO['km_rodados_anual'] / CARRO_ATUAL_PERFIL['consumo_km_por_litro']) * CARRO_ATUAL_PERFIL['preco_gasolina_litro']:,.2f}")
-        print(f"Custo Anual com o {melhor_opcao['ModeloBase']}: R$ {PERFIL_USUARIO['km_rodados_anual'] * melhor_opcao['CustoMedioPorKM_R$']:,.2f}")
+        print(f"Custo Anual com carro atual (gasolina): R$ {(perfil_usuario['km_rodados_anual'] / CARRO_ATUAL_PERFIL['consumo_km_por_litro']) * CARRO_ATUAL_PERFIL['preco_gasolina_litro']:,.2f}")
+        print(f"Custo Anual com o {melhor_opcao['ModeloBase']}: R$ {perfil_usuario['km_rodados_anual'] * melhor_opcao['CustoMedioPorKM_R$']:,.2f}")
         print("--------------------------------------------------")
         print(f">> ECONOMIA DE COMBUSTIVEL ANUAL ESTIMADA: R$ {melhor_opcao['EconomiaAnualEstimada_R$']:,.2f} <<")
-        print(f">> ECONOMIA COM IMPOSTOS (IPVA) ANUAL ESTIMADA: R$ {melhor_opcao['Valor'] * 0.03:,.2f} <<")
+        print(f">> ECONOMIA COM IMPOSTOS (IPVA) ANUAL ESTIMADA: R$ {melhor_opcao['Valor'] * ALIQUOTA_IPVA:,.2f} <<")
 
         # --- CÁLCULO DA DESVALORIZAÇÃO E ECONOMIA LÍQUIDA ---
         print("\n--- ANÁLISE DE VALOR EM 3 ANOS (VISÃO REALISTA) ---")
         
         # Calcula a economia bruta em 3 anos (combustível + impostos)
-        economia_bruta_3_anos = (melhor_opcao['EconomiaAnualEstimada_R$'] + (melhor_opcao['Valor'] * 0.03)) * 3
+        economia_bruta_3_anos = (melhor_opcao['EconomiaAnualEstimada_R$'] + (melhor_opcao['Valor'] * ALIQUOTA_IPVA)) * 3
 
         # Pega o código FIPE do carro recomendado e chama o modelo de desvalorização
         codigo_fipe_rec = melhor_opcao['CodigoFipe']
@@ -120,8 +268,9 @@ def main():
 
         if dados_desvalorizacao:
             # Gera a imagem da análise
-            nome_arquivo_imagem = f"images/analise_{melhor_opcao['ModeloBase'].replace(' ', '_')}_{codigo_fipe_rec}.png"
-            gerar_imagem_desvalorizacao(dados_desvalorizacao, nome_arquivo_imagem)
+            if gerar_grafico:
+                nome_arquivo_imagem = f"images/analise_{melhor_opcao['ModeloBase'].replace(' ', '_')}_{codigo_fipe_rec}.png"
+                gerar_imagem_desvalorizacao(dados_desvalorizacao, nome_arquivo_imagem)
 
             desvalorizacao_3_anos = dados_desvalorizacao['desvalorizacao_total']
             economia_liquida_3_anos = economia_bruta_3_anos - desvalorizacao_3_anos
@@ -129,6 +278,14 @@ def main():
             print(f"Desvalorização Total Estimada do Veículo em 3 anos: R$ -{desvalorizacao_3_anos:,.2f}")
             print("--------------------------------------------------")
             print(f">> BALANÇO FINANCEIRO LÍQUIDO EM 3 ANOS: R$ {economia_liquida_3_anos:,.2f} <<")
+
+            # Faixa do balanço pela incerteza da curva (bootstrap do histórico do código)
+            bandas = prever_com_incerteza(codigo_fipe_rec, 3)
+            if bandas is not None:
+                balanco_baixo, _, balanco_alto = bandas_balanco(economia_bruta_3_anos, bandas['desvalorizacao'])
+                print(f"   Faixa provável (90%): R$ {balanco_baixo:,.2f} a R$ {balanco_alto:,.2f}")
+            else:
+                print("   Faixa provável (90%): sem faixa (histórico curto demais para estimar a incerteza)")
             print("--------------------------------------------------")
         else:
             print("Não foi possível calcular a desvalorização (dados insuficientes para o modelo).")
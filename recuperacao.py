@@ -0,0 +1,275 @@
+import math
+import re
+import unicodedata
+import numpy as np
+
+from catalogo import formatar_preco
+
+# --- 1. PARÂMETROS DA RECUPERAÇÃO ---
+
+TOP_K_PADRAO = 6
+ORCAMENTO_TOKENS_PADRAO = 900
+
+# Parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Palavras que não ajudam a diferenciar carros do estoque.
+PALAVRAS_IGNORADAS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "um", "uma", "para", "pra",
+    "com", "que", "qual", "quais", "quanto", "quanta", "me", "eu", "voce", "meu", "minha", "tem",
+    "ter", "no", "na", "nos", "nas", "por", "mais", "menos", "carro", "carros", "byd", "ev", "km",
+    "ate", "r", "mil", "reais", "sobre", "se", "ele", "ela", "isso", "esse", "essa", "e", "ou",
+}
+
+SINONIMOS = {
+    "eletrico": ["eletrico"],
+    "eletricos": ["eletrico"],
+    "hibrido": ["hibrido"],
+    "hibridos": ["hibrido"],
+    "novo": ["zero"],
+    "novos": ["zero"],
+    "0km": ["zero"],
+    "usado": ["seminovo"],
+    "usados": ["seminovo"],
+}
+
+# --- 2. TEXTO ---
+
+def normalizar_texto(texto):
+    """Minúsculas, sem acentos e só com letras/dígitos separados por espaço."""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", texto).strip()
+
+def tokenizar(texto):
+    tokens = []
+    for token in normalizar_texto(texto).split():
+        if token in PALAVRAS_IGNORADAS:
+            continue
+        tokens.extend(SINONIMOS.get(token, [token]))
+    return tokens
+
+def estimar_tokens(texto):
+    """Estimativa grosseira de tokens do modelo (~4 caracteres por token)."""
+    return math.ceil(len(texto) / 4)
+
+def formatar_numero(valor):
+    """Exibe números do catálogo sem casas decimais desnecessárias (270.0 -> 270)."""
+    return f"{valor:g}"
+
+def formatar_carro(carro):
+    """Monta o bloco de texto de um carro (registro do catálogo) para a IA ler."""
+    # LÓGICA DE TRADUÇÃO DO ANO
+    if carro['ZeroKm']:
+        condicao = "🌟 ZERO KM (Novo)"
+    else:
+        condicao = f"🔄 SEMINOVO (Ano {carro['AnoModelo']})"
+
+    return (
+        f"MODELO: {carro['Modelo']}\n"
+        f"   - Condição: {condicao}\n" # <--- AQUI ESTÁ A CHAVE
+        f"   - Preço: {formatar_preco(carro['Valor'])}\n"
+        f"   - Tipo: {carro['TipoVeiculo'].upper()}\n"
+        f"   - Custo Km: R$ {formatar_numero(carro['CustoMedioPorKM_R$'])}\n"
+        f"   - Autonomia: {formatar_numero(carro['AutonomiaTotalKM'])} km\n"
+        "--------------------------------------------------\n"
+    )
+
+# --- 3. FILTROS ESTRUTURADOS A PARTIR DA MENSAGEM ---
+
+_NUMERO = r"(\d{1,3}(?:[.\s]\d{3})+|\d+(?:,\d+)?)"
+_MOEDA = r"(?:r\s*\$\s*)?"
+_RE_ENTRE = re.compile(
+    r"entre\s*" + _MOEDA + _NUMERO + r"\s*(mil\b|k\b)?\s*e\s*" + _MOEDA + _NUMERO + r"\s*(mil\b|k\b)?"
+)
+_RE_PRECO = re.compile(
+    r"(?P<prefixo>ate|no maximo|maximo de|abaixo de|menos de|a partir de|acima de|mais de|minimo de)?\s*"
+    + _MOEDA + _NUMERO + r"\s*(?P<unidade>(?:mil|k|reais)\b)?"
+)
+_RE_AUTONOMIA = re.compile(r"autonomia\D{0,20}?(\d{2,4})\s*km|(\d{2,4})\s*km\s*de\s*autonomia")
+_PREFIXOS_MINIMO = ("a partir de", "acima de", "mais de", "minimo de")
+
+def _valor_numerico(texto, unidade=None):
+    texto = texto.replace(" ", "")
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    else:
+        texto = texto.replace(".", "")
+    valor = float(texto)
+    return valor * 1000 if unidade in ("mil", "k") else valor
+
+def remover_acentos(texto):
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def extrair_filtros(mensagem):
+    """
+    Extrai filtros estruturados de uma mensagem do cliente.
+    Retorna um dict com as chaves presentes entre: preco_min, preco_max, tipo,
+    autonomia_min e zero_km. Números abaixo de R$ 10 mil (km, anos) não contam como preço.
+    """
+    texto = remover_acentos(mensagem)
+    filtros = {}
+
+    eletrico = re.search(r"\beletric", texto)
+    hibrido = re.search(r"\bhibrid", texto)
+    if eletrico and not hibrido:
+        filtros["tipo"] = "eletrico"
+    elif hibrido and not eletrico:
+        filtros["tipo"] = "hibrido"
+
+    if re.search(r"\bseminov|\busad", texto):
+        filtros["zero_km"] = False
+    elif re.search(r"\bzero km\b|\b0 ?km\b|\bnovo\b", texto):
+        filtros["zero_km"] = True
+
+    autonomia = _RE_AUTONOMIA.search(texto)
+    if autonomia:
+        filtros["autonomia_min"] = float(autonomia.group(1) or autonomia.group(2))
+        texto = texto.replace(autonomia.group(0), " ")
+
+    entre = _RE_ENTRE.search(texto)
+    if entre:
+        unidade = entre.group(4) or entre.group(2)
+        filtros["preco_min"] = _valor_numerico(entre.group(1), entre.group(2) or unidade)
+        filtros["preco_max"] = _valor_numerico(entre.group(3), unidade)
+        return filtros
+
+    for m in _RE_PRECO.finditer(texto):
+        valor = _valor_numerico(m.group(2), m.group("unidade"))
+        # Quilometragem ("rodo 50 km", "20.000 km por ano") e anos não são preço.
+        if valor < 10000 or re.match(r"\s*km", texto[m.end():]):
+            continue
+        if m.group("prefixo") in _PREFIXOS_MINIMO:
+            filtros["preco_min"] = valor
+        else:
+            # "até X" é um teto; um orçamento solto aceita até 10% acima.
+            filtros["preco_max"] = valor if m.group("prefixo") else valor * 1.1
+    return filtros
+
+# --- 4. ÍNDICE DO ESTOQUE ---
+
+class IndiceEstoque:
+    """
+    Índice em memória do catálogo para a etapa de recuperação do assistente:
+    arrays numéricos para os filtros estruturados e um índice invertido (BM25)
+    sobre o texto de cada carro.
+    """
+
+    def __init__(self, catalogo):
+        self.catalogo = catalogo
+        self.valor = np.asarray(catalogo["Valor"], dtype=np.float64)
+        self.autonomia = np.asarray(catalogo["AutonomiaTotalKM"], dtype=np.float64)
+        self.zero_km = np.asarray(catalogo["ZeroKm"], dtype=bool)
+        self.tipo = catalogo["TipoVeiculo"]
+
+        modelos = catalogo["Modelo"]
+        bases = catalogo["ModeloBase"]
+        combustiveis = catalogo["Combustivel"]
+        anos = np.asarray(catalogo["AnoModelo"])
+
+        postings = {}
+        tamanhos = np.zeros(len(catalogo))
+        for i in range(len(catalogo)):
+            condicao = "zero" if self.zero_km[i] else f"seminovo {anos[i]}"
+            tokens = tokenizar(f"{modelos[i]} {bases[i]} {self.tipo[i]} {combustiveis[i]} {condicao}")
+            tamanhos[i] = len(tokens)
+            for token in tokens:
+                contagem = postings.setdefault(token, {})
+                contagem[i] = contagem.get(i, 0) + 1
+
+        self.tamanhos = tamanhos
+        self.tamanho_medio = max(tamanhos.mean(), 1.0) if len(tamanhos) else 1.0
+        n = len(catalogo)
+        self.postings = {}
+        for token, contagem in postings.items():
+            docs = np.fromiter(contagem.keys(), dtype=np.int64, count=len(contagem))
+            freq = np.fromiter(contagem.values(), dtype=np.float64, count=len(contagem))
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            self.postings[token] = (docs, freq, idf)
+
+    def __len__(self):
+        return len(self.valor)
+
+    def mascara_filtros(self, filtros):
+        mascara = np.isfinite(self.valor)
+        if "preco_min" in filtros:
+            mascara &= self.valor >= filtros["preco_min"]
+        if "preco_max" in filtros:
+            mascara &= self.valor <= filtros["preco_max"]
+        if "autonomia_min" in filtros:
+            mascara &= self.autonomia >= filtros["autonomia_min"]
+        if "tipo" in filtros:
+            mascara &= self.tipo == filtros["tipo"]
+        if "zero_km" in filtros:
+            mascara &= self.zero_km == filtros["zero_km"]
+        return mascara
+
+    def pontuar_texto(self, consulta):
+        pontuacao = np.zeros(len(self))
+        for token in set(tokenizar(consulta)):
+            if token not in self.postings:
+                continue
+            docs, freq, idf = self.postings[token]
+            normalizacao = BM25_K1 * (1 - BM25_B + BM25_B * self.tamanhos[docs] / self.tamanho_medio)
+            pontuacao[docs] += idf * freq * (BM25_K1 + 1) / (freq + normalizacao)
+        return pontuacao
+
+    def buscar(self, consulta, k=TOP_K_PADRAO, filtros=None):
+        """
+        Retorna os índices (linhas do catálogo) dos k carros mais relevantes para a consulta.
+        Os filtros estruturados (extraídos da consulta se não forem informados) restringem
+        os candidatos; se nenhum carro passar por eles, são descartados um a um.
+        Sem termos em comum com a consulta, os candidatos são ordenados pela proximidade
+        do preço ao orçamento (ou do mais barato para o mais caro).
+        """
+        filtros = dict(extrair_filtros(consulta) if filtros is None else filtros)
+        mascara = self.mascara_filtros(filtros)
+        for chave in ("zero_km", "autonomia_min", "tipo", "preco_min", "preco_max"):
+            if mascara.any():
+                break
+            filtros.pop(chave, None)
+            mascara = self.mascara_filtros(filtros)
+
+        candidatos = np.flatnonzero(mascara)
+        if len(candidatos) == 0:
+            return candidatos
+
+        texto = self.pontuar_texto(consulta)[candidatos]
+        alvo = filtros.get("preco_max", filtros.get("preco_min", 0.0))
+        distancia_preco = np.abs(self.valor[candidatos] - alvo) / max(alvo, 1.0)
+        # Desempate: relevância textual primeiro, depois a proximidade do preço.
+        ordem = np.lexsort((distancia_preco, -texto))
+        return candidatos[ordem[:k]]
+
+    def montar_contexto(self, indices, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO):
+        """Formata os carros recuperados sem ultrapassar o orçamento aproximado de tokens."""
+        blocos, usados = [], 0
+        for i in indices:
+            bloco = formatar_carro(self.catalogo.registro(int(i)))
+            custo = estimar_tokens(bloco)
+            if blocos and usados + custo > orcamento_tokens:
+                break
+            blocos.append(bloco)
+            usados += custo
+        return "".join(blocos)
+
+    def resumo(self):
+        """Resumo curto do estoque (modelos, tipos e faixa de preço) para o prompt de sistema."""
+        bases = self.catalogo["ModeloBase"]
+        linhas = []
+        for base in sorted({b for b in bases if b and b != "N/A"}):
+            mascara = (bases == base) & np.isfinite(self.valor)
+            if not mascara.any():
+                continue  # nenhuma versão com preço: não há faixa para mostrar
+            tipo = self.tipo[np.flatnonzero(mascara)[0]]
+            linhas.append(
+                f"- {base} ({tipo}): {int(mascara.sum())} versões, de "
+                f"{formatar_preco(self.valor[mascara].min())} a {formatar_preco(self.valor[mascara].max())}"
+            )
+        return "\n".join(linhas)
+
+def contexto_para_mensagem(indice, mensagem, k=TOP_K_PADRAO, orcamento_tokens=ORCAMENTO_TOKENS_PADRAO):
+    """Recupera os carros relevantes para a mensagem e monta o bloco de contexto."""
+    return indice.montar_contexto(indice.buscar(mensagem, k), orcamento_tokens)
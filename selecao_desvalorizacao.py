@@ -0,0 +1,363 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from catalogo import ARQUIVO_PADRAO, PASTA_CACHE, _pasta_cache, carregar_catalogo
+from desvalorizacao import (
+    FAMILIA_EXPONENCIAL,
+    FAMILIA_POLINOMIO,
+    GRAU_ENCOLHIDO,
+    TabelaDesvalorizacao,
+    carregar_tabela_desvalorizacao,
+)
+from instrumentacao import cronometrado
+
+# --- SELEÇÃO DO MODELO DE DESVALORIZAÇÃO POR CÓDIGO FIPE ---
+# O polinômio de grau 2 fixo, com poucos pontos, gera curvas que sobem ou ficam negativas
+# no horizonte da previsão. Aqui cada CodigoFipe escolhe entre várias famílias de curva
+# pelo erro de validação cruzada leave-one-out (LOO):
+#   - polinômios de grau 1, 2 e 3;
+#   - decaimento exponencial (reta em log(valor));
+#   - encolhimento: polinômio de grau 2 no valor relativo ao zero km, puxado (ridge) para a
+#     curva do grupo (ModeloBase; TipoVeiculo ou o catálogo todo quando o grupo é pequeno),
+#     ajustada sem o próprio código para não contaminar o LOO dele.
+# Todos os candidatos são mínimos quadrados lineares, então o LOO sai exato da matriz
+# chapéu (resíduo / (1 - h_ii)), sem reajustar n vezes, e todos os códigos de um bloco são
+# ajustados de uma vez em lote. Curvas que ficam negativas ou sobem nos próximos
+# HORIZONTE_VALIDACAO anos não são escolhidas. Blocos de códigos rodam em um pool de
+# processos e a escolha é salva ao lado do cache do catálogo (só se o erro LOO geral não
+# ficar pior que o do polinômio de grau 2); carregar_tabela_desvalorizacao a aplica sozinha
+# quando a versão do catálogo bate.
+
+CANDIDATOS = (
+    {"nome": "polinomio_1", "familia": "polinomio", "grau": 1},
+    {"nome": "polinomio_2", "familia": "polinomio", "grau": 2},
+    {"nome": "polinomio_3", "familia": "polinomio", "grau": 3},
+    {"nome": "exponencial", "familia": "exponencial", "grau": 1},
+    {"nome": "encolhimento_fraco", "familia": "encolhimento", "grau": 2, "penalidade": 0.1},
+    {"nome": "encolhimento_forte", "familia": "encolhimento", "grau": 2, "penalidade": 2.0},
+)
+CANDIDATO_PADRAO = 1       # polinomio_2, o modelo de sempre
+# Sem candidato bem-comportado com LOO definido (ex.: 2 pontos), fica o primeiro destes que
+# for bem-comportado; em último caso, o polinômio de sempre.
+RESERVAS = (3, 5, CANDIDATO_PADRAO)  # exponencial, encolhimento_forte, polinomio_2
+GRAU_MAXIMO = 3
+ESCALA_IDADE = 10.0        # idades em décadas no ajuste, para o grau 3 ficar bem condicionado
+HORIZONTE_VALIDACAO = 5    # anos em que a curva precisa ser positiva e não crescente
+TOLERANCIA_SUBIDA = 0.005  # subida anual tolerada (fração do valor zero km)
+MIN_CODIGOS_GRUPO = 1      # outros códigos (além do avaliado) para o grupo servir de referência
+MIN_PONTOS_GRUPO = 4       # pontos desses outros códigos
+CODIGOS_POR_BLOCO = 4096
+ARQUIVO_SELECAO = "selecao_desvalorizacao.npz"
+VERSAO_FORMATO = 1
+
+def _potencias(t, grau):
+    return t[..., None] ** np.arange(grau + 1)
+
+def ajustar_com_loo(Z, Y, mascara, penalidade=0.0):
+    """
+    Mínimos quadrados em lote, com penalidade ridge opcional: Z (G, L, P), Y e mascara (G, L).
+    Retorna (coeficientes (G, P), resíduos LOO (G, L)). O resíduo LOO é NaN fora da máscara
+    e onde h_ii = 1 (ponto que o ajuste interpola sozinho, ex.: menos pontos que coeficientes).
+    """
+    Zm = Z * mascara[..., None]
+    A = np.einsum("glp,glq->gpq", Zm, Z) + penalidade * np.eye(Z.shape[-1])
+    A_inv = np.linalg.pinv(A, rcond=1e-10)
+    coeficientes = np.einsum("gpq,gq->gp", A_inv, np.einsum("glp,gl->gp", Zm, Y))
+    h = np.einsum("glp,gpq,glq->gl", Z, A_inv, Z)
+    residuos = Y - np.einsum("glp,gp->gl", Z, coeficientes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loo = residuos / (1.0 - h)
+    loo[~mascara | (h > 1.0 - 1e-8)] = np.nan
+    return coeficientes, loo
+
+def _erro_quadratico(erros, mascara):
+    """Raiz do erro quadrático médio LOO por código; infinito se algum ponto não tem LOO."""
+    sem_loo = (mascara & ~np.isfinite(erros)).any(axis=1) | ~mascara.any(axis=1)
+    soma = np.where(mascara & np.isfinite(erros), erros, 0.0) ** 2
+    rmse = np.sqrt(soma.sum(axis=1) / np.maximum(mascara.sum(axis=1), 1))
+    return np.where(sem_loo, np.inf, rmse)
+
+def _para_idade(coeficientes):
+    """Coeficientes na base t = idade / ESCALA_IDADE -> base idade, com padding até GRAU_MAXIMO."""
+    saida = np.zeros(coeficientes.shape[:-1] + (GRAU_MAXIMO + 1,))
+    grau = coeficientes.shape[-1] - 1
+    saida[..., :grau + 1] = coeficientes / ESCALA_IDADE ** np.arange(grau + 1)
+    return saida
+
+def _padding(grupos_pontos, t, y, n_grupos):
+    """Pontos achatados (grupo de cada ponto, t, y) -> matrizes (grupos, largura) com máscara."""
+    contagem = np.bincount(grupos_pontos, minlength=n_grupos)
+    ordem = np.argsort(grupos_pontos, kind="stable")
+    grupos_pontos, t, y = grupos_pontos[ordem], t[ordem], y[ordem]
+    inicio = np.concatenate(([0], np.cumsum(contagem)[:-1]))
+    coluna = np.arange(len(grupos_pontos)) - inicio[grupos_pontos]
+    largura = max(int(contagem.max()) if len(contagem) else 0, 1)
+    T, Y = np.zeros((n_grupos, largura)), np.zeros((n_grupos, largura))
+    mascara = np.zeros((n_grupos, largura), dtype=bool)
+    T[grupos_pontos, coluna] = t
+    Y[grupos_pontos, coluna] = y
+    mascara[grupos_pontos, coluna] = True
+    return T, Y, mascara
+
+def _selecionar_bloco(tarefa):
+    """
+    Avalia todos os candidatos para um bloco de códigos. Retorna (escolhido, familia,
+    coeficientes na base idade (B, GRAU_MAXIMO + 1), erros LOO e admissíveis (B, candidatos)).
+    """
+    n = len(tarefa["valor_zero"])
+    T, Y, mascara = _padding(tarefa["grupo_ponto"], tarefa["t"], tarefa["y"], n)
+    valor_zero = tarefa["valor_zero"]
+    n_candidatos = len(CANDIDATOS)
+
+    erros = np.full((n, n_candidatos), np.inf)
+    coeficientes = np.zeros((n, n_candidatos, GRAU_MAXIMO + 1))
+    familias = np.zeros(n_candidatos, dtype=np.int8)
+    for k, candidato in enumerate(CANDIDATOS):
+        Z = _potencias(T, candidato["grau"])
+        if candidato["familia"] == "polinomio":
+            beta, loo = ajustar_com_loo(Z, Y, mascara)
+            erros_valor = loo
+        elif candidato["familia"] == "exponencial":
+            log_y = np.log(np.where(mascara, np.maximum(Y, 1.0), 1.0))
+            beta, loo = ajustar_com_loo(Z, log_y, mascara)
+            # Previsão LOO em log volta para reais antes de comparar com os outros candidatos.
+            erros_valor = Y - np.exp(log_y - loo)
+            familias[k] = FAMILIA_EXPONENCIAL
+        else:
+            # Ridge no desvio em relação à curva do grupo (valores relativos ao zero km).
+            relativo = Y / valor_zero[:, None]
+            curva_grupo = tarefa["curva_grupo"]
+            base = np.einsum("glp,gp->gl", Z, curva_grupo)
+            delta, loo = ajustar_com_loo(Z, relativo - base, mascara, candidato["penalidade"])
+            beta = (curva_grupo + delta) * valor_zero[:, None]
+            erros_valor = loo * valor_zero[:, None]
+            # Sem outro código de referência não há para onde encolher.
+            erros_valor[~tarefa["com_grupo"]] = np.nan
+        erros[:, k] = _erro_quadratico(erros_valor, mascara)
+        coeficientes[:, k] = _para_idade(beta)
+
+    # Curvas que ficam negativas ou sobem no horizonte de validação não são candidatas.
+    idades = np.arange(0, HORIZONTE_VALIDACAO + 1, dtype=np.float64)
+    previstos = np.einsum("gkp,ip->gki", coeficientes, _potencias(idades, GRAU_MAXIMO))
+    with np.errstate(over="ignore"):
+        previstos[:, familias == FAMILIA_EXPONENCIAL] = np.exp(previstos[:, familias == FAMILIA_EXPONENCIAL])
+    subida = np.diff(previstos, axis=2).max(axis=2)
+    admissivel = (previstos[:, :, 1:].min(axis=2) > 0) & (subida <= TOLERANCIA_SUBIDA * valor_zero[:, None])
+
+    pontuacao = np.where(admissivel, erros, np.inf)
+    escolhido = np.argmin(pontuacao, axis=1)
+    sem_escolha = ~np.isfinite(pontuacao.min(axis=1))
+    for reserva in reversed(RESERVAS):
+        usar = sem_escolha & (admissivel[:, reserva] | (reserva == CANDIDATO_PADRAO))
+        escolhido[usar] = reserva
+    linhas = np.arange(n)
+    return escolhido, familias[escolhido], coeficientes[linhas, escolhido], erros, admissivel
+
+def _curvas_de_grupo(tabela, posicoes, tipos):
+    """
+    Curva de grau 2 (base t, valor relativo ao zero km) de cada código, ajustada só com os
+    OUTROS códigos do grupo (deixa o código de fora), para os pontos do próprio código não
+    entrarem no LOO dele. Grupo: o ModeloBase ou, se tiver poucos códigos/pontos além do
+    código, o TipoVeiculo; em último caso, o catálogo todo. Retorna (curvas, definida):
+    códigos sem nenhum outro código de referência ficam com definida = False.
+    """
+    grau = CANDIDATOS[-1]["grau"]
+    n_pontos = tabela.offsets[posicoes + 1] - tabela.offsets[posicoes]
+    pontos = np.concatenate([np.arange(tabela.offsets[p], tabela.offsets[p + 1]) for p in posicoes]) \
+        if len(posicoes) else np.empty(0, dtype=np.int64)
+    codigo_ponto = np.repeat(np.arange(len(posicoes)), n_pontos)
+    t = tabela.hist_idade[pontos] / ESCALA_IDADE
+    relativo = tabela.hist_valor[pontos] / tabela.valor_zero[posicoes][codigo_ponto]
+
+    # Equações normais de cada código; as do grupo sem o código saem por subtração.
+    Z = _potencias(t, grau)
+    A_codigo = np.zeros((len(posicoes), grau + 1, grau + 1))
+    b_codigo = np.zeros((len(posicoes), grau + 1))
+    np.add.at(A_codigo, codigo_ponto, Z[:, :, None] * Z[:, None, :])
+    np.add.at(b_codigo, codigo_ponto, Z * relativo[:, None])
+
+    curvas = np.zeros((len(posicoes), grau + 1))
+    definida = np.zeros(len(posicoes), dtype=bool)
+    bases = [tabela.modelos_base[p] or "" for p in posicoes]
+    for rotulos in (bases, tipos, [""] * len(posicoes)):
+        nomes, grupo = np.unique(np.asarray(rotulos, dtype=object).astype(str), return_inverse=True)
+        A_grupo = np.zeros((len(nomes), grau + 1, grau + 1))
+        b_grupo = np.zeros((len(nomes), grau + 1))
+        np.add.at(A_grupo, grupo, A_codigo)
+        np.add.at(b_grupo, grupo, b_codigo)
+        outros_codigos = np.bincount(grupo, minlength=len(nomes))[grupo] - 1
+        outros_pontos = np.bincount(grupo, weights=n_pontos, minlength=len(nomes))[grupo] - n_pontos
+        usar = ~definida & (outros_codigos >= MIN_CODIGOS_GRUPO) & (outros_pontos >= MIN_PONTOS_GRUPO)
+        A_fora = A_grupo[grupo[usar]] - A_codigo[usar]
+        b_fora = b_grupo[grupo[usar]] - b_codigo[usar]
+        curvas[usar] = np.einsum("gpq,gq->gp", np.linalg.pinv(A_fora, rcond=1e-10), b_fora)
+        definida |= usar
+    return curvas, definida
+
+@cronometrado("desvalorizacao.selecao")
+def selecionar_modelos(tabela, catalogo=None, processos=1):
+    """
+    Escolhe o candidato de menor erro LOO (entre os bem-comportados) para cada código válido
+    da tabela. Retorna um dict com codigos, escolhido (índice em CANDIDATOS), familia,
+    coeficientes (base idade), erros_loo e admissivel (códigos, candidatos).
+    """
+    posicoes = np.flatnonzero(tabela.validos)
+    tipos = [""] * len(posicoes)
+    if catalogo is not None:
+        # TipoVeiculo da primeira linha de cada código no catálogo.
+        codigos_catalogo = np.asarray(catalogo.codigos("CodigoFipe"))
+        presentes, primeira = np.unique(codigos_catalogo, return_index=True)
+        categorias_codigo = catalogo.categorias("CodigoFipe")
+        textos_tipo = catalogo["TipoVeiculo"]
+        tipo_por_codigo = {categorias_codigo[c]: textos_tipo[i] for c, i in zip(presentes, primeira) if c >= 0}
+        tipos = [tipo_por_codigo.get(tabela.codigos[p]) or "" for p in posicoes]
+    curvas, com_grupo = _curvas_de_grupo(tabela, posicoes, tipos)
+
+    blocos = [np.arange(i, min(i + CODIGOS_POR_BLOCO, len(posicoes))) for i in range(0, len(posicoes), CODIGOS_POR_BLOCO)]
+
+    def tarefa(bloco):
+        pos = posicoes[bloco]
+        n_pontos = tabela.offsets[pos + 1] - tabela.offsets[pos]
+        pontos = np.concatenate([np.arange(tabela.offsets[p], tabela.offsets[p + 1]) for p in pos])
+        return {
+            "grupo_ponto": np.repeat(np.arange(len(pos)), n_pontos),
+            "t": tabela.hist_idade[pontos] / ESCALA_IDADE,
+            "y": tabela.hist_valor[pontos].astype(np.float64),
+            "valor_zero": tabela.valor_zero[pos].astype(np.float64),
+            "curva_grupo": curvas[bloco],
+            "com_grupo": com_grupo[bloco],
+        }
+
+    tarefas = [tarefa(b) for b in blocos]
+    processos = processos or os.cpu_count() or 1
+    if processos == 1 or len(tarefas) <= 1:
+        resultados = [_selecionar_bloco(t) for t in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(tarefas))) as pool:
+            resultados = list(pool.map(_selecionar_bloco, tarefas))
+
+    vazio = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8), np.empty((0, GRAU_MAXIMO + 1)),
+             np.empty((0, len(CANDIDATOS))), np.empty((0, len(CANDIDATOS)), dtype=bool))
+    escolhido, familia, coeficientes, erros, admissivel = (np.concatenate(partes) for partes in zip(vazio, *resultados))
+    return {
+        "codigos": [tabela.codigos[p] for p in posicoes],
+        "escolhido": escolhido,
+        "familia": familia,
+        "coeficientes": coeficientes,
+        "erros_loo": erros,
+        "admissivel": admissivel,
+    }
+
+def comparar_com_padrao(selecao):
+    """
+    Erro LOO (raiz do erro quadrático médio sobre os códigos) do polinômio de grau 2 e das
+    curvas escolhidas, nos códigos em que os dois têm LOO definido. Retorna (n, padrão, escolhido).
+    """
+    erros = selecao["erros_loo"]
+    escolhido = erros[np.arange(len(erros)), selecao["escolhido"]]
+    comparaveis = np.isfinite(erros[:, CANDIDATO_PADRAO]) & np.isfinite(escolhido)
+    if not comparaveis.any():
+        return 0, np.nan, np.nan
+    padrao = np.sqrt(np.mean(erros[comparaveis, CANDIDATO_PADRAO] ** 2))
+    return int(comparaveis.sum()), padrao, np.sqrt(np.mean(escolhido[comparaveis] ** 2))
+
+# --- PERSISTÊNCIA ---
+
+def caminho_selecao(arquivo_json=ARQUIVO_PADRAO):
+    """Ao lado do cache do catálogo (ou dentro da pasta colunar)."""
+    if os.path.isdir(arquivo_json):
+        return os.path.join(arquivo_json, ARQUIVO_SELECAO)
+    return os.path.join(_pasta_cache(arquivo_json), ARQUIVO_SELECAO)
+
+def salvar_selecao(caminho, selecao, versao_catalogo, ano_atual):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        np.savez(
+            f, versao_formato=VERSAO_FORMATO, versao_catalogo=versao_catalogo, ano_atual=ano_atual,
+            candidatos=np.array([c["nome"] for c in CANDIDATOS]), codigos=np.array(selecao["codigos"]),
+            escolhido=selecao["escolhido"], familia=selecao["familia"], coeficientes=selecao["coeficientes"],
+            erros_loo=selecao["erros_loo"], admissivel=selecao["admissivel"],
+        )
+    os.replace(temporario, caminho)
+    return caminho
+
+def carregar_selecao(caminho, versao_catalogo=None, ano_atual=None):
+    """Seleção salva, ou None se não existir ou for de outra versão do catálogo / outro ano."""
+    try:
+        with np.load(caminho) as dados:
+            selecao = {nome: dados[nome] for nome in dados.files}
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+    if int(selecao["versao_formato"]) != VERSAO_FORMATO:
+        return None
+    if versao_catalogo is not None and str(selecao["versao_catalogo"]) != versao_catalogo:
+        return None
+    if ano_atual is not None and int(selecao["ano_atual"]) != ano_atual:
+        return None
+    selecao["codigos"] = selecao["codigos"].tolist()
+    return selecao
+
+def aplicar_selecao(tabela, selecao):
+    """Nova tabela em que cada código selecionado usa a curva escolhida (os demais mantêm o polinômio)."""
+    coeficientes = np.zeros((len(tabela), max(GRAU_MAXIMO + 1, tabela.coeficientes.shape[1])))
+    coeficientes[:, :tabela.coeficientes.shape[1]] = tabela.coeficientes
+    familias = tabela.familias.copy()
+    graus = tabela.graus.copy()
+    graus_candidatos = np.array([GRAU_ENCOLHIDO if c["familia"] == "encolhimento" else c["grau"] for c in CANDIDATOS])
+    posicoes = np.array([tabela.posicao(c) for c in selecao["codigos"]], dtype=np.int64)
+    encontrados = posicoes >= 0
+    coeficientes[posicoes[encontrados], :GRAU_MAXIMO + 1] = selecao["coeficientes"][encontrados]
+    familias[posicoes[encontrados]] = selecao["familia"][encontrados]
+    graus[posicoes[encontrados]] = graus_candidatos[selecao["escolhido"][encontrados]]
+    return TabelaDesvalorizacao(
+        tabela.codigos, tabela.modelos_base, coeficientes, tabela.valor_zero, tabela.n_linhas_historico,
+        tabela.n_pontos, tabela.offsets, tabela.hist_ano, tabela.hist_idade, tabela.hist_valor,
+        ano_atual=tabela.ano_atual, familias=familias, graus=graus,
+    )
+
+def aplicar_selecao_salva(tabela, arquivo_json, versao_catalogo):
+    """Aplica a seleção salva para este catálogo, se houver; senão devolve a própria tabela."""
+    selecao = carregar_selecao(caminho_selecao(arquivo_json), versao_catalogo, tabela.ano_atual)
+    return tabela if selecao is None else aplicar_selecao(tabela, selecao)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seleciona a curva de desvalorização de cada código FIPE por LOO.")
+    parser.add_argument("--arquivo", default=ARQUIVO_PADRAO)
+    parser.add_argument("--processos", type=int, default=None, help="número de processos (padrão: núcleos da CPU)")
+    parser.add_argument("--saida", help=f"arquivo da seleção (padrão: {PASTA_CACHE}/<dataset>/{ARQUIVO_SELECAO})")
+    parser.add_argument("--forcar", action="store_true",
+                        help="salva mesmo se o erro LOO geral ficar pior que o do polinômio de grau 2")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    catalogo = carregar_catalogo(args.arquivo)
+    tabela = carregar_tabela_desvalorizacao(args.arquivo, usar_selecao=False)
+    selecao = selecionar_modelos(tabela, catalogo, args.processos)
+    print(f"{len(selecao['codigos'])} códigos avaliados em {time.perf_counter() - inicio:.2f} s.")
+
+    contagem = np.bincount(selecao["escolhido"], minlength=len(CANDIDATOS))
+    for candidato, n in zip(CANDIDATOS, contagem):
+        print(f"  {candidato['nome']:<20} {n:>6} códigos")
+    rejeitados = ~selecao["admissivel"][:, CANDIDATO_PADRAO]
+    print(f"Polinômio de grau 2 negativo ou subindo em {HORIZONTE_VALIDACAO} anos: {rejeitados.sum()} códigos.")
+    n, erro_padrao, erro_escolhido = comparar_com_padrao(selecao)
+    if n:
+        print(f"Erro LOO: R$ {erro_padrao:,.2f} (polinômio grau 2) -> R$ {erro_escolhido:,.2f} (escolhido), "
+              f"em {n} códigos com LOO definido nos dois.")
+
+    caminho = args.saida or caminho_selecao(args.arquivo)
+    if n and erro_escolhido > erro_padrao and not args.forcar:
+        # Uma seleção que erra mais que o modelo de sempre não deve ser aplicada (nem a antiga).
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        print("Seleção NÃO salva: erro LOO geral pior que o do polinômio de grau 2 (use --forcar para salvar).")
+    else:
+        salvar_selecao(caminho, selecao, catalogo.versao, tabela.ano_atual)
+        print(f"Seleção salva em '{caminho}'.")
+        if args.saida:
+            print("Aviso: só a seleção no caminho padrão é aplicada automaticamente por carregar_tabela_desvalorizacao.")
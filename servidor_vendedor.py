@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from assistente_carro_rag import (
+    carregar_indice_estoque,
+    criar_cache_respostas,
+    criar_gerenciador_historico,
+    criar_modelo,
+    montar_instrucoes_sistema,
+    montar_mensagem_com_estoque,
+    recuperar_estoque,
+    responder_sem_streaming,
+)
+from cache_respostas import cacheavel
+from chamadas_modelo import CHAMADAS_POR_SEGUNDO, MAX_SIMULTANEAS, ClienteModelo, ErroChamadaModelo
+from instrumentacao import REGISTRO, contar, registrar_duracao
+
+# --- 1. CONFIGURAÇÕES DO SERVIDOR ---
+
+HOST_PADRAO = "0.0.0.0"
+PORTA_PADRAO = 8080
+TEMPO_MAXIMO_SESSAO_INATIVA = 30 * 60  # segundos
+TAMANHO_MAXIMO_CORPO = 64 * 1024  # bytes
+MENSAGEM_BOAS_VINDAS = "O cliente entrou na loja. Cumprimente-o."
+
+# --- 2. BACKENDS DE MODELO ---
+# Um backend é qualquer função que recebe as instruções de sistema e devolve um
+# objeto com start_chat(history=[]) cujo chat tem send_message(texto).text
+# (chamadas de ferramenta, se houver, são resolvidas por responder_sem_streaming).
+
+def _backend_gemini(instrucoes_sistema, **opcoes):
+    modelo = criar_modelo(False, instrucoes_sistema, verbose=False)
+    if modelo is None:
+        raise RuntimeError("API key do Google não configurada (api_key.py).")
+    return modelo
+
+def _backend_local(instrucoes_sistema, **opcoes):
+    from modelo_local import ModeloLocal
+    return ModeloLocal(system_instruction=instrucoes_sistema, **opcoes)
+
+BACKENDS = {
+    "gemini": _backend_gemini,
+    "local": _backend_local,
+}
+
+def criar_backend(nome, instrucoes_sistema, **opcoes):
+    try:
+        fabrica = BACKENDS[nome]
+    except KeyError:
+        raise ValueError(f"Backend desconhecido: '{nome}'. Opções: {', '.join(BACKENDS)}") from None
+    return fabrica(instrucoes_sistema, **opcoes)
+
+# --- 3. SESSÕES ---
+
+class Sessao:
+    def __init__(self, historico):
+        self.id = uuid.uuid4().hex
+        self.historico = historico  # GerenciadorHistorico: turnos recentes + resumo do cliente
+        self.lock = asyncio.Lock()  # um turno por vez em cada sessão
+        self.mensagem_anterior = ""
+        self.turnos = 0
+        self.ultimo_uso = time.monotonic()
+
+class ServidorVendedor:
+    """
+    Hospeda várias conversas simultâneas da VendedorAI em um único processo.
+    Catálogo, índice de recuperação, instruções de sistema e modelo são carregados
+    uma vez e compartilhados; cada sessão tem só o próprio histórico compactado.
+    As chamadas ao modelo (bloqueantes no SDK) rodam em um pool de threads e passam
+    pelo `cliente` (limite de taxa, de concorrência e retentativas); mensagens iguais
+    simultâneas em conversas com o mesmo histórico viram uma única chamada.
+    """
+
+    def __init__(self, modelo, max_threads=64, tempo_maximo_inativa=TEMPO_MAXIMO_SESSAO_INATIVA, cache=None,
+                 cliente=None):
+        self.modelo = modelo
+        self.cache = cache
+        self.cliente = cliente or ClienteModelo()
+        self.sessoes = {}
+        self.tempo_maximo_inativa = tempo_maximo_inativa
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="vendedorai")
+
+    async def _chamar_modelo(self, sessao, mensagem, chave_cache=None):
+        if self.cache is not None and chave_cache is not None:
+            resposta = self.cache.obter(chave_cache)
+            contar("assistente.cache_respostas", resultado="falha" if resposta is None else "acerto")
+            if resposta is not None:
+                return resposta
+
+        chat = self.modelo.start_chat(history=sessao.historico.historico())
+        # Só coalesce quem manda exatamente o mesmo conteúdo sobre o mesmo histórico; a chave
+        # não depende do cache, para uma sessão nunca receber a resposta do chat de outra.
+        chave_coalescer = (sessao.historico.assinatura(), mensagem)
+        loop = asyncio.get_running_loop()
+        resposta = await loop.run_in_executor(
+            self._executor, self.cliente.coalescer, chave_coalescer, responder_sem_streaming, chat, mensagem,
+            self.cliente,
+        )
+        if self.cache is not None and chave_cache is not None:
+            self.cache.guardar(chave_cache, resposta)
+        return resposta
+
+    def _chave_cache(self, sessao, mensagem, indices=()):
+        if self.cache is None:
+            return None
+        if not cacheavel(mensagem):
+            return None
+        # O que muda a resposta: estoque recuperado e o que se sabe do cliente (nome, uso, orçamento...).
+        estado = {"estoque": [int(i) for i in indices], "perfil": sessao.historico.perfil.estado()}
+        return self.cache.chave(mensagem, estado)
+
+    async def criar_sessao(self, cumprimentar=True):
+        sessao = Sessao(criar_gerenciador_historico())
+        self.sessoes[sessao.id] = sessao
+        resposta = None
+        if cumprimentar:
+            async with sessao.lock:
+                try:
+                    resposta = await self._chamar_modelo(
+                        sessao, MENSAGEM_BOAS_VINDAS, self._chave_cache(sessao, MENSAGEM_BOAS_VINDAS)
+                    )
+                except ErroChamadaModelo:
+                    # Sem cumprimento a sessão continua útil; o quiosque já pode mandar mensagens.
+                    contar("servidor.cumprimento_sem_resposta")
+                else:
+                    sessao.historico.registrar_turno(MENSAGEM_BOAS_VINDAS, resposta)
+        return sessao.id, resposta
+
+    async def enviar(self, id_sessao, mensagem):
+        sessao = self.sessoes.get(id_sessao)
+        if sessao is None:
+            raise KeyError(id_sessao)
+        async with sessao.lock:
+            sessao.ultimo_uso = time.monotonic()
+            indices = recuperar_estoque(mensagem, sessao.mensagem_anterior)
+            conteudo = montar_mensagem_com_estoque(mensagem, sessao.mensagem_anterior, indices)
+            resposta = await self._chamar_modelo(sessao, conteudo, self._chave_cache(sessao, mensagem, indices))
+            sessao.historico.registrar_turno(mensagem, resposta)
+            sessao.mensagem_anterior = mensagem
+            sessao.turnos += 1
+            sessao.ultimo_uso = time.monotonic()
+        return resposta
+
+    def encerrar(self, id_sessao):
+        return self.sessoes.pop(id_sessao, None) is not None
+
+    def remover_inativas(self):
+        limite = time.monotonic() - self.tempo_maximo_inativa
+        inativas = [i for i, s in self.sessoes.items() if s.ultimo_uso < limite and not s.lock.locked()]
+        for id_sessao in inativas:
+            del self.sessoes[id_sessao]
+        return len(inativas)
+
+    async def _limpeza_periodica(self):
+        while True:
+            await asyncio.sleep(60)
+            self.remover_inativas()
+
+    # --- 4. HTTP ---
+    # POST   /sessoes                     -> {"sessao": id, "resposta": cumprimento}
+    # POST   /sessoes/<id>/mensagens      {"mensagem": "..."} -> {"resposta": "...", "latencia_s": x}
+    # DELETE /sessoes/<id>
+    # GET    /saude                       -> {"sessoes": n, "cache": {...}}
+    # GET    /metricas                    -> texto no formato do Prometheus (instrumentacao.py)
+
+    async def _rotear(self, metodo, caminho, corpo):
+        partes = [p for p in caminho.split("?")[0].split("/") if p]
+
+        if metodo == "GET" and partes == ["saude"]:
+            saude = {"status": "ok", "sessoes": len(self.sessoes)}
+            if self.cache is not None:
+                saude["cache"] = self.cache.estatisticas()
+            return 200, saude
+
+        if metodo == "GET" and partes == ["metricas"]:
+            return 200, REGISTRO.texto_prometheus()
+
+        if metodo == "POST" and partes == ["sessoes"]:
+            id_sessao, resposta = await self.criar_sessao(cumprimentar=corpo.get("cumprimentar", True))
+            return 201, {"sessao": id_sessao, "resposta": resposta}
+
+        if len(partes) == 3 and partes[0] == "sessoes" and partes[2] == "mensagens" and metodo == "POST":
+            mensagem = corpo.get("mensagem")
+            if not isinstance(mensagem, str) or not mensagem.strip():
+                return 400, {"erro": "Campo 'mensagem' obrigatório."}
+            inicio = time.perf_counter()
+            try:
+                resposta = await self.enviar(partes[1], mensagem)
+            except KeyError:
+                return 404, {"erro": "Sessão não encontrada."}
+            except ErroChamadaModelo as e:
+                # O histórico da sessão não muda: o quiosque pode reenviar a mesma mensagem.
+                return _resposta_erro_modelo(e)
+            latencia = time.perf_counter() - inicio
+            registrar_duracao("servidor.mensagem", latencia)
+            return 200, {"resposta": resposta, "latencia_s": round(latencia, 4)}
+
+        if len(partes) == 2 and partes[0] == "sessoes" and metodo == "DELETE":
+            if self.encerrar(partes[1]):
+                return 200, {"encerrada": partes[1]}
+            return 404, {"erro": "Sessão não encontrada."}
+
+        return 404, {"erro": "Rota não encontrada."}
+
+    async def _atender(self, reader, writer):
+        try:
+            linha = await reader.readline()
+            if not linha:
+                writer.close()
+                return
+            metodo, caminho, _ = linha.decode("latin-1").split(" ", 2)
+            cabecalhos = {}
+            while True:
+                linha = await reader.readline()
+                if linha in (b"\r\n", b"\n", b""):
+                    break
+                chave, _, valor = linha.decode("latin-1").partition(":")
+                cabecalhos[chave.strip().lower()] = valor.strip()
+
+            tamanho = int(cabecalhos.get("content-length", 0))
+            if tamanho > TAMANHO_MAXIMO_CORPO:
+                status, resposta = 413, {"erro": "Corpo da requisição muito grande."}
+            else:
+                dados = await reader.readexactly(tamanho) if tamanho else b""
+                try:
+                    corpo = json.loads(dados) if dados else {}
+                except json.JSONDecodeError:
+                    corpo = None
+                if not isinstance(corpo, dict):
+                    status, resposta = 400, {"erro": "JSON inválido."}
+                else:
+                    try:
+                        status, resposta = await self._rotear(metodo.upper(), caminho, corpo)
+                    except Exception as e:
+                        status, resposta = 502, {"erro": f"Falha ao consultar o modelo: {e}"}
+        except (ValueError, asyncio.IncompleteReadError):
+            status, resposta = 400, {"erro": "Requisição HTTP inválida."}
+
+        # Rotas de texto (ex.: /metricas) devolvem str; as demais, JSON.
+        if isinstance(resposta, str):
+            corpo_resposta, tipo = resposta.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            corpo_resposta, tipo = json.dumps(resposta, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(corpo_resposta)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + corpo_resposta
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def servir(self, host=HOST_PADRAO, porta=PORTA_PADRAO):
+        servidor = await asyncio.start_server(self._atender, host, porta)
+        limpeza = asyncio.create_task(self._limpeza_periodica())
+        enderecos = ", ".join(str(s.getsockname()) for s in servidor.sockets)
+        print(f"VendedorAI servindo em {enderecos}")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            limpeza.cancel()
+            self._executor.shutdown(wait=False)
+
+def _resposta_erro_modelo(erro):
+    """Status HTTP de uma falha do modelo: 429 (cota), 503 (transitória) ou 422 (mensagem recusada)."""
+    if erro.tipo == "cota":
+        corpo = {"erro": "Limite de uso do modelo atingido. Tente novamente em instantes."}
+        if erro.espera_sugerida:
+            corpo["tentar_novamente_s"] = round(erro.espera_sugerida, 1)
+        return 429, corpo
+    if erro.repetivel:
+        return 503, {"erro": "Modelo indisponível no momento. Tente novamente."}
+    return 422, {"erro": f"O modelo não aceitou a mensagem: {erro.causa}"}
+
+def criar_servidor(backend="local", usar_cache=True, cache_disco=None, chamadas_por_segundo=CHAMADAS_POR_SEGUNDO,
+                   max_simultaneas=MAX_SIMULTANEAS, **opcoes_backend):
+    """Carrega catálogo, índice e instruções de sistema uma única vez e cria o servidor."""
+    carregar_indice_estoque()
+    instrucoes_sistema = montar_instrucoes_sistema()
+    cache = criar_cache_respostas(cache_disco) if usar_cache else None
+    cliente = ClienteModelo(chamadas_por_segundo=chamadas_por_segundo, max_simultaneas=max_simultaneas)
+    return ServidorVendedor(criar_backend(backend, instrucoes_sistema, **opcoes_backend), cache=cache, cliente=cliente)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor HTTP multi-sessão da VendedorAI.")
+    parser.add_argument("--host", default=HOST_PADRAO)
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="gemini")
+    parser.add_argument("--atraso-local", type=float, default=0.3,
+                        help="atraso (s) até o primeiro chunk no backend local, para testes de carga")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="backend local: fração de chamadas que respondem 429")
+    parser.add_argument("--taxa-timeout", type=float, default=0.0, help="backend local: fração de chamadas que dão timeout")
+    parser.add_argument("--chamadas-por-segundo", type=float, default=CHAMADAS_POR_SEGUNDO,
+                        help="limite de chamadas ao modelo por segundo (balde de tokens)")
+    parser.add_argument("--max-simultaneas", type=int, default=MAX_SIMULTANEAS,
+                        help="máximo de chamadas ao modelo em andamento")
+    parser.add_argument("--sem-cache", action="store_true", help="desativa o cache de respostas")
+    parser.add_argument("--cache-disco", metavar="ARQUIVO", help="persiste o cache de respostas em um arquivo SQLite")
+    args = parser.parse_args()
+
+    opcoes = {}
+    if args.backend == "local":
+        opcoes = {"atraso_primeiro_chunk": args.atraso_local, "taxa_cota": args.taxa_429, "taxa_timeout": args.taxa_timeout}
+    servidor = criar_servidor(args.backend, not args.sem_cache, args.cache_disco, args.chamadas_por_segundo,
+                              args.max_simultaneas, **opcoes)
+    asyncio.run(servidor.servir(args.host, args.porta))
@@ -0,0 +1,163 @@
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+import chamadas_modelo
+from chamadas_modelo import BaldeTokens, ClienteModelo, ErroChamadaModelo, calcular_espera, classificar_erro
+from modelo_local import ErroCotaLocal, ErroEntradaLocal, ModeloLocal
+
+# Cliente rápido: sem espera real de limite de taxa nem de backoff.
+def _cliente(**opcoes):
+    padrao = dict(chamadas_por_segundo=1000, rajada=1000, espera_base=0.001, espera_maxima=0.01, semente=0)
+    return ClienteModelo(**{**padrao, **opcoes})
+
+class ErroServidor(Exception):
+    code = 503
+
+@pytest.fixture(autouse=True)
+def pausa_curta(monkeypatch):
+    monkeypatch.setattr(chamadas_modelo, "PAUSA_COTA", 0.001)
+
+def _chat(**opcoes):
+    return ModeloLocal(atraso_primeiro_chunk=0, atraso_chunk=0, tempo_timeout=0, **opcoes)
+
+# --- Classificação e retentativas ---
+
+def test_classificar_erro():
+    assert classificar_erro(ErroCotaLocal("429")) == "cota"
+    assert classificar_erro(TimeoutError()) == "transitorio"
+    assert classificar_erro(ErroServidor()) == "transitorio"
+    assert classificar_erro(ErroEntradaLocal("400")) == "entrada"
+    assert classificar_erro(RuntimeError()) == "desconhecido"
+
+@pytest.mark.parametrize("falha", ["cota", "timeout"])
+def test_cota_e_timeout_sao_repetidos(falha):
+    modelo = _chat(falhas=[falha, falha])
+    resposta = _cliente().chamar(modelo.start_chat().send_message, "oi")
+    assert resposta.text
+    assert modelo.chamadas == 3
+    assert modelo.falhas_injetadas[falha] == 2
+
+def test_5xx_e_repetido():
+    tentativas = []
+
+    def instavel():
+        tentativas.append(1)
+        if len(tentativas) < 3:
+            raise ErroServidor("503 Service Unavailable")
+        return "ok"
+
+    assert _cliente().chamar(instavel) == "ok"
+    assert len(tentativas) == 3
+
+def test_4xx_nao_e_repetido():
+    modelo = _chat(falhas=["entrada"])
+    with pytest.raises(ErroChamadaModelo) as erro:
+        _cliente().chamar(modelo.start_chat().send_message, "oi")
+    assert erro.value.tipo == "entrada"
+    assert not erro.value.repetivel
+    assert erro.value.tentativas == 1
+    assert modelo.chamadas == 1
+
+def test_desiste_apos_max_tentativas():
+    modelo = _chat(falhas=["cota"] * 10)
+    with pytest.raises(ErroChamadaModelo) as erro:
+        _cliente(max_tentativas=3).chamar(modelo.start_chat().send_message, "oi")
+    assert erro.value.tipo == "cota"
+    assert erro.value.tentativas == 3
+    assert erro.value.espera_sugerida is not None
+    assert modelo.chamadas == 3
+
+# --- Espera exponencial ---
+
+def test_espera_dentro_dos_limites():
+    rng = random.Random(0)
+    for tentativa in range(10):
+        teto = min(2.0, 0.5 * 2 ** tentativa)
+        esperas = [calcular_espera(tentativa, base=0.5, maximo=2.0, rng=rng) for _ in range(200)]
+        assert min(esperas) >= 0.0
+        assert max(esperas) <= teto
+
+def test_espera_usa_o_teto_exponencial():
+    class RngMaximo:
+        def uniform(self, a, b):
+            return b
+
+    assert [calcular_espera(t, base=0.5, maximo=3.0, rng=RngMaximo()) for t in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+def test_balde_respeita_taxa():
+    balde = BaldeTokens(taxa=10, capacidade=2)
+    inicio = time.monotonic()
+    for _ in range(7):
+        balde.adquirir()
+    # 2 fichas da rajada + 5 a 10/s
+    assert time.monotonic() - inicio >= 0.45
+
+# --- Coalescência ---
+
+def test_pedidos_iguais_simultaneos_viram_uma_chamada():
+    cliente = _cliente()
+    chamadas = []
+    barreira = threading.Barrier(8)
+    resultados = []
+
+    def lento():
+        chamadas.append(1)
+        time.sleep(0.2)
+        return "resposta"
+
+    def pedir():
+        barreira.wait()
+        resultados.append(cliente.coalescer("mesma chave", lento))
+
+    threads = [threading.Thread(target=pedir) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(chamadas) == 1
+    assert resultados == ["resposta"] * 8
+
+def test_erro_do_lider_chega_a_todos():
+    cliente = _cliente()
+    barreira = threading.Barrier(4)
+    erros = []
+
+    def falha():
+        time.sleep(0.2)
+        raise ValueError("falhou")
+
+    def pedir():
+        barreira.wait()
+        try:
+            cliente.coalescer("chave", falha)
+        except ValueError as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=pedir) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(erros) == 4
+
+def test_servidor_nao_junta_historicos_diferentes():
+    from servidor_vendedor import ServidorVendedor
+
+    modelo = ModeloLocal(atraso_primeiro_chunk=0.3, atraso_chunk=0)
+    servidor = ServidorVendedor(modelo, cache=None, cliente=_cliente())
+
+    async def cenario():
+        ids = [(await servidor.criar_sessao(cumprimentar=False))[0] for _ in range(3)]
+        await servidor.enviar(ids[0], "Meu nome é Ana")
+        antes = modelo.chamadas
+        respostas = await asyncio.gather(*(servidor.enviar(i, "quanto custa o dolphin?") for i in ids))
+        return modelo.chamadas - antes, respostas
+
+    chamadas, respostas = asyncio.run(cenario())
+    # As duas sessões sem histórico dividem uma chamada; a da Ana tem a própria.
+    assert chamadas == 2
+    assert all(respostas)
@@ -0,0 +1,58 @@
+import pytest
+
+import ferramentas_vendedor
+from ferramentas_vendedor import executar_ferramenta
+
+USO = {"km_por_dia": 40, "modelo": "Dolphin"}
+
+def test_economia_anual_valida():
+    resultado = executar_ferramenta("calcular_economia_anual", USO)
+    assert "erro" not in resultado
+    assert resultado["km_por_ano"] == 40 * ferramentas_vendedor.DIAS_POR_ANO
+    assert resultado["economia_combustivel_anual"] > 0
+    assert resultado["custo_anual_byd"] == pytest.approx(
+        resultado["custo_anual_gasolina"] - resultado["economia_combustivel_anual"], abs=0.02
+    )
+
+def test_balanco_3_anos_valido():
+    resultado = executar_ferramenta("calcular_balanco_3_anos", USO)
+    assert "erro" not in resultado
+    assert resultado["economia_bruta_3_anos"] > 0
+
+def test_buscar_estoque():
+    resultado = executar_ferramenta("buscar_estoque", {"modelo": "Dolphin", "limite": 2})
+    assert 1 <= len(resultado["carros"]) <= 2
+    assert resultado["total_encontrado"] >= len(resultado["carros"])
+
+@pytest.mark.parametrize("ferramenta", ["calcular_economia_anual", "calcular_balanco_3_anos"])
+@pytest.mark.parametrize("argumento, valor", [
+    ("consumo_carro_atual_km_por_litro", 0),
+    ("consumo_carro_atual_km_por_litro", -8),
+    ("preco_gasolina_litro", 0),
+    ("preco_gasolina_litro", -5.5),
+    ("km_por_dia", -10),
+])
+def test_argumentos_fora_da_faixa_viram_erro(ferramenta, argumento, valor):
+    resultado = executar_ferramenta(ferramenta, {**USO, argumento: valor})
+    assert set(resultado) == {"erro"}
+    assert argumento in resultado["erro"]
+
+def test_modelo_desconhecido():
+    resultado = executar_ferramenta("calcular_economia_anual", {"km_por_dia": 40, "modelo": "Fusca"})
+    assert "não encontrado" in resultado["erro"]
+
+def test_ferramenta_desconhecida():
+    assert executar_ferramenta("apagar_estoque", {}) == {"erro": "Ferramenta desconhecida: apagar_estoque"}
+
+def test_argumentos_inesperados_viram_erro():
+    resultado = executar_ferramenta("calcular_economia_anual", {"km_por_dia": 40})
+    assert resultado["erro"].startswith("Argumentos inválidos para calcular_economia_anual")
+
+@pytest.mark.parametrize("excecao", [ValueError("valor ruim"), ZeroDivisionError("divisão por zero")])
+def test_erros_de_valor_e_aritmetica_viram_erro(monkeypatch, excecao):
+    def quebrada(**kwargs):
+        raise excecao
+
+    monkeypatch.setitem(ferramentas_vendedor._POR_NOME, "quebrada", quebrada)
+    resultado = executar_ferramenta("quebrada", {})
+    assert resultado == {"erro": f"Argumentos inválidos para quebrada: {excecao}"}
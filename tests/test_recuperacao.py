@@ -0,0 +1,25 @@
+import json
+
+from catalogo import carregar_catalogo
+from recuperacao import IndiceEstoque
+
+def _carro(modelo_base, valor, codigo):
+    return {
+        "TipoVeiculo": "eletrico", "Valor": valor, "Marca": "BYD", "Modelo": f"{modelo_base} EV (Elétrico)",
+        "AnoModelo": 2024, "Combustivel": "Elétrico", "CodigoFipe": codigo, "MesReferencia": "outubro de 2025",
+        "SiglaCombustivel": "E", "ModeloBase": modelo_base, "CapacidadeBateriaKWH": 50.0,
+        "AutonomiaTotalKM": 300, "CustoMedioPorKM_R$": 0.2,
+    }
+
+def test_resumo_ignora_modelo_sem_preco(tmp_path):
+    arquivo = tmp_path / "estoque.json"
+    arquivo.write_text(json.dumps([
+        _carro("DOLPHIN", "R$ 149.800,00", "000001-1"),
+        _carro("SEAL", "", "000002-2"),
+        _carro("SEAL", "sem preço", "000002-2"),
+    ]), encoding="utf-8")
+    indice = IndiceEstoque(carregar_catalogo(str(arquivo), usar_cache=False))
+
+    resumo = indice.resumo()
+    assert "DOLPHIN" in resumo
+    assert "SEAL" not in resumo
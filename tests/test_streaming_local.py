@@ -0,0 +1,66 @@
+import pytest
+
+from assistente_carro_rag import PREFIXO_RESPOSTA, enviar_mensagem
+from chamadas_modelo import ClienteModelo, ErroChamadaModelo
+from instrumentacao import REGISTRO
+from modelo_local import ChunkLocal, ModeloLocal
+
+TEXTO = "Olá! O Dolphin tem 400 km de autonomia e custa bem pouco por quilômetro rodado."
+
+def _cliente():
+    return ClienteModelo(chamadas_por_segundo=1000, rajada=1000, espera_base=0.001, max_tentativas=2)
+
+def _modelo(**opcoes):
+    padrao = dict(respostas=[TEXTO], atraso_primeiro_chunk=0.05, atraso_chunk=0.01, tamanho_chunk=10)
+    return ModeloLocal(**{**padrao, **opcoes})
+
+def test_chunks_chegam_em_ordem():
+    resposta = _modelo().start_chat().send_message("oi", stream=True)
+    chunks = [chunk.text for chunk in resposta]
+    assert len(chunks) == -(-len(TEXTO) // 10)
+    assert "".join(chunks) == TEXTO
+
+def test_streaming_imprime_em_ordem_e_mede_primeiro_token(capsys):
+    REGISTRO.limpar()
+    metricas = enviar_mensagem(_modelo().start_chat(), "oi", streaming=True, cliente=_cliente())
+
+    assert metricas["texto"] == TEXTO
+    assert metricas["chunks"] == -(-len(TEXTO) // 10)
+    # O primeiro token chega depois do atraso inicial e bem antes do fim do streaming.
+    assert 0.05 <= metricas["ttft_s"] < metricas["total_s"]
+    saida = capsys.readouterr().out
+    assert PREFIXO_RESPOSTA + TEXTO in saida
+
+    primeiro_token = [d for d in REGISTRO.resumo()["duracoes"] if d["nome"] == "llm.primeiro_token"]
+    assert primeiro_token and primeiro_token[0]["rotulos"] == {"streaming": "True"}
+    assert primeiro_token[0]["contagem"] == 1
+
+def test_sem_streaming_primeiro_token_e_a_resposta_inteira():
+    metricas = enviar_mensagem(_modelo().start_chat(), "oi", streaming=False, cliente=_cliente())
+    assert metricas["texto"] == TEXTO
+    assert metricas["chunks"] == 1
+    assert metricas["ttft_s"] >= 0.05
+
+def test_erro_no_envio_sobe_classificado():
+    modelo = _modelo(falhas=["entrada"])
+    with pytest.raises(ErroChamadaModelo) as erro:
+        enviar_mensagem(modelo.start_chat(), "oi", streaming=True, cliente=_cliente())
+    assert erro.value.tipo == "entrada"
+    assert modelo.chamadas == 1
+
+def test_erro_no_meio_do_streaming_sobe_sem_retentativa():
+    envios = []
+
+    class ChatQuebrado:
+        def send_message(self, conteudo, stream=False, **kwargs):
+            envios.append(conteudo)
+
+            def chunks():
+                yield ChunkLocal("Olá, ")
+                raise ConnectionError("conexão caiu no meio do streaming")
+            return chunks()
+
+    with pytest.raises(ConnectionError):
+        enviar_mensagem(ChatQuebrado(), "oi", streaming=True, cliente=_cliente())
+    # Parte da resposta já foi mostrada: repetir o envio duplicaria o texto.
+    assert envios == ["oi"]